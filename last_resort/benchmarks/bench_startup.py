@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+"""
+Benchmark and budget of the start of the application.
+
+Measures, as the median of several fresh interpreters:
+
+- import: the cumulative import time of last_resort.py and its modules, from
+  python -X importtime, with the modules that took the longest themselves,
+- info: the wall clock of python last_resort.py --info, which never opens a window,
+- window: the wall clock from starting the interpreter to the main window being shown,
+  only when a display is available (DISPLAY, or run under xvfb-run).
+
+tkinter, psutil, yaml and fpdf must not be imported by importing the application, they
+are deferred to their first use. The benchmark exits with status 1 when one of them is
+imported or a measurement is over its budget, so it can run as a check, e.g. in CI.
+The default budgets of the import and of --info are the measured times plus about 20%
+headroom; the window has no default budget, it depends too much on the display. A
+budget of 0 disables its check:
+
+    python bench_startup.py --window-budget 1500
+
+Usage:
+    python bench_startup.py [--repeat 5] [--top 10] [--import-budget MS]
+                            [--info-budget MS] [--window-budget MS]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Budgets in milliseconds, measured 82.5 ms for the import and 115 ms for --info
+IMPORT_BUDGET = 100.0
+INFO_BUDGET = 140.0
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src")
+# Heavy modules that importing the application must not import
+DEFERRED = ("tkinter", "psutil", "yaml", "fpdf")
+
+IMPORT_APPLICATION = (
+    "import sys; sys.argv = ['last_resort.py', '--info']; "
+    f"sys.path.insert(0, {SRC_DIR!r}); import last_resort"
+)
+# Shows the main window as last_resort.main() does and prints when it is mapped
+SHOW_WINDOW = (
+    "import sys, time; sys.argv = ['last_resort.py']; "
+    f"sys.path.insert(0, {SRC_DIR!r}); import last_resort, user_interface; "
+    "import tkinter as tk; root = tk.Tk(); user_interface.init_main_window(root); "
+    "root.update(); print(time.time()); root.destroy()"
+)
+
+
+def parse_importtime(stderr):
+    """
+    Parse the output of python -X importtime.
+
+    Args:
+        stderr (str): The standard error of the interpreter.
+
+    Returns:
+        dict: Self and cumulative time in microseconds by module name.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = (int(self_time), int(cumulative))
+    return modules
+
+
+def measure_import():
+    """
+    Import the application in a fresh interpreter.
+
+    Returns:
+        dict: Self and cumulative time in microseconds by module name.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_APPLICATION],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def measure_info():
+    """
+    Run last_resort.py --info in a fresh interpreter.
+
+    Returns:
+        float: The wall clock in milliseconds.
+    """
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, os.path.join(SRC_DIR, "last_resort.py"), "--info"],
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def measure_window():
+    """
+    Show the main window in a fresh interpreter.
+
+    Returns:
+        float: The wall clock from the start of the interpreter to the shown window in
+            milliseconds.
+    """
+    start = time.time()
+    result = subprocess.run(
+        [sys.executable, "-c", SHOW_WINDOW], capture_output=True, text=True, check=True
+    )
+    return (float(result.stdout.split()[-1]) - start) * 1000
+
+
+def check(name, value, budget):
+    """
+    Print a measurement and compare it with its budget.
+
+    Args:
+        name (str): The name of the measurement.
+        value (float): The measured time in milliseconds.
+        budget (float): The budget in milliseconds, None or 0 for no budget.
+
+    Returns:
+        bool: True if the measurement is within the budget.
+    """
+    if not budget:
+        print(f"{name:<8} {value:>9.1f} ms")
+        return True
+    verdict = "ok" if value <= budget else "OVER BUDGET"
+    print(f"{name:<8} {value:>9.1f} ms {'budget':>9} {budget:>7.0f} ms  {verdict}")
+    return value <= budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the application start.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--top", type=int, default=10, help="Number of slowest modules to list."
+    )
+    parser.add_argument(
+        "--import-budget",
+        type=float,
+        default=IMPORT_BUDGET,
+        help=f"Budget of the import in ms, 0 for none. Defaults to {IMPORT_BUDGET:.0f}.",
+    )
+    parser.add_argument(
+        "--info-budget",
+        type=float,
+        default=INFO_BUDGET,
+        help=f"Budget of --info in ms, 0 for none. Defaults to {INFO_BUDGET:.0f}.",
+    )
+    parser.add_argument(
+        "--window-budget", type=float, help="Budget to the shown main window in ms."
+    )
+    arguments = parser.parse_args()
+
+    # The first run compiles the bytecode, it is not measured
+    measure_import()
+    imports = [measure_import() for _ in range(arguments.repeat)]
+    passed = True
+
+    deferred = sorted(name for name in imports[0] if name.split(".")[0] in DEFERRED)
+    if deferred:
+        print(f"Imported at startup although deferred: {', '.join(deferred)}")
+        passed = False
+
+    print(f"Slowest modules (self time, median of {arguments.repeat} runs):")
+    self_times = {
+        name: statistics.median(run.get(name, (0, 0))[0] for run in imports)
+        for name in imports[0]
+    }
+    for name in sorted(self_times, key=self_times.get, reverse=True)[: arguments.top]:
+        print(f"    {self_times[name] / 1000:>7.1f} ms  {name}")
+    print()
+
+    import_time = statistics.median(run["last_resort"][1] for run in imports) / 1000
+    passed &= check("import", import_time, arguments.import_budget)
+
+    info_time = statistics.median(measure_info() for _ in range(arguments.repeat))
+    passed &= check("info", info_time, arguments.info_budget)
+
+    if os.environ.get("DISPLAY"):
+        window_time = statistics.median(measure_window() for _ in range(arguments.repeat))
+        passed &= check("window", window_time, arguments.window_budget)
+    else:
+        print(f"{'window':<8} skipped, no display (use e.g. xvfb-run)")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
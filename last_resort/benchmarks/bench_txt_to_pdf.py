@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Benchmark of the run report to PDF conversion.
+
+Generates synthetic run reports of 1k, 10k and 100k lines and converts each of them
+with the former per-line FPDF.multi_cell approach and with the bulk text renderer
+from report_pdf. The legacy conversion of very large reports takes minutes, so it is
+skipped above --legacy-limit lines. The peak memory traced during the bulk
+conversion shows that the streaming writer does not hold the document in memory.
+
+Usage:
+    python bench_txt_to_pdf.py [--sizes 1000 10000 100000] [--legacy-limit 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Add the src directory to the system path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+
+import report_pdf  # noqa: E402
+
+
+def generate_report(path, line_count, seed=0):
+    """
+    Write a synthetic run report resembling a debug-heavy session.
+
+    Args:
+        path (str): The path of the report to write.
+        line_count (int): Number of lines to write.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+    """
+    rng = random.Random(seed)
+    messages = [
+        "Prompt selected: /masks/ABC123/REV01/dataprep/ABC123_MS_01Jan24",
+        "Review tar path constructed: /masks/ABC123/REV01/dataprep/0ABC123_REV_01.tar.gz",
+        "Found file: layer_{n}.o0 with extension: .o0",
+        "The email script output: " + "x" * 300,
+        "Checking if run_archive exists? -> /tools/last_resort/run_archive",
+    ]
+    with open(path, "w") as file:
+        file.write("RUID: 00000000-0000-0000-0000-000000000000\n")
+        for n in range(line_count - 1):
+            message = rng.choice(messages).format(n=n)
+            file.write(f"2024-01-01 12:{n // 60 % 60:02d}:{n % 60:02d} - {message}\n")
+
+
+def legacy_txt_to_pdf(txt_file, pdf_file):
+    """
+    The former conversion: one FPDF.multi_cell call per line.
+
+    Args:
+        txt_file (str): The path to the text file.
+        pdf_file (str): The path of the PDF file to create.
+    """
+    from fpdf import FPDF
+
+    class PDF(FPDF):
+        def footer(self):
+            self.set_y(-15)
+            self.set_font("helvetica", "I", 8)
+            self.cell(0, 10, "RUID: 00000000-0000-0000-0000-000000000000", align="C")
+
+    pdf = PDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.set_font("helvetica", size=12)
+    with open(txt_file, "r", encoding="utf-8") as file:
+        for line in file:
+            pdf.multi_cell(0, 15, line)
+    pdf.output(pdf_file)
+
+
+def measure(function, *args):
+    """
+    Run a function once and return the elapsed wall time in seconds.
+    """
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def measure_peak_memory(function, *args):
+    """
+    Run a function once and return the peak of traced memory allocations in kB.
+    """
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark run report PDF conversion.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument(
+        "--legacy-limit",
+        type=int,
+        default=10000,
+        help="Skip the legacy conversion for reports with more lines than this.",
+    )
+    arguments = parser.parse_args()
+
+    print(
+        f"{'lines':>8} {'legacy [s]':>12} {'bulk [s]':>10} {'speedup':>9} "
+        f"{'size [kB]':>10} {'peak [kB]':>10}"
+    )
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in arguments.sizes:
+            report = os.path.join(work_dir, f"run_{size}.lr")
+            generate_report(report, size)
+            bulk = measure(
+                report_pdf.text_file_to_pdf,
+                report,
+                os.path.join(work_dir, f"bulk_{size}.pdf"),
+                "RUID: 00000000-0000-0000-0000-000000000000",
+            )
+            pdf_size = os.path.getsize(os.path.join(work_dir, f"bulk_{size}.pdf")) / 1024
+            peak = measure_peak_memory(
+                report_pdf.text_file_to_pdf,
+                report,
+                os.path.join(work_dir, f"bulk_{size}.pdf"),
+                "RUID: 00000000-0000-0000-0000-000000000000",
+            )
+            if size <= arguments.legacy_limit:
+                legacy = measure(
+                    legacy_txt_to_pdf, report, os.path.join(work_dir, f"legacy_{size}.pdf")
+                )
+                legacy_column, speedup_column = f"{legacy:>12.3f}", f"{legacy / bulk:>8.1f}x"
+            else:
+                legacy_column, speedup_column = f"{'skipped':>12}", f"{'-':>9}"
+            print(
+                f"{size:>8} {legacy_column} {bulk:>10.3f} {speedup_column} "
+                f"{pdf_size:>10.0f} {peak:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
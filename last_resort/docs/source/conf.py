@@ -5,6 +5,8 @@ import yaml
 
 # Add the src directory to the system path
 sys.path.insert(0, os.path.abspath("../../src"))
+# log_core and metrics are shared with the other tools, they are kept in zee_utils
+sys.path.append(os.path.abspath("../../../zee_utils"))
 
 
 # -- Project information -----------------------------------------------------
@@ -15,6 +15,9 @@ def _initialize_():
     - -i, --info: Show this help message and exit.
     - -c, --config: Accepts a path to a custom configuration file.
     - -dc, --define_config: Allows the user to alter the currently used configuration.
+    - -p, --profile: Profile the run with cProfile and tracemalloc.
+    - -rec, --record: Record the session into a tape for replaying it.
+    - -rep, --replay: Accepts a path to a tape to replay without user interaction.
     The parsed arguments are stored in the global 'arguments' variable.
     """
     global arguments
@@ -66,6 +69,24 @@ def _initialize_():
             action="store_true",
             help="Open a window to define a new temporary configuration for this session.",
         )
+        parser.add_argument(
+            "-p",
+            "--profile",
+            action="store_true",
+            help="Profile the run, the results are saved into the run archive.",
+        )
+        parser.add_argument(
+            "-rec",
+            "--record",
+            action="store_true",
+            help="Record the session into a tape in the run archive.",
+        )
+        parser.add_argument(
+            "-rep",
+            "--replay",
+            type=str,
+            help=" TAPE = Replay a recorded session in a snapshot of its folder tree.",
+        )
         arguments = parser.parse_args()
 
 
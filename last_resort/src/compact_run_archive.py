@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+"""
+Rotation and compaction of the run archive.
+
+Every launch adds a run_<date>.pdf report and an events/run_<date>.jsonl event stream to
+the run archive. To keep the directory small, runs older than a number of days are moved
+into monthly containers, compacted/runs_<YYYY-MM>.zip, holding the reports and event
+streams of the runs started in that month. Every container has an index.json member
+mapping each run name to its RUID, start time and member names, so a run can be found
+without scanning the container.
+
+A container is rewritten under a temporary name and renamed when complete, and the
+original files are only removed afterwards, so an interrupted compaction never loses a
+run. Runs that are not finalised yet (.lr report or .pending marker present) are left
+in place. The run index (run_index.sqlite) keeps the runs of compacted containers.
+
+Usage:
+    python compact_run_archive.py [-a ARCHIVE] compact [--days DAYS]
+    python compact_run_archive.py [-a ARCHIVE] list [MONTH]
+    python compact_run_archive.py [-a ARCHIVE] extract RUN_OR_RUID [-o DIRECTORY]
+"""
+import argparse
+import datetime
+import fcntl
+import json
+import os
+import shutil
+import sys
+import time
+import zipfile
+
+import run_events
+
+COMPACTED_DIR = "compacted"
+CONTAINER_PREFIX = "runs_"
+INDEX_MEMBER = "index.json"
+REPORT_DATE_FORMAT = "run_%d%m%y-%H%M%S"
+DEFAULT_DAYS = 90
+
+
+def run_started(run_name, fallback_path=None):
+    """
+    Return the start time of a run from its name, e.g. run_310124-101500.
+
+    Args:
+        run_name (str): The name of the run, without extension.
+        fallback_path (str, optional): File whose modification time is used if the name
+            does not hold a date. Defaults to None.
+
+    Returns:
+        datetime.datetime: The start time, or None if it cannot be determined.
+    """
+    try:
+        return datetime.datetime.strptime(run_name, REPORT_DATE_FORMAT)
+    except ValueError:
+        if fallback_path is None:
+            return None
+        return datetime.datetime.fromtimestamp(os.path.getmtime(fallback_path))
+
+
+def container_path(archive_dir, month):
+    """
+    Return the path of the container of a month.
+
+    Args:
+        archive_dir (str): The run archive directory.
+        month (str): The month, formatted YYYY-MM.
+
+    Returns:
+        str: The path to the container.
+    """
+    return os.path.join(archive_dir, COMPACTED_DIR, f"{CONTAINER_PREFIX}{month}.zip")
+
+
+def compactable_runs(archive_dir, days):
+    """
+    List the finalised runs older than a number of days, grouped by month.
+
+    Args:
+        archive_dir (str): The run archive directory.
+        days (int): Minimum age of the runs in days.
+
+    Returns:
+        dict: Months (YYYY-MM) mapped to lists of (run name, started, member paths).
+    """
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    names = set(os.listdir(archive_dir))
+    events_dir = os.path.join(archive_dir, run_events.EVENTS_DIR)
+    runs = {}
+    for name in sorted(names):
+        run_name, extension = os.path.splitext(name)
+        if not run_name.startswith("run_") or extension != ".pdf":
+            continue
+        if run_name + ".lr" in names or run_name + ".lr.pending" in names:
+            continue
+        report = os.path.join(archive_dir, name)
+        started = run_started(run_name, report)
+        if started >= cutoff:
+            continue
+        members = {name: report}
+        events_file = os.path.join(events_dir, run_name + run_events.EVENTS_SUFFIX)
+        if os.path.exists(events_file):
+            member_name = f"{run_events.EVENTS_DIR}/{os.path.basename(events_file)}"
+            members[member_name] = events_file
+        runs.setdefault(started.strftime("%Y-%m"), []).append(
+            (run_name, started, members)
+        )
+    return runs
+
+
+def read_index(container):
+    """
+    Read the index of a container.
+
+    Args:
+        container (zipfile.ZipFile): The open container.
+
+    Returns:
+        dict: Run names mapped to their RUID, start time and member names.
+    """
+    try:
+        return json.loads(container.read(INDEX_MEMBER))
+    except KeyError:
+        return {}
+
+
+def read_ruid(events_file):
+    """
+    Read the RUID of a run from its event stream.
+
+    Args:
+        events_file (str): The path to the .jsonl events file.
+
+    Returns:
+        str: The RUID, or None if the stream holds no events.
+    """
+    for event in run_events.read_events(events_file):
+        return event.get("ruid")
+    return None
+
+
+def compact_month(archive_dir, month, runs):
+    """
+    Move runs of one month into the container of the month.
+
+    Args:
+        archive_dir (str): The run archive directory.
+        month (str): The month, formatted YYYY-MM.
+        runs (list): The runs, as returned by compactable_runs().
+
+    Returns:
+        int: The number of runs moved into the container.
+    """
+    path = container_path(archive_dir, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial_path = path + ".part"
+    index = {}
+    with zipfile.ZipFile(partial_path, "w", zipfile.ZIP_DEFLATED) as target:
+        if os.path.exists(path):
+            with zipfile.ZipFile(path) as source:
+                index = read_index(source)
+                for info in source.infolist():
+                    if info.filename == INDEX_MEMBER:
+                        continue
+                    with source.open(info) as member, target.open(info, "w") as copy:
+                        shutil.copyfileobj(member, copy, 1024 * 1024)
+        for run_name, started, members in runs:
+            if run_name in index:
+                # Compacted before, but the originals were not removed
+                continue
+            ruid = None
+            for member_name, file_path in members.items():
+                target.write(file_path, member_name)
+                if member_name.endswith(run_events.EVENTS_SUFFIX):
+                    ruid = read_ruid(file_path)
+            index[run_name] = {
+                "ruid": ruid,
+                "started": started.isoformat(),
+                "members": sorted(members),
+            }
+        target.writestr(INDEX_MEMBER, json.dumps(index, indent=1, sort_keys=True))
+    os.replace(partial_path, path)
+
+    # The container is complete, the originals can go
+    for run_name, started, members in runs:
+        for file_path in members.values():
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                # Removed meanwhile, e.g. by a concurrent prune
+                continue
+            except OSError as e:
+                # E.g. read-only reports in a directory without write access for this
+                # user, or a busy file on NFS. The next compaction skips the run.
+                print(f"WARNING     Cannot remove {file_path}, it stays in place: {e}")
+    return len(runs)
+
+
+def compact(archive_dir, days=DEFAULT_DAYS):
+    """
+    Move all finalised runs older than a number of days into monthly containers.
+
+    Args:
+        archive_dir (str): The run archive directory.
+        days (int, optional): Minimum age of the runs in days. Defaults to DEFAULT_DAYS.
+
+    Returns:
+        int: The number of runs compacted.
+    """
+    compacted_dir = os.path.join(archive_dir, COMPACTED_DIR)
+    os.makedirs(compacted_dir, exist_ok=True)
+    compacted = 0
+    with open(os.path.join(compacted_dir, ".lock"), "w") as lock:
+        # One compaction at a time, containers are rewritten
+        fcntl.lockf(lock, fcntl.LOCK_EX)
+        for month, runs in sorted(compactable_runs(archive_dir, days).items()):
+            compacted += compact_month(archive_dir, month, runs)
+            print(
+                f"INFO        {len(runs)} runs compacted into "
+                f"{container_path(archive_dir, month)}"
+            )
+    return compacted
+
+
+def containers(archive_dir):
+    """
+    List the containers of the run archive, oldest first.
+
+    Args:
+        archive_dir (str): The run archive directory.
+
+    Returns:
+        list: Paths to the containers.
+    """
+    compacted_dir = os.path.join(archive_dir, COMPACTED_DIR)
+    if not os.path.isdir(compacted_dir):
+        return []
+    return sorted(
+        os.path.join(compacted_dir, name)
+        for name in os.listdir(compacted_dir)
+        if name.startswith(CONTAINER_PREFIX) and name.endswith(".zip")
+    )
+
+
+def find_run(archive_dir, run_or_ruid):
+    """
+    Find a compacted run by its name or RUID.
+
+    Args:
+        archive_dir (str): The run archive directory.
+        run_or_ruid (str): The run name (run_<date>, with or without extension) or RUID.
+
+    Returns:
+        tuple: The container path and the index entry of the run, or None if not found.
+    """
+    run_name = os.path.splitext(os.path.basename(run_or_ruid))[0]
+    started = run_started(run_name)
+    candidates = containers(archive_dir)
+    if started is not None:
+        # The name tells the month, only one container needs to be opened
+        candidates = [container_path(archive_dir, started.strftime("%Y-%m"))]
+    for path in candidates:
+        if not os.path.exists(path):
+            continue
+        with zipfile.ZipFile(path) as container:
+            index = read_index(container)
+        if run_name in index:
+            return path, dict(index[run_name], name=run_name)
+        for name, entry in index.items():
+            if entry.get("ruid") == run_or_ruid:
+                return path, dict(entry, name=name)
+    return None
+
+
+def extract_run(archive_dir, run_or_ruid, directory):
+    """
+    Extract the report and event stream of a compacted run.
+
+    Args:
+        archive_dir (str): The run archive directory.
+        run_or_ruid (str): The run name or RUID.
+        directory (str): The directory to extract the files into.
+
+    Returns:
+        list: Paths to the extracted files, or None if the run was not found.
+    """
+    found = find_run(archive_dir, run_or_ruid)
+    if found is None:
+        return None
+    path, entry = found
+    with zipfile.ZipFile(path) as container:
+        return [
+            container.extract(member, directory) for member in entry["members"]
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact and read the run archive.")
+    parser.add_argument(
+        "-a",
+        "--archive",
+        help="Run archive directory. Defaults to run_archive_path of the configuration.",
+    )
+    parser.add_argument("-c", "--config", help="Path to the config file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact_parser = commands.add_parser(
+        "compact", help="Move old runs into monthly containers."
+    )
+    compact_parser.add_argument(
+        "--days",
+        type=int,
+        default=DEFAULT_DAYS,
+        help=f"Compact runs older than this many days. Defaults to {DEFAULT_DAYS}.",
+    )
+    list_parser = commands.add_parser("list", help="List the compacted runs.")
+    list_parser.add_argument("month", nargs="?", help="Month to list, YYYY-MM.")
+    extract_parser = commands.add_parser("extract", help="Extract a compacted run.")
+    extract_parser.add_argument("run", help="Run name (run_<date>) or RUID.")
+    extract_parser.add_argument(
+        "-o", "--output", default=os.getcwd(), help="Directory to extract into."
+    )
+    arguments = parser.parse_args()
+
+    archive_dir = arguments.archive
+    if archive_dir is None:
+        import convert_run_archive
+
+        archive_dir = convert_run_archive.default_archive_dir(arguments.config)
+    if not os.path.isdir(archive_dir):
+        print(f"ERROR       Run archive not found: {archive_dir}")
+        return 1
+
+    if arguments.command == "compact":
+        start = time.perf_counter()
+        compacted = compact(archive_dir, arguments.days)
+        print(
+            f"INFO        {compacted} runs compacted in {time.perf_counter() - start:.2f} s"
+        )
+    elif arguments.command == "list":
+        paths = containers(archive_dir)
+        if arguments.month:
+            paths = [container_path(archive_dir, arguments.month)]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with zipfile.ZipFile(path) as container:
+                index = read_index(container)
+            for name, entry in sorted(index.items()):
+                print(f"{entry['started']}  {name:<22} {entry.get('ruid') or ''}")
+    else:
+        extracted = extract_run(archive_dir, arguments.run, arguments.output)
+        if extracted is None:
+            print(f"ERROR       Run not found: {arguments.run}")
+            return 1
+        for path in extracted:
+            print(f"INFO        Extracted {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
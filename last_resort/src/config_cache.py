@@ -0,0 +1,204 @@
+"""
+Cache of parsed YAML configuration files.
+
+Parsing YAML is slow, much slower with the pure Python loader used when PyYAML is
+installed without libyaml. The parsed values of a configuration file are therefore
+kept in a pickle file, keyed by the path, size and modification time of the YAML file
+and the Python and PyYAML versions, and later launches read them from there without
+parsing:
+
+    values, source, seconds = config_cache.load(config_path)
+
+The cache is in ~/.cache/last_resort/config, or LAST_RESORT_CACHE_DIR/config. An entry
+whose key does not match the file is parsed again and replaced. A file modified less
+than SETTLE_SECONDS ago is not cached, an edit in the same clock tick that keeps the
+size would otherwise go unnoticed. When the cache cannot be read or written, the file
+is simply parsed.
+
+YAML is parsed with the C loader (yaml.CSafeLoader) when libyaml is available. yaml is
+only imported when a file is parsed, a launch served from the cache does not import it.
+The PyYAML version is read from the name of its installed metadata folder instead:
+importing yaml or importlib.metadata would cost more than the cache saves.
+
+The module has no dependencies on the rest of the application.
+"""
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+# Changed when the format of the cache entries changes
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".pickle"
+# Files modified more recently are parsed but not cached
+SETTLE_SECONDS = 2.0
+
+FROM_CACHE = "cache"
+FROM_YAML = "yaml"
+
+
+class ParseError(ValueError):
+    """
+    Raised when a configuration file is not valid YAML.
+    """
+
+
+def loader():
+    """
+    Return the YAML loader used to parse the configuration files.
+
+    Returns:
+        type: yaml.CSafeLoader when libyaml is available, otherwise yaml.SafeLoader.
+    """
+    import yaml
+
+    return getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def cache_dir():
+    """
+    Return the directory of the cache entries.
+
+    Returns:
+        str: LAST_RESORT_CACHE_DIR/config or ~/.cache/last_resort/config.
+    """
+    base = os.environ.get("LAST_RESORT_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "last_resort"
+    )
+    return os.path.join(base, "config")
+
+
+def cache_path(config_path):
+    """
+    Return the path of the cache entry of a configuration file.
+
+    Args:
+        config_path (str): The path to the configuration file.
+
+    Returns:
+        str: The path to the cache entry.
+    """
+    name = hashlib.sha1(os.path.abspath(config_path).encode()).hexdigest()
+    return os.path.join(cache_dir(), name + CACHE_SUFFIX)
+
+
+def yaml_version():
+    """
+    Return the installed PyYAML version without importing yaml.
+
+    Returns:
+        str: The version from the name of the .dist-info or .egg-info folder next to the
+            yaml package found first on sys.path, None if there is none.
+    """
+    for entry in sys.path:
+        directory = entry or os.curdir
+        if not os.path.isdir(os.path.join(directory, "yaml")):
+            continue
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return None
+        for name in names:
+            lowered = name.lower()
+            if lowered.startswith("pyyaml-") and lowered.endswith(
+                (".dist-info", ".egg-info")
+            ):
+                return name[len("pyyaml-") :].rsplit(".", 1)[0]
+        return None
+    return None
+
+
+def _key(config_path, status):
+    return (
+        CACHE_VERSION,
+        sys.version_info[:2],
+        yaml_version(),
+        os.path.abspath(config_path),
+        status.st_size,
+        status.st_mtime_ns,
+    )
+
+
+def parse(config_path):
+    """
+    Parse a YAML configuration file.
+
+    Args:
+        config_path (str): The path to the configuration file.
+
+    Returns:
+        The parsed values, None for an empty file.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ParseError: If the file is not valid YAML.
+    """
+    import yaml
+
+    with open(config_path, "rb") as file:
+        try:
+            return yaml.load(file, Loader=loader())
+        except yaml.YAMLError as e:
+            raise ParseError(str(e))
+
+
+def _read(path, key):
+    try:
+        with open(path, "rb") as file:
+            stored_key, values = pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Truncated or written by an incompatible version, parsed again and replaced
+        return None
+    if stored_key != key:
+        return None
+    return values
+
+
+def _write(path, key, values):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, partial_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), suffix=".part"
+        )
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                pickle.dump((key, values), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(partial_path, path)
+        except BaseException:
+            os.unlink(partial_path)
+            raise
+    except (OSError, pickle.PicklingError):
+        # A read-only home only costs the parsing
+        pass
+
+
+def load(config_path):
+    """
+    Return the values of a configuration file, from the cache if it is current.
+
+    Args:
+        config_path (str): The path to the configuration file.
+
+    Returns:
+        tuple: The values (None for an empty file), FROM_CACHE or FROM_YAML, and the
+            seconds it took.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ParseError: If the file is not valid YAML.
+    """
+    start = time.perf_counter()
+    status = os.stat(config_path)
+    key = _key(config_path, status)
+    path = cache_path(config_path)
+    values = _read(path, key)
+    if values is not None:
+        return values[0], FROM_CACHE, time.perf_counter() - start
+    values = parse(config_path)
+    if time.time() - status.st_mtime_ns / 1e9 >= SETTLE_SECONDS:
+        _write(path, key, (values,))
+    return values, FROM_YAML, time.perf_counter() - start
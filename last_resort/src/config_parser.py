@@ -1,11 +1,135 @@
+"""
+Configuration of the application.
+
+The YAML configuration file is read and validated once into a Configuration object:
+the folder patterns are resolved for the site of the user (RDPSITE) and compiled, the
+paths are normalised. Callers use the attributes instead of re-interpreting the raw
+values on every use:
+
+    settings = config_parser.config()
+    if settings.final_mask_pattern.search(folder): ...
+
+A key named <key>_<site>, e.g. mask_name_pattern_xyz, replaces <key> for users of that
+site. The file is checked for changes at most every RELOAD_INTERVAL seconds and
+reloaded when it changed, so long-running sessions pick up edits without a restart. An
+edit that does not validate is reported and the previous configuration stays in use.
+Values defined for this session only (--define_config) are kept across reloads.
+
+The parsed file is cached by config_cache, so a launch with an unchanged configuration
+file does not parse YAML.
+"""
 import sys
+import time
 
-import yaml
 import os
+import re
 import argument_parser
+import config_cache
+import shared_modules  # Puts log_core on the import path
+import log_core
+
+# Required keys holding regular expressions, see Configuration
+PATTERN_KEYS = (
+    "final_mask_pattern",
+    "mask_name_pattern",
+    "revision_pattern",
+    "dataprep_pattern",
+)
+# Seconds between checks of the configuration file for changes
+RELOAD_INTERVAL = 2.0
 
 # Global variable to store the configuration
 full_configuration = None
+# The validated configuration, see config()
+current = None
+# Values defined for this session, applied on top of the file
+overrides = {}
+
+_config_path = None
+_file_signature = None
+_next_check = 0.0
+
+
+class Configuration:
+    """
+    The validated configuration, with site-resolved and compiled values.
+
+    Attributes:
+        site (str): The site of the user, from RDPSITE, or None.
+        final_mask_pattern (re.Pattern): Pattern of the final mask folder names.
+        mask_name_pattern (re.Pattern): Pattern of the mask name folder names.
+        revision_pattern (re.Pattern): Pattern of the revision folder names.
+        dataprep_pattern (re.Pattern): Pattern of the dataprep folder names.
+        editor_of_choice (str): Editor used for the previews, 'built_in' for the file
+            presenter.
+        run_archive_path (str): Absolute path of the run archive, or None if it is not
+            configured.
+        values (dict): The raw values, site keys resolved.
+    """
+
+    def __init__(self, values, site=None):
+        """
+        Validate raw configuration values.
+
+        Args:
+            values (dict): The values read from the configuration file.
+            site (str, optional): The site of the user. Defaults to None.
+
+        Raises:
+            ValueError: Listing every missing or invalid value.
+        """
+        if not isinstance(values, dict):
+            raise ValueError("The configuration file must contain key: value pairs.")
+        self.site = site
+        self.values = resolve_site(values, site)
+        errors = []
+        for key in PATTERN_KEYS:
+            pattern = self.values.get(key)
+            if not isinstance(pattern, str) or not pattern:
+                errors.append(f"'{key}' must be a non-empty string")
+                continue
+            try:
+                setattr(self, key, re.compile(pattern))
+            except re.error as e:
+                errors.append(f"'{key}' is not a valid regular expression: {e}")
+
+        self.editor_of_choice = self.values.get("editor_of_choice", "built_in")
+        if not isinstance(self.editor_of_choice, str) or not self.editor_of_choice:
+            errors.append("'editor_of_choice' must be a non-empty string")
+
+        run_archive_path = self.values.get("run_archive_path")
+        if run_archive_path is None or run_archive_path == "":
+            self.run_archive_path = None
+        elif isinstance(run_archive_path, str):
+            self.run_archive_path = os.path.abspath(
+                os.path.expandvars(os.path.expanduser(run_archive_path))
+            )
+        else:
+            errors.append("'run_archive_path' must be a path")
+
+        if errors:
+            raise ValueError("Invalid configuration: " + "; ".join(errors) + ".")
+
+
+def resolve_site(values, site):
+    """
+    Replace the values that have a variant for a site by that variant.
+
+    Args:
+        values (dict): The raw configuration values.
+        site (str): The site, or None.
+
+    Returns:
+        dict: The values, <key>_<site> moved to <key>.
+    """
+    if not site:
+        return dict(values)
+    suffix = "_" + site
+    resolved = dict(values)
+    for key, value in values.items():
+        if key.endswith(suffix) and key[: -len(suffix)]:
+            resolved[key[: -len(suffix)]] = value
+    return resolved
 
 
 def _find_config_file_(filename="last_resort_default_config.yaml"):
@@ -41,25 +165,137 @@ def _find_config_file_(filename="last_resort_default_config.yaml"):
     return config_path
 
 
+def _signature(config_path):
+    status = os.stat(config_path)
+    return status.st_mtime_ns, status.st_size
+
+
+def _load(config_path):
+    """
+    Read and validate the configuration file.
+
+    Args:
+        config_path (str): The path to the configuration file.
+
+    Returns:
+        tuple: The raw values and the Configuration.
+
+    Raises:
+        FileNotFoundError: If the configuration file is not found.
+        ValueError: If the configuration is invalid.
+    """
+    try:
+        values, source, seconds = config_cache.load(config_path)
+    except config_cache.ParseError as e:
+        raise ValueError(f"Invalid configuration: {e}")
+    if source == config_cache.FROM_CACHE:
+        how = "read from the cache"
+    else:
+        how = f"parsed with {config_cache.loader().__name__}"
+    log_core.emit(
+        log_core.DEBUG,
+        "DEBUG",
+        ("Configuration {} in {:.2f} ms: {}", how, seconds * 1000, config_path),
+    )
+    if values is None:
+        values = {}
+    if isinstance(values, dict):
+        values = {**values, **overrides}
+    return values, Configuration(values, os.getenv("RDPSITE"))
+
+
 def initialize():
     """
     Initialize and load the configuration file into memory.
 
     This function searches for the configuration file named 'default_config.yaml' in the current directory
     and its subdirectories. If the file is found, it loads the configuration into the global variable
-    'full_configuration'. If the file is not found, it raises a FileNotFoundError.
+    'full_configuration' and validates it into 'current'. If the file is not found, it raises a FileNotFoundError.
 
     Raises:
         FileNotFoundError: If the configuration file is not found.
+        ValueError: If the configuration is invalid.
     """
-    global full_configuration
+    global full_configuration, current, _config_path, _file_signature, _next_check
     if full_configuration is None:
         config_path = _find_config_file_()
-        if config_path:
-            with open(config_path, "r") as file:
-                full_configuration = yaml.safe_load(file)
-        else:
+        if not config_path:
             raise FileNotFoundError("Configuration file not found.")
+        signature = _signature(config_path)
+        full_configuration, current = _load(config_path)
+        _config_path = config_path
+        _file_signature = signature
+        _next_check = time.monotonic() + RELOAD_INTERVAL
+
+
+def reload_if_changed():
+    """
+    Reload the configuration if the file changed since it was read.
+
+    The file is checked at most every RELOAD_INTERVAL seconds. A changed file that cannot
+    be read or validated is reported and the previous configuration is kept.
+
+    Returns:
+        bool: True if the configuration was reloaded.
+    """
+    global full_configuration, current, _file_signature, _next_check
+    now = time.monotonic()
+    if _config_path is None or now < _next_check:
+        return False
+    _next_check = now + RELOAD_INTERVAL
+    try:
+        signature = _signature(_config_path)
+    except OSError:
+        # Replaced right now or removed, the previous configuration stays
+        return False
+    if signature == _file_signature:
+        return False
+    # A broken file is reported once, not on every check
+    _file_signature = signature
+    try:
+        values, configuration = _load(_config_path)
+    except (OSError, ValueError) as e:
+        print(f"WARNING     Configuration not reloaded, keeping the previous one: {e}")
+        return False
+    full_configuration, current = values, configuration
+    print("INFO        Configuration reloaded from " + _config_path)
+    return True
+
+
+def config():
+    """
+    Return the validated configuration, loading or reloading it if needed.
+
+    Returns:
+        Configuration: The current configuration.
+
+    Raises:
+        FileNotFoundError: If the configuration file is not found.
+        ValueError: If the configuration is invalid when first loaded.
+    """
+    if current is None:
+        initialize()
+    else:
+        reload_if_changed()
+    return current
+
+
+def override(values):
+    """
+    Define configuration values for this session, on top of the configuration file.
+
+    Args:
+        values (dict): The values to define.
+
+    Raises:
+        ValueError: If the resulting configuration is invalid, nothing is changed then.
+    """
+    global full_configuration, current
+    config()
+    merged = {**full_configuration, **values}
+    configuration = Configuration(merged, os.getenv("RDPSITE"))
+    overrides.update(values)
+    full_configuration, current = merged, configuration
 
 
 def get(key):
@@ -67,7 +303,8 @@ def get(key):
     Retrieve a value from the configuration.
 
     This function ensures that the configuration is initialized and then retrieves the value
-    associated with the specified key from the configuration.
+    associated with the specified key from the configuration. Prefer the validated
+    attributes of config().
 
     Args:
         key (str): The key to look up in the configuration.
@@ -79,10 +316,7 @@ def get(key):
         ValueError: If the key is not found in the configuration.
         FileNotFoundError: If the configuration file is not found.
     """
-    global full_configuration
-
-    if full_configuration is None:
-        initialize()
+    config()
     if full_configuration is not None:
         if key in full_configuration:
             return full_configuration.get(key)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+Bulk conversion of the run reports left in the run archive.
+
+Sessions locked with lock_run_report(pdf_mode=False), crashed sessions and interrupted
+finalisation workers leave .lr run reports behind in the run archive. This script
+converts all of them into read-only PDFs in a pool of worker processes, one report per
+task, using the same finalisation as the application.
+
+The conversion is idempotent: reports that already have a PDF are only cleaned up, and
+reports of sessions that are still running (their .pending marker is locked) are
+skipped. Running the script again simply continues where the previous run stopped.
+
+The run archive is taken from the command line, or from the 'run_archive_path' key of
+the configuration file. The script does not go through the argument parser of the
+application.
+
+Usage:
+    python convert_run_archive.py [<run_archive>] [-c CONFIG] [-j WORKERS]
+"""
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+import config_cache
+import report_finalizer
+
+CONVERTED = "converted"
+SKIPPED = "skipped"
+BUSY = "busy"
+FAILED = "failed"
+
+
+def default_archive_dir(config_path=None):
+    """
+    Resolve the run archive directory the same way the application does.
+
+    Args:
+        config_path (str, optional): Path to the configuration file. Defaults to the
+            last_resort_default_config.yaml next to the src directory.
+
+    Returns:
+        str: The path to the run archive directory.
+    """
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if config_path is None:
+        config_path = os.path.join(app_dir, "last_resort_default_config.yaml")
+    configuration = config_cache.load(config_path)[0] or {}
+    return configuration.get("run_archive_path") or os.path.join(app_dir, "run_archive")
+
+
+def unconverted_reports(archive_dir):
+    """
+    List the .lr run reports in the run archive.
+
+    Args:
+        archive_dir (str): The run archive directory.
+
+    Returns:
+        list: Paths to the .lr run reports, oldest first.
+    """
+    return sorted(
+        os.path.join(archive_dir, name)
+        for name in os.listdir(archive_dir)
+        if name.endswith(".lr")
+    )
+
+
+def convert(report_file):
+    """
+    Convert one run report, unless its session is still running.
+
+    Runs in a worker process of the pool.
+
+    Args:
+        report_file (str): The path to the .lr run report.
+
+    Returns:
+        tuple: The report path, its status and the size of the report in bytes.
+    """
+    try:
+        size = os.path.getsize(report_file)
+    except FileNotFoundError:
+        # Finalised by another worker since the archive was listed
+        return report_file, SKIPPED, 0
+    pdf_file = os.path.splitext(report_file)[0] + ".pdf"
+    already_converted = os.path.exists(pdf_file)
+    try:
+        if not report_finalizer.finalize_locked(report_file):
+            return report_file, BUSY, 0
+    except Exception as error:
+        return report_file, f"{FAILED}: {error}", 0
+    if already_converted:
+        return report_file, SKIPPED, 0
+    return report_file, CONVERTED, size
+
+
+def convert_all(reports, workers=None):
+    """
+    Convert run reports in a pool of worker processes and print the throughput.
+
+    Args:
+        reports (list): Paths to the .lr run reports.
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        dict: Number of reports per status.
+    """
+    counts = {CONVERTED: 0, SKIPPED: 0, BUSY: 0, FAILED: 0}
+    converted_bytes = 0
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count()
+    ) as pool:
+        for report_file, status, size in pool.map(convert, reports, chunksize=4):
+            if status.startswith(FAILED):
+                counts[FAILED] += 1
+                print(f"ERROR       {os.path.basename(report_file)}: {status}")
+                continue
+            counts[status] += 1
+            converted_bytes += size
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"INFO        {counts[CONVERTED]} converted, {counts[SKIPPED]} already converted, "
+        f"{counts[BUSY]} in use, {counts[FAILED]} failed in {elapsed:.2f} s"
+    )
+    if counts[CONVERTED] and elapsed > 0:
+        print(
+            f"INFO        Throughput: {counts[CONVERTED] / elapsed:.1f} reports/s, "
+            f"{converted_bytes / elapsed / 1024 / 1024:.2f} MB/s"
+        )
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert the .lr run reports left in the run archive into PDFs."
+    )
+    parser.add_argument(
+        "archive",
+        nargs="?",
+        help="Run archive directory. Defaults to run_archive_path of the configuration.",
+    )
+    parser.add_argument("-c", "--config", help="Path to the config file")
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        help="Number of worker processes. Defaults to the number of CPUs.",
+    )
+    arguments = parser.parse_args()
+
+    archive_dir = arguments.archive or default_archive_dir(arguments.config)
+    if not os.path.isdir(archive_dir):
+        print(f"ERROR       Run archive not found: {archive_dir}")
+        return 1
+    reports = unconverted_reports(archive_dir)
+    print(f"INFO        {len(reports)} run reports found in {archive_dir}")
+    if not reports:
+        return 0
+    counts = convert_all(reports, arguments.workers)
+    return 1 if counts[FAILED] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
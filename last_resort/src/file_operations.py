@@ -1,21 +1,57 @@
 import datetime
+import errno
+import getpass
+import hashlib
+import io
+import json
 import os
+import platform
 import re
 import shutil
 import sys
+import tempfile
+import time
 import uuid
 
-from fpdf import FPDF
-
 import utils
 import config_parser
-from tkinter import messagebox
+import flight_recorder
+import history_sink as history
+import shared_modules  # Puts metrics on the import path
+import metrics
+import report_finalizer
+import report_pdf
+import run_events
+import session_tape
+import spans
+import lazy_import
 import user_interface as ui
 
+messagebox = lazy_import.module("tkinter.messagebox")
+
 global forms_dir
 global final_mask_dir, dataprep_dir, revision_dir, mask_name_dir
 global ruid, run_report_file
 
+# Identifier of the run, set by generate_ruid
+ruid = None
+# Buffered writer of the run report history, created by generate_ruid
+history_sink = None
+# Structured event stream of the run, created by generate_ruid
+event_log = None
+# Folder inside the run archive where the metrics textfile is written
+METRICS_DIR = "metrics"
+# Folder inside the run archive where the results of --profile are saved
+PROFILES_DIR = "profiles"
+# Folder inside the run archive where the tapes of --record are saved
+SESSIONS_DIR = "sessions"
+# Folder of the snapshot tree used as the run archive of a replayed session
+REPLAY_ARCHIVE_DIR = "replay_run_archive"
+# Versions of the checklist tried when other sessions save theirs at the same time
+CHECKLIST_SAVE_ATTEMPTS = 5
+# Errors of os.link() on file systems without hard links, e.g. many SMB and NFS shares
+LINK_UNSUPPORTED = (errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EXDEV)
+
 
 def match_folder(folder_name, patterns):
     """
@@ -35,7 +71,9 @@ def match_folder(folder_name, patterns):
     for name, pattern in patterns.items():
         if re.match(pattern, folder_name):
             utils.debug(
-                message=f"Matched startup folder to {folder_name} with pattern {pattern}"
+                message=(
+                    "Matched startup folder to {} with pattern {}", folder_name, pattern
+                )
             )
             return name
     return None
@@ -80,6 +118,7 @@ def navigate_directory(path, levels, pattern=None):
     return path
 
 
+@spans.timed()
 def identify_folders(root):
     """
     Determine and set paths for various project directories.
@@ -100,22 +139,12 @@ def identify_folders(root):
     global final_mask_dir, dataprep_dir, revision_dir, mask_name_dir
     current_directory = os.getcwd()
 
-    mask_name_pattern = re.compile(
-        config_parser.get(
-            "mask_name_pattern_secret"  # anonymized
-            if os.getenv("RDPSITE") == "secret"  # anonymized
-            else "mask_name_pattern"  # anonymized
-        )
-    )
-    revision_pattern = re.compile(
-        config_parser.get(
-            "revision_pattern_secret"  # anonymized
-            if os.getenv("RDPSITE") == "secret"  # anonymized
-            else "revision_pattern"  # anonymized
-        )
-    )
-    final_mask_pattern = re.compile(config_parser.get("final_mask_pattern"))  # anonymized
-    dataprep_pattern = re.compile(config_parser.get("dataprep_pattern"))  # anonymized
+    # Site-specific patterns are resolved and compiled by the configuration
+    settings = config_parser.config()
+    mask_name_pattern = settings.mask_name_pattern
+    revision_pattern = settings.revision_pattern
+    final_mask_pattern = settings.final_mask_pattern
+    dataprep_pattern = settings.dataprep_pattern
     patterns = {
         "mask_name_dir": mask_name_pattern,
         "revision_dir": revision_pattern,
@@ -215,8 +244,7 @@ def handle_multiple_final_mask_folders(root):
     """
     # Retrieve the pattern from the configuration
     global final_mask_dir
-    pattern = config_parser.get("final_mask_pattern")
-    regex = re.compile(pattern)
+    regex = config_parser.config().final_mask_pattern
 
     # Find folders matching the pattern in the dataprep_dir
     name_matching_folders = find_folders(directory=dataprep_dir)
@@ -255,10 +283,18 @@ def init_folder_structure(root):
     """
     utils.startup_dir_check()
     dir_logger = identify_folders(root)
+    # The folder tree of a recorded session is the mask set folder, above the revisions
+    session_tape.set_tree(os.path.dirname(os.path.dirname(os.path.abspath(revision_dir))))
     utils.verbose(message=f"Mask Name: {dir_logger['mask_name']}")
     utils.verbose(message=f"Revision: {dir_logger['revision']}")
     utils.verbose(message=f"Dataprep: {dir_logger['dataprep']}")
     utils.verbose(message=f"Final Mask: {dir_logger['final_mask']}")
+    record_event(
+        "folders_identified",
+        phase="setup",
+        paths=[folder for folder in dir_logger.values() if folder],
+        folders=dir_logger,
+    )
 
     return list(dir_logger.values())
 
@@ -282,6 +318,7 @@ def find_folders(directory):
     return folders
 
 
+@spans.timed()
 def find_files(base_name=None, extension=None, directory=None):
     """
     Search for files in a directory that match a specific base name and/or extension.
@@ -308,16 +345,21 @@ def find_files(base_name=None, extension=None, directory=None):
                 pattern = re.compile(rf"{base_name}_v(\d+){extension}")
                 if pattern.match(file):
                     utils.debug(
-                        f"Found file: {file} with extension: {extension} in [{base_name}]"
+                        (
+                            "Found file: {} with extension: {} in [{}]",
+                            file,
+                            extension,
+                            base_name,
+                        )
                     )
                     matching_files.append(os.path.join(root, file))
             elif extension:
                 if file.endswith(extension):
-                    utils.debug(f"Found file: {file} with extension: {extension}")
+                    utils.debug(("Found file: {} with extension: {}", file, extension))
                     matching_files.append(os.path.join(root, file))
             else:
                 utils.debug(
-                    f"matching_files.append(os.path.join(root: {root}, file: {file}))"
+                    ("matching_files.append(os.path.join(root: {}, file: {}))", root, file)
                 )
                 matching_files.append(os.path.join(root, file))
 
@@ -329,7 +371,7 @@ def generate_ruid():
     Create a unique run identifier (RUID) and generate a run report file.
 
     This function generates a unique RUID, creates a run report file in the run_archive directory,
-    and writes the RUID to the file.
+    and writes the RUID to the file. The structured event stream of the run is started as well.
 
     Returns:
         str: The generated RUID.
@@ -337,26 +379,17 @@ def generate_ruid():
     Raises:
         OSError: If the run report file cannot be written.
     """
-    global ruid, run_report_file
+    global ruid, run_report_file, history_sink, event_log
     # Generate a unique run identifier
     utils.debug(message="Generating RUID...")
     ruid = str(uuid.uuid4())
     utils.debug(message="Generated RUID: " + ruid)
 
-    # Get the run archive path from the config
-    config_archive_dir = os.path.join(config_parser.get("run_archive_path"))  # anonymized
-    run_archive_dir = config_archive_dir
-
-    # If run_archive_path is not defined in the config, use the app project folder
-    if not run_archive_dir:
-        run_archive_dir = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.abspath(sys.argv[0]))),
-            "run_archive",
-        )
-
-    # Create the run_archive directory if it doesn't exist
-    os.makedirs(run_archive_dir, exist_ok=True)
-    utils.debug(message="Checking if run_archive exists? -> " + run_archive_dir)
+    run_archive_dir = get_run_archive_dir()
+    # Complete the finalisation of reports whose worker did not finish last time
+    resumed = report_finalizer.resume_pending(run_archive_dir)
+    if resumed:
+        utils.debug(message=f"Resuming finalisation of run reports: {resumed}")
     # Create a filename based on the current date
     date_str = datetime.datetime.now().strftime("%d%m%y-%H%M%S")
     filename = f"run_{date_str}.lr"
@@ -366,18 +399,219 @@ def generate_ruid():
         # Save the RUID to the file
         with open(run_report_file, "w") as file:
             file.write(f"RUID: {ruid}\n")
+        report_finalizer.start_session(run_report_file)
+        history_sink = history.HistorySink(run_report_file)
         utils.debug(message="Run report successfully written.")
     except OSError:
         raise OSError("Failed to write RUN REPORT file.")
 
+    get_events_dir()
+    event_log = run_events.EventLog(run_events.events_path(run_report_file), ruid)
+    if not session_tape.replaying():
+        # METRICS_TEXTFILE_DIR points at the collector, replays must not count as runs
+        metrics.write_at_exit(
+            metrics.textfile_path(
+                "last_resort", os.path.join(run_archive_dir, METRICS_DIR)
+            ),
+            on_error=lambda e: utils.debug(f"Failed to write the metrics: {e}"),
+        )
+    record_event(
+        "run_start",
+        phase="startup",
+        paths=[run_report_file, os.getcwd()],
+        user=getpass.getuser(),
+        argv=sys.argv[1:],
+    )
+
     return ruid
 
 
+def get_events_dir():
+    """
+    Return the folder inside the run archive where the event streams of runs are kept.
+
+    Returns:
+        str: The path to the events directory.
+    """
+    events_dir = os.path.join(get_run_archive_dir(), run_events.EVENTS_DIR)
+    os.makedirs(events_dir, exist_ok=True)
+    return events_dir
+
+
+def get_profile_base():
+    """
+    Return the path of the profiling results of the run, without suffix, see profiling.
+
+    The files are named by the RUID, or by the process ID if the run ended before the
+    RUID was generated.
+
+    Returns:
+        str: The path inside the profiles folder of the run archive.
+    """
+    # The profiles of replays are kept, they are what replaying is for
+    profiles_dir = os.path.join(get_run_archive_dir(configured=True), PROFILES_DIR)
+    os.makedirs(profiles_dir, exist_ok=True)
+    name = ruid or f"pid_{os.getpid()}"
+    return os.path.join(profiles_dir, name)
+
+
+def get_session_tape_path():
+    """
+    Return the path of the tape recording the run, see session_tape.
+
+    Returns:
+        str: The path inside the sessions folder of the run archive.
+    """
+    sessions_dir = os.path.join(get_run_archive_dir(), SESSIONS_DIR)
+    os.makedirs(sessions_dir, exist_ok=True)
+    return os.path.join(sessions_dir, ruid + session_tape.TAPE_SUFFIX)
+
+
+def record_event(event_type, phase=None, paths=(), duration=None, **fields):
+    """
+    Add an event to the structured event stream of the run.
+
+    See run_events for the event schema. Events are dropped if no run was started.
+
+    Args:
+        event_type (str): The event type, one of run_events.EVENT_TYPES.
+        phase (str, optional): The phase of the run. Defaults to the phase of the previous event.
+        paths (iterable, optional): Files or folders the event is about. Defaults to none.
+        duration (float, optional): Duration of the operation in seconds. Defaults to None.
+        **fields: Additional fields of the event.
+
+    Returns:
+        None
+    """
+    if event_log is None:
+        return
+    try:
+        event_log.emit(event_type, phase=phase, paths=paths, duration=duration, **fields)
+    except OSError as e:
+        utils.debug(f"Failed to write to the events file: {e}")
+    update_metrics(event_type, duration, fields)
+
+
+def update_metrics(event_type, duration, fields):
+    """
+    Update the metrics of the run from an event, see record_event.
+
+    The metrics are written into <run archive>/metrics/last_resort.prom, or into
+    METRICS_TEXTFILE_DIR, when the application exits. See the metrics module.
+
+    Args:
+        event_type (str): The event type, one of run_events.EVENT_TYPES.
+        duration (float): Duration of the operation in seconds, or None.
+        fields (dict): Additional fields of the event.
+    """
+    if event_type == "run_start":
+        metrics.counter(
+            "last_resort_launches_total", "Launches of Last Resort by site and host."
+        ).inc(site=os.getenv("RDPSITE", "unknown"), host=platform.node())
+        metrics.gauge(
+            "last_resort_last_launch_timestamp_seconds", "Time of the last launch."
+        ).set(time.time(), site=os.getenv("RDPSITE", "unknown"))
+    elif event_type == "archive_created":
+        kind = "delta" if fields.get("delta") else "full"
+        metrics.histogram(
+            "last_resort_archive_size_bytes",
+            "Size of the created archives.",
+            buckets=metrics.SIZE_BUCKETS,
+        ).observe(fields["archive_bytes"], kind=kind)
+        if duration:
+            metrics.gauge(
+                "last_resort_archive_throughput_bytes_per_second",
+                "Archived bytes per second of the last archive.",
+            ).set(fields["bytes"] / duration, kind=kind)
+    elif event_type in ("email_sent", "email_failed"):
+        metrics.counter(
+            "last_resort_emails_total", "Attempts to send the vendor email by outcome."
+        ).inc(outcome=fields.get("reason", "sent"))
+    elif event_type == "run_end":
+        metrics.counter("last_resort_runs_total", "Finished runs by reason.").inc(
+            reason=fields.get("reason", "unknown")
+        )
+        metrics.histogram(
+            "last_resort_run_duration_seconds", "Duration of the runs."
+        ).observe(time.monotonic() - event_log.start)
+
+
+def record_span(span):
+    """
+    Write a finished timing span into the run report, the event stream and the metrics.
+
+    Registered as a listener of the spans module.
+
+    Args:
+        span (spans.Span): The finished span.
+    """
+    utils.debug(
+        message=f"Span {span.name}: wall {span.wall:.3f} s, cpu {span.cpu:.3f} s, "
+        f"child cpu {span.children_cpu:.3f} s{' (failed)' if span.failed else ''}",
+        log=True,
+    )
+    if not span.recursive:
+        metrics.histogram(
+            "last_resort_phase_duration_seconds", "Wall clock time of the phases."
+        ).observe(span.wall, phase=span.name)
+        metrics.counter(
+            "last_resort_phase_cpu_seconds_total",
+            "CPU time of the phases, including their child processes.",
+        ).inc(span.cpu + span.children_cpu, phase=span.name)
+    record_event(
+        "span",
+        duration=span.wall,
+        name=span.name,
+        cpu=round(span.cpu, 6),
+        children_cpu=round(span.children_cpu, 6),
+        depth=span.depth,
+        failed=span.failed,
+    )
+
+
+spans.listeners.append(record_span)
+
+
+def get_run_archive_dir(configured=False):
+    """
+    Resolve the run archive directory and make sure it exists.
+
+    The path is taken from the 'run_archive_path' configuration key. If it is not defined,
+    the 'run_archive' folder inside the app project folder is used instead.
+    A replayed session (see session_tape) uses a run archive inside its snapshot tree, so
+    its report, events, index rows and shipment manifests never mix with the real ones.
+
+    Args:
+        configured (bool, optional): Return the configured run archive also while
+            replaying. Defaults to False.
+
+    Returns:
+        str: The path to the run archive directory.
+    """
+    # Get the run archive path from the config
+    run_archive_dir = config_parser.config().run_archive_path  # anonymized
+
+    if session_tape.replaying() and not configured:
+        run_archive_dir = os.path.join(session_tape.tree_dir, REPLAY_ARCHIVE_DIR)
+    # If run_archive_path is not defined in the config, use the app project folder
+    elif not run_archive_dir:
+        run_archive_dir = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(sys.argv[0]))),
+            "run_archive",
+        )
+
+    # Create the run_archive directory if it doesn't exist
+    os.makedirs(run_archive_dir, exist_ok=True)
+    utils.debug(message="Checking if run_archive exists? -> " + run_archive_dir)
+    return run_archive_dir
+
+
 def write_history(message):
     """
     Append a message to the run report file with a timestamp.
 
     This function writes a given message to the run report file, prefixed with the current timestamp.
+    The lines are buffered and written in batches, see history_sink and flush_history.
 
     Args:
         message (str): The message to append to the run report file.
@@ -385,8 +619,7 @@ def write_history(message):
     Returns:
         None
     """
-    global run_report_file
-    if not run_report_file:
+    if history_sink is None:
         utils.debug(message="Run report file not set. Cannot write history.")
         return
 
@@ -396,12 +629,60 @@ def write_history(message):
     # Append the message to the run report file
     if not ui.we_done:
         try:
-            with open(run_report_file, "a") as file:
-                file.write(f"{timestamp} - {message}\n")
+            history_sink.write(f"{timestamp} - {message}\n")
+        except OSError as e:
+            utils.debug(f"Failed to write to run report file: {e}")
+        record_event("message", message=message)
+
+
+def flush_history():
+    """
+    Write the buffered run report history and events to their files.
+
+    Must be called before the run report is read, converted or handed to another process.
+
+    Returns:
+        None
+    """
+    for sink in (history_sink, event_log):
+        if sink is None:
+            continue
+        try:
+            sink.flush()
         except OSError as e:
             utils.debug(f"Failed to write to run report file: {e}")
 
 
+def dump_flight_recorder(reason, details=()):
+    """
+    Write the recent console messages of the flight recorder into the run report.
+
+    Called when an error is printed or an exception is not handled. The recorder holds
+    the debug messages also when debug mode is off, so the report shows what led to the
+    problem. The recorder is emptied, a later error only writes the newer messages.
+
+    Args:
+        reason (str): What went wrong, written above the messages.
+        details (iterable, optional): Additional lines, e.g. a traceback. Defaults to none.
+
+    Returns:
+        None
+    """
+    lines = flight_recorder.dump()
+    if history_sink is None or ui.we_done:
+        return
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        history_sink.write(f"{timestamp} - Recent messages before: {reason}\n")
+        for line in lines:
+            history_sink.write(line)
+        for line in details:
+            history_sink.write(line)
+        history_sink.flush()
+    except OSError as e:
+        utils.debug(f"Failed to write to run report file: {e}")
+
+
 def convert_lr_to_pdf(file_in_lr_format):
     """
     Transform a .lr file into a .pdf file.
@@ -419,18 +700,18 @@ def convert_lr_to_pdf(file_in_lr_format):
         f"Converting {file_in_lr_format} to {file_in_lr_format.replace('.lr', '.pdf')}",
         log=True,
     )
+    flush_history()
     return txt_to_pdf(file_in_lr_format, file_in_lr_format.replace(".lr", ".pdf"))
 
 
-def save_checklist_to_file():
+def get_docs_directory():
     """
-    Save checklist items to a file in the 'docs' directory.
+    Locate the 'docs' directory next to dataprep and make sure it is writable.
 
-    This function creates the docs directory if it doesn't exist, generates a new filename,
-    and writes the checklist items to the file.
+    The directory is created if it doesn't exist. Problems are reported to the user.
 
     Returns:
-        str: The path to the saved checklist file, or None if an error occurs.
+        str: The path to the docs directory, or None if it cannot be used.
     """
     docs_directory = "/".join(dataprep_dir.split("/")[:-1]) + "/docs"
 
@@ -454,41 +735,61 @@ def save_checklist_to_file():
         )
         return
 
-    save_path = generate_checklist_filename("LR_Checklist", ".lrc", docs_directory)
-    utils.debug(message=f"Writing temporary checklist file: {save_path}")
+    return docs_directory
 
-    # Additional debugging to check permissions
-    if not os.access(docs_directory, os.W_OK):
-        utils.debug(f"Write permission denied for directory: {docs_directory}")
-        messagebox.showerror(
-            "Error", f"No write permission for docs directory: {docs_directory}"
-        )
-        return
 
-    checklist_items = ui.checklist_items
+def checklist_lines():
+    """
+    Build the lines of the checklist record from the current state of the checklist.
+
+    The record holds the creation time, the user, the application version and the state
+    of every item in ui.chl_vars.
+
+    Returns:
+        list: The lines of the checklist record, each ending with a newline.
+    """
     timestamp = datetime.datetime.now().strftime("%d-%m-%Y %H:%M:%S")
     first_name, last_name, username = utils.get_full_name()
     app_version = utils.get_release_version()
+    utils.debug(
+        message=f"Created on: {timestamp} by {first_name} {last_name} ({username}).",
+        log=True,
+    )
+    utils.debug(message=f"\nLast Resort version: {app_version}\n", log=True)
+
+    lines = [
+        f"Created on: {timestamp} by {first_name} {last_name} ({username}).\n",
+        f"Last Resort version: {app_version}\n",
+        "\n",
+    ]
+    for i, item in enumerate(ui.checklist_items):
+        line = f"{item}: {'Checked' if ui.chl_vars[i].get() else 'Unchecked'}"
+        utils.debug(message=line)
+        lines.append(line + "\n")
+    return lines
+
+
+def save_checklist_to_file():
+    """
+    Save checklist items to a file in the 'docs' directory.
+
+    This function creates the docs directory if it doesn't exist, generates a new filename,
+    and writes the checklist items to the file.
+
+    Returns:
+        str: The path to the saved checklist file, or None if an error occurs.
+    """
+    docs_directory = get_docs_directory()
+    if docs_directory is None:
+        return
+
+    save_path = generate_checklist_filename("LR_Checklist", ".lrc", docs_directory)
+    utils.debug(message=f"Writing temporary checklist file: {save_path}")
+
     try:
         utils.debug(message="Attempting to write a checklist file: ", log=True)
         with open(save_path, "w") as file:
-            file.write(
-                f"Created on: {timestamp} by {first_name} {last_name} ({username})."
-                f"\nLast Resort version: {app_version}\n\n"
-            )
-            utils.debug(
-                message=f"Created on: {timestamp} by {first_name} {last_name} ({username}).",
-                log=True,
-            )
-            utils.debug(message=f"\nLast Resort version: {app_version}\n", log=True)
-
-            for i, item in enumerate(checklist_items):
-                file.write(
-                    f"{item}: {'Checked' if ui.chl_vars[i].get() else 'Unchecked'}\n"
-                )
-                utils.debug(
-                    message=f"{item}: {'Checked' if ui.chl_vars[i].get() else 'Unchecked'}"
-                )
+            file.writelines(checklist_lines())
     except PermissionError as e:
         utils.debug(f"PermissionError: {e}")
         messagebox.showerror("Error", f"Permission denied: {save_path}")
@@ -497,37 +798,101 @@ def save_checklist_to_file():
     return save_path
 
 
+def write_file_atomically(path, content, mode=0o444):
+    """
+    Write a file in a single write and make it appear under its name at once.
+
+    The content is written to a temporary file in the target directory, which gets its
+    final permissions and is then hard-linked to the target path. Readers never see a
+    partial file, and an existing file of the same name is never replaced. On file
+    systems without hard links the name is reserved by creating an empty file
+    exclusively, which the temporary file then replaces.
+
+    Args:
+        path (str): The path of the file to create.
+        content (bytes): The content of the file.
+        mode (int, optional): The permissions of the created file. Defaults to 0o444 (read-only).
+
+    Returns:
+        str: The path to the created file.
+
+    Raises:
+        FileExistsError: If the target file already exists.
+        PermissionError: If the directory is not writable.
+    """
+    directory, name = os.path.split(path)
+    handle, temporary_path = tempfile.mkstemp(prefix=f".{name}.", dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as file:
+            file.write(content)
+        os.chmod(temporary_path, mode)
+        try:
+            # A hard link fails instead of replacing a file that appeared in the meantime
+            os.link(temporary_path, path)
+        except OSError as error:
+            if isinstance(error, FileExistsError) or error.errno not in LINK_UNSUPPORTED:
+                raise
+            utils.debug(message=f"No hard links in {directory}: {error}")
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode))
+            os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+    return path
+
+
+@spans.timed()
 def save_checklist_to_pdf():
     """
     Save checklist items to a PDF file.
 
-    This function saves the checklist items to a temporary file, converts it to a PDF,
-    and sets the PDF file to read-only.
+    This function renders the checklist straight from its in-memory state to a PDF
+    in the 'docs' directory. The PDF is written read-only in a single atomic write,
+    without an intermediate checklist file.
 
     Returns:
         str: The path to the saved PDF file, or None if an error occurs.
     """
-    lrc_file = save_checklist_to_file()
-    pdf_filename = txt_to_pdf(lrc_file, lrc_file.replace(".lrc", ".pdf"))
-
-    # Check if the PDF file was created
-    if not os.path.exists(pdf_filename):
-        utils.verbose(message=f"PDF file not found: {pdf_filename}")
-        # os.remove(lrc_file)
+    docs_directory = get_docs_directory()
+    if docs_directory is None:
         return None
 
-    # Remove the temporary .po file
-    os.remove(lrc_file)
+    start = time.monotonic()
+    buffer = io.BytesIO()
+    report_pdf.render_lines(checklist_lines(), buffer, footer_text=f"RUID: {ruid}")
+
+    for attempt in range(CHECKLIST_SAVE_ATTEMPTS):
+        pdf_filename = generate_checklist_filename(
+            "LR_Checklist", ".pdf", docs_directory
+        )
+        try:
+            write_file_atomically(pdf_filename, buffer.getvalue())
+            break
+        except FileExistsError:
+            # Another session saved the same version meanwhile, take the next one
+            utils.debug(f"{pdf_filename} was saved by another session meanwhile")
+        except PermissionError as e:
+            utils.debug(f"PermissionError: {e}")
+            messagebox.showerror("Error", f"Permission denied: {pdf_filename}")
+            return None
+    else:
+        messagebox.showerror(
+            "Error", f"Could not find a free checklist version in {docs_directory}"
+        )
+        return None
 
     utils.verbose(message=f"Generated PDF: {pdf_filename} and set to read-only")
+    record_event(
+        "checklist_saved",
+        phase="checklist",
+        paths=[pdf_filename],
+        duration=time.monotonic() - start,
+    )
 
     messagebox.showinfo(
         "Success", f"File saved successfully at {os.path.abspath(pdf_filename)}"
     )
     utils.printer(message="Checklist successfully saved.", log_type=utils.Type.INFO)
-
-    # Set the generated PDF to read-only
-    os.chmod(pdf_filename, 0o444)
     utils.debug(f"Set file to read-only (0o444): {pdf_filename}")
 
     return pdf_filename
@@ -574,27 +939,12 @@ def generate_checklist_filename(base_name, extension, checklist_dir=None):
     return full_path
 
 
-class PDF(FPDF):
-    def footer(self):
-        """
-        Add a footer to the PDF with the RUID.
-
-        This method sets the footer to 1.5 cm from the bottom, selects Arial italic font,
-        and prints the RUID centered at the bottom of the page.
-        """
-        # Go to 1.5 cm from bottom
-        self.set_y(-15)
-        # Select Arial italic 8
-        self.set_font("Arial", "I", 8)
-        # Print centered RUID
-        self.cell(0, 10, f"RUID: {ruid}", 0, 0, "C")
-
-
 def txt_to_pdf(txt_file, pdf_file):
     """
     Convert a text file to a PDF file.
 
-    This function reads the content of a text file, writes it to a PDF file,
+    This function lays out the content of a text file with the bulk text renderer
+    (see report_pdf), writes it to a PDF file with the RUID in the footer of every page,
     and handles any permission errors by generating a new filename.
 
     Args:
@@ -605,18 +955,10 @@ def txt_to_pdf(txt_file, pdf_file):
         str: The path to the created PDF file.
     """
     global ruid
-    pdf = PDF()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.set_font("Arial", size=12)
-
-    with open(txt_file, "r", encoding="utf-8") as file:
-        for line in file:
-            # Split long lines into multiple lines that fit within the page width
-            pdf.multi_cell(0, 15, line)
+    footer_text = f"RUID: {ruid}"
 
     try:
-        pdf.output(pdf_file)
+        report_pdf.text_file_to_pdf(txt_file, pdf_file, footer_text)
         utils.verbose(message=f"PDF generated: {pdf_file}")
     except PermissionError as e:
         utils.debug(message=f"PermissionError: {e}")
@@ -627,7 +969,7 @@ def txt_to_pdf(txt_file, pdf_file):
         pdf_file = generate_checklist_filename(
             base_name, extension, os.path.dirname(pdf_file)
         )
-        pdf.output(pdf_file)
+        report_pdf.text_file_to_pdf(txt_file, pdf_file, footer_text)
     return pdf_file
 
 
@@ -641,15 +983,24 @@ def lock_run_report(pdf_mode=True):
     Args:
         pdf_mode (bool): Whether to convert the run report to a PDF before locking it. Defaults to True.
     """
-    global run_report_file
+    global run_report_file, history_sink
+    # The report is final from here on, later messages are not written anymore
+    if history_sink is not None:
+        history_sink.close()
+        history_sink = None
     try:
         if pdf_mode:
             pdf_file = convert_lr_to_pdf(run_report_file)
             os.remove(run_report_file)
             utils.debug(message=f"Removing run report in .lr format.", log=True)
             os.chmod(pdf_file, 0o444)  # Change the permissions of the new PDF file
+            record_event("report_locked", phase="shutdown", paths=[pdf_file])
         else:
             os.chmod(run_report_file, 0o444)
+            record_event("report_locked", phase="shutdown", paths=[run_report_file])
+        report_finalizer.end_session(run_report_file)
+        flush_history()
+        report_finalizer.index_run(run_report_file)
     except FileNotFoundError as error:
         utils.debug("Caught FileNotFoundError in file_operations!", log=True)
         utils.debug(f"The error message: {error}!", log=True)
@@ -689,6 +1040,207 @@ def copy_folder(source_dir, destination_dir):
         raise
 
 
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """
+    Compute the SHA-256 checksum of a file.
+
+    Args:
+        file_path (str): The path to the file to hash.
+        chunk_size (int, optional): Number of bytes read at once. Defaults to 1 MiB.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the file content.
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def build_manifest(directory, excluded_suffix=None):
+    """
+    Describe every file of a directory tree the way it would be archived.
+
+    The keys are the archive member names (paths relative to the directory), the values
+    hold the size and SHA-256 checksum of the file.
+
+    Args:
+        directory (str): The directory to describe.
+        excluded_suffix (str, optional): Files ending with this suffix are left out. Defaults to None.
+
+    Returns:
+        dict: The manifest of the directory.
+    """
+    manifest = {}
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            file_path = os.path.join(root, file)
+            if excluded_suffix and file_path.endswith(excluded_suffix):
+                continue
+            # Archives being written are never archived, see utils.write_archive
+            if file_path.endswith(utils.PART_SUFFIX):
+                continue
+            if not os.path.isfile(file_path):
+                continue
+            manifest[os.path.relpath(file_path, directory)] = {
+                "size": os.path.getsize(file_path),
+                "sha256": hash_file(file_path),
+            }
+    utils.debug(message=f"Manifest of {directory} contains {len(manifest)} files")
+    return manifest
+
+
+def diff_manifests(previous, current):
+    """
+    Compare two manifests and report what changed between them.
+
+    Args:
+        previous (dict): The manifest of the previously shipped archive.
+        current (dict): The manifest of the current folder.
+
+    Returns:
+        tuple: A sorted list of added or changed member names and a sorted list of deleted member names.
+    """
+    changed = sorted(
+        name
+        for name, entry in current.items()
+        if name not in previous or previous[name]["sha256"] != entry["sha256"]
+    )
+    deleted = sorted(name for name in previous if name not in current)
+    return changed, deleted
+
+
+def get_manifest_dir():
+    """
+    Return the folder inside the run archive where shipment manifests are kept.
+
+    Returns:
+        str: The path to the manifest directory.
+    """
+    manifest_dir = os.path.join(get_run_archive_dir(), "manifests")
+    os.makedirs(manifest_dir, exist_ok=True)
+    return manifest_dir
+
+
+def save_pending_manifest(
+    archive_name, manifest, vendor_archive, vendor_sha256, delta=False
+):
+    """
+    Store the manifest of a vendor archive until the archive is shipped.
+
+    The manifest always describes the full content of the archived folder, also for delta
+    archives, so that the next delta is computed against what the vendor has by then.
+    Building an archive does not ship it: the manifest only becomes the one of the last
+    shipment when the email script sent the archive, see promote_pending_manifests().
+    A later archive of the same name replaces the pending manifest.
+
+    Args:
+        archive_name (str): The file name of the full archive.
+        manifest (dict): The manifest of the archived folder.
+        vendor_archive (str): The path of the vendor archive.
+        vendor_sha256 (str): The SHA-256 checksum of the vendor archive.
+        delta (bool, optional): Whether the vendor archive is a delta archive. Defaults to False.
+
+    Returns:
+        str: The path to the pending manifest file, or None if it could not be written.
+    """
+    pending_dir = os.path.join(get_manifest_dir(), "pending")
+    pending_path = os.path.join(pending_dir, archive_name.replace(".tar.gz", ".json"))
+    try:
+        os.makedirs(pending_dir, exist_ok=True)
+        pending = {
+            "ruid": ruid,
+            "archive": archive_name,
+            "vendor_archive": os.path.abspath(vendor_archive),
+            "vendor_archive_sha256": vendor_sha256,
+            "delta": delta,
+            "files": manifest,
+        }
+        with open(pending_path, "w") as file:
+            json.dump(pending, file, indent=1, sort_keys=True)
+        utils.debug(message=f"Pending shipment manifest saved to {pending_path}", log=True)
+    except OSError as e:
+        utils.debug(message=f"Failed to save pending shipment manifest: {e}", log=True)
+        return None
+    return pending_path
+
+
+def promote_pending_manifests(shipped_dir):
+    """
+    Record the pending manifests of the archives shipped from a folder as shipments.
+
+    Called when the email script sent the archive of the folder. A pending manifest is
+    promoted if its vendor archive is still in the folder, unchanged.
+
+    Args:
+        shipped_dir (str): The folder the email script shipped the archive from.
+
+    Returns:
+        list: The paths to the saved shipment manifests.
+    """
+    manifest_dir = get_manifest_dir()
+    pending_dir = os.path.join(manifest_dir, "pending")
+    if not os.path.isdir(pending_dir):
+        return []
+    saved = []
+    for name in sorted(os.listdir(pending_dir)):
+        pending_path = os.path.join(pending_dir, name)
+        try:
+            with open(pending_path, "r") as file:
+                pending = json.load(file)
+            vendor_archive = pending["vendor_archive"]
+            if os.path.dirname(vendor_archive) != os.path.abspath(shipped_dir):
+                continue
+            if hash_file(vendor_archive) != pending["vendor_archive_sha256"]:
+                continue
+        except (OSError, ValueError, KeyError):
+            # The vendor archive was removed or replaced, it was not shipped from here
+            continue
+        created = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        pending["created"] = created
+        manifest_name = pending["archive"].replace(".tar.gz", "") + f"_{created}.json"
+        manifest_path = os.path.join(manifest_dir, manifest_name)
+        try:
+            with open(manifest_path, "w") as file:
+                json.dump(pending, file, indent=1, sort_keys=True)
+            os.remove(pending_path)
+        except OSError as e:
+            utils.debug(message=f"Failed to save shipment manifest: {e}", log=True)
+            continue
+        utils.debug(message=f"Shipment manifest saved to {manifest_path}", log=True)
+        saved.append(manifest_path)
+    return saved
+
+
+def load_previous_manifest(archive_name):
+    """
+    Load the manifest of the last shipment of an archive with the same name.
+
+    Args:
+        archive_name (str): The file name of the archive to be shipped.
+
+    Returns:
+        dict: The file manifest of the previous shipment, or None if there was none.
+    """
+    # Only <archive>_<created>.json, not the manifests of archives whose names start
+    # the same, e.g. a longer mask name
+    pattern = re.compile(
+        re.escape(archive_name.replace(".tar.gz", "")) + r"_\d{8}-\d{6}\.json"
+    )
+    manifest_dir = get_manifest_dir()
+    candidates = sorted(
+        name for name in os.listdir(manifest_dir) if pattern.fullmatch(name)
+    )
+    if not candidates:
+        utils.debug(message=f"No previous manifest found for {archive_name}")
+        return None
+    previous_path = os.path.join(manifest_dir, candidates[-1])
+    utils.debug(message=f"Using previous manifest {previous_path}", log=True)
+    with open(previous_path, "r") as file:
+        return json.load(file)["files"]
+
+
 def search_string_in_file(file_path, search_string):
     """
     Search for a specific string in a file.
@@ -1,9 +1,573 @@
 #!/usr/bin/env python
+"""
+Read-only preview of the .jb and .po files.
+
+Job decks and verbose reports can be large. The file is not read into the text widget as
+a whole: it is memory-mapped, a background thread indexes the offsets of its lines and
+the widget only holds the lines around the visible ones, loaded as the view is scrolled.
+The first screen is shown as soon as its lines are indexed, whatever the size of the
+file. The scrollbar represents the whole file, while the index is being built the number
+of lines is estimated from the part indexed so far. The loaded lines are highlighted in
+idle time, see syntax_highlight.
+
+Started with --serve, the presenter is the preview server of presenter_client: one
+process showing the previews of all sessions of the user, in a window per session and
+screen position, reused for the next file. It exits after IDLE_TIMEOUT seconds without
+a shown window. Started with a file, it shows that file in a window of its own.
+"""
+import array
+import fcntl
+import json
+import mmap
+import os
+import re
+import socket
+import sys
+import threading
+import time
 import tkinter as tk
 from tkinter import messagebox
-import sys
 from _tkinter import TclError
 
+import presenter_client
+import syntax_highlight
+
+# Bytes indexed per step of the background thread
+CHUNK_BYTES = 4 * 1024 * 1024
+# Bytes indexed before the window is shown, enough for the first screen
+FIRST_CHUNK_BYTES = 1024 * 1024
+# Lines loaded into the widget at once
+LOAD_LINES = 300
+# More lines are loaded when fewer than this are left beyond the visible ones
+MARGIN_LINES = 100
+# Lines farther from the view are dropped from the widget
+MAX_LOADED_LINES = 1500
+# Milliseconds between two refreshes while the index is being built
+PROGRESS_INTERVAL = 200
+ENCODING = "utf-8"
+
+# Geometry of the preview windows by screen position
+GEOMETRY = {"left": "950x780+1920+0", "right": "950x780+2880+0"}
+# Seconds without a shown window after which the preview server exits
+IDLE_TIMEOUT = 2 * 60 * 60
+# Milliseconds between two checks of the idle time
+IDLE_CHECK_INTERVAL = 60 * 1000
+MAX_REQUEST_BYTES = 64 * 1024
+
+NEWLINE = re.compile(b"\n")
+
+
+class LineIndex:
+    """
+    Offsets of the lines of a memory-mapped file.
+
+    The index is built by extend(), in steps, so it can run in a background thread
+    while the lines indexed so far are read.
+
+    Attributes:
+        path (str): The path of the file.
+        size (int): The size of the file in bytes.
+        signature (tuple): The size and modification time of the file.
+        offsets (array.array): The offsets of the line starts found so far.
+        indexed (int): Number of bytes indexed so far.
+        complete (bool): Whether the whole file is indexed.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The path of the file.
+
+        Raises:
+            OSError: If the file cannot be opened or mapped.
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        status = os.fstat(self._file.fileno())
+        self.size = status.st_size
+        # Identifies the content, see FileView.shows()
+        self.signature = (status.st_size, status.st_mtime_ns)
+        self._data = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.size
+            else b""
+        )
+        self.offsets = array.array("q", [0])
+        self.indexed = 0
+        self.complete = self.size == 0
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def extend(self, chunk_bytes=CHUNK_BYTES):
+        """
+        Index the next part of the file.
+
+        Args:
+            chunk_bytes (int, optional): Number of bytes to index. Defaults to
+                CHUNK_BYTES.
+
+        Returns:
+            bool: False once the whole file is indexed or the index is closed.
+        """
+        with self._lock:
+            if self.complete or self.closed:
+                return False
+            start = self.indexed
+            end = min(self.size, start + chunk_bytes)
+            chunk = self._data[start:end]
+            found = array.array("q", (start + m.end() for m in NEWLINE.finditer(chunk)))
+            # Extended at once, readers never see a partial step
+            self.offsets.extend(found)
+            self.indexed = end
+            self.complete = end == self.size
+            return not self.complete
+
+    def build(self):
+        """
+        Index the rest of the file, e.g. in a background thread.
+        """
+        while self.extend():
+            pass
+
+    def line_count(self):
+        """
+        Return the number of lines indexed so far.
+
+        Returns:
+            int: The number of complete lines, with the last line once the whole file
+                is indexed.
+        """
+        count = len(self.offsets)
+        if self.complete and self.offsets[-1] < self.size:
+            return count
+        return count - 1
+
+    def estimated_line_count(self):
+        """
+        Return the number of lines of the file, estimated while the index is built.
+
+        Returns:
+            int: The number of lines, at least 1.
+        """
+        if self.complete or not self.indexed:
+            return max(self.line_count(), 1)
+        return max(int(self.line_count() * self.size / self.indexed), 1)
+
+    def lines(self, first, last):
+        """
+        Return the text of indexed lines.
+
+        Args:
+            first (int): The first line, from 0.
+            last (int): The line after the last one.
+
+        Returns:
+            str: The lines, each ending with a newline except maybe the last of the file.
+        """
+        last = min(last, self.line_count())
+        if first >= last or self.closed:
+            return ""
+        end = self.offsets[last] if last < len(self.offsets) else self.size
+        data = self._data[self.offsets[first] : end]
+        return data.decode(ENCODING, errors="replace").replace("\r\n", "\n")
+
+    def close(self):
+        """
+        Stop indexing and release the file.
+        """
+        with self._lock:
+            self.closed = True
+            if self.size:
+                self._data.close()
+            self._file.close()
+
+
+class FileView:
+    """
+    Read-only text view of a file, loading its lines as they are scrolled into view.
+
+    The text widget holds the lines first to last of the file; line n of the widget is
+    line first + n - 1 of the file.
+
+    Attributes:
+        index (LineIndex): The index of the file.
+        text (tk.Text): The text widget.
+        scrollbar (tk.Scrollbar): The scrollbar, representing the whole file.
+        highlighter (syntax_highlight.Highlighter): Highlights the loaded lines.
+        first (int): The first line of the file in the widget.
+        last (int): The line after the last line of the file in the widget.
+    """
+
+    def __init__(self, master, path):
+        """
+        Create the widgets in a window and show the beginning of a file.
+
+        Args:
+            master (tk.Misc): The window.
+            path (str): The path of the file.
+
+        Raises:
+            OSError: If the file cannot be opened.
+        """
+        self.master = master
+        self.index = LineIndex(path)
+        self.first = 0
+        self.last = 0
+        self._check_scheduled = False
+
+        self.scrollbar = tk.Scrollbar(master, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text = tk.Text(master, wrap="word", yscrollcommand=self.on_view_changed)
+        self.text.pack(expand=1, fill="both")
+        self.text.config(state=tk.DISABLED)  # Make text widget read-only
+        self.highlighter = syntax_highlight.Highlighter(self, path)
+
+        # The first screen is indexed right away, the rest in the background
+        self.index.extend(FIRST_CHUNK_BYTES)
+        self.load(0)
+        if not self.index.complete:
+            threading.Thread(target=self._build_index, daemon=True).start()
+            self.master.after(PROGRESS_INTERVAL, self._show_progress)
+
+    def _build_index(self):
+        try:
+            self.index.build()
+        except (ValueError, OSError):
+            # The file was closed or replaced while it was indexed
+            pass
+
+    def _show_progress(self):
+        if self.index.closed:
+            return
+        self.check()
+        if not self.index.complete:
+            self.master.after(PROGRESS_INTERVAL, self._show_progress)
+
+    def _edit(self, function, *args):
+        self.text.config(state=tk.NORMAL)
+        function(*args)
+        self.text.config(state=tk.DISABLED)
+
+    def top_line(self):
+        """
+        Return the line of the file at the top of the view.
+
+        Returns:
+            int: The line, from 0.
+        """
+        return self.first + int(self.text.index("@0,0").split(".")[0]) - 1
+
+    def bottom_line(self):
+        """
+        Return the line of the file at the bottom of the view.
+
+        Returns:
+            int: The line, from 0.
+        """
+        bottom = self.text.index(f"@0,{self.text.winfo_height()}")
+        return self.first + int(bottom.split(".")[0]) - 1
+
+    def show_line(self, line):
+        """
+        Scroll a loaded line of the file to the top of the view.
+
+        Args:
+            line (int): The line, from 0.
+        """
+        self.text.yview(f"{line - self.first + 1}.0")
+
+    def load(self, first):
+        """
+        Replace the lines in the widget by the lines from first on.
+
+        Args:
+            first (int): The first line to load, from 0.
+        """
+        self.first = first
+        self.last = min(first + LOAD_LINES, self.index.line_count())
+        self._edit(self.text.delete, "1.0", tk.END)
+        self._edit(self.text.insert, "1.0", self.index.lines(self.first, self.last))
+        self.highlighter.reset()
+
+    def on_view_changed(self, top, bottom):
+        """
+        Follow a change of the view of the text widget, e.g. by the mouse wheel.
+
+        Args:
+            top (str): The fraction of the widget content above the view.
+            bottom (str): The fraction of the widget content above the view bottom.
+        """
+        if not self._check_scheduled:
+            # Loading lines changes the view again, so it is done once the event ends
+            self._check_scheduled = True
+            self.master.after_idle(self.check)
+        self.update_scrollbar()
+
+    def on_scrollbar(self, command, *args):
+        """
+        Scroll the view from the scrollbar, which represents the whole file.
+
+        Args:
+            command (str): 'moveto' or 'scroll'.
+            *args: The fraction for 'moveto', the amount and unit for 'scroll'.
+        """
+        if command == "scroll":
+            self.text.yview_scroll(int(args[0]), args[1])
+            return
+        line = int(float(args[0]) * self.index.estimated_line_count())
+        line = max(0, min(line, self.index.line_count() - 1))
+        loaded_to_end = self.last >= self.index.line_count()
+        if line < self.first or (line >= self.last - MARGIN_LINES and not loaded_to_end):
+            self.load(max(0, line - MARGIN_LINES))
+        self.show_line(line)
+
+    def check(self):
+        """
+        Load the lines around the view and drop those far from it.
+        """
+        self._check_scheduled = False
+        if self.index.closed:
+            return
+        top = self.top_line()
+        bottom = self.bottom_line()
+        changed = False
+        if self.last - bottom < MARGIN_LINES and self.last < self.index.line_count():
+            last = min(self.last + LOAD_LINES, self.index.line_count())
+            self._edit(self.text.insert, tk.END, self.index.lines(self.last, last))
+            self.last = last
+            changed = True
+        if top - self.first < MARGIN_LINES and self.first > 0:
+            first = max(0, self.first - LOAD_LINES)
+            self._edit(self.text.insert, "1.0", self.index.lines(first, self.first))
+            self.first = first
+            changed = True
+        if self.last - self.first > MAX_LOADED_LINES:
+            # Drop the lines on the side farther from the view
+            if top - self.first > self.last - bottom:
+                drop = top - MARGIN_LINES - self.first
+                if drop > 0:
+                    self._edit(self.text.delete, "1.0", f"{drop + 1}.0")
+                    self.first += drop
+            else:
+                keep = bottom + MARGIN_LINES - self.first
+                if keep < self.last - self.first:
+                    self._edit(self.text.delete, f"{keep + 1}.0", tk.END)
+                    self.last = self.first + keep
+            changed = True
+        if changed:
+            # The widget content moved, the same line of the file stays on top
+            self.show_line(top)
+            self.highlighter.schedule()
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        """
+        Show the position of the view in the whole file on the scrollbar.
+        """
+        if self.index.closed:
+            return
+        total = self.index.estimated_line_count()
+        top = self.top_line()
+        bottom = self.bottom_line() + 1
+        self.scrollbar.set(min(top / total, 1.0), min(bottom / total, 1.0))
+
+    def shows(self, path):
+        """
+        Check whether the view shows the current content of a file.
+
+        Args:
+            path (str): The path to the file.
+
+        Returns:
+            bool: True if the view shows the file and the file did not change since.
+        """
+        if self.index.closed:
+            return False
+        if os.path.abspath(path) != os.path.abspath(self.index.path):
+            return False
+        try:
+            status = os.stat(path)
+        except OSError:
+            return False
+        return (status.st_size, status.st_mtime_ns) == self.index.signature
+
+    def close(self):
+        """
+        Stop indexing and release the file.
+        """
+        self.index.close()
+
+
+class PreviewServer:
+    """
+    Preview windows of all sessions, controlled through a Unix socket.
+
+    Requests are accepted in the Tk thread when the socket is readable, see
+    presenter_client for the protocol. The windows are keyed by the session and the
+    screen position, a session only replaces and hides its own previews. A hidden
+    window is taken over by the next session needing a window at its position.
+
+    Attributes:
+        root (tk.Tk): The hidden root window.
+        listener (socket.socket): The listening socket.
+        windows (dict): The preview window of each (session, position) key.
+        views (dict): The FileView shown in each window, None for a hidden window.
+    """
+
+    def __init__(self, root, listener):
+        self.root = root
+        self.listener = listener
+        self.windows = {}
+        self.views = {}
+        self.idle_since = time.monotonic()
+        root.tk.createfilehandler(listener, tk.READABLE, self._accept)
+        root.after(IDLE_CHECK_INTERVAL, self._check_idle)
+
+    def _accept(self, listener, mask):
+        try:
+            connection, _ = listener.accept()
+        except OSError:
+            return
+        with connection:
+            try:
+                connection.settimeout(presenter_client.REPLY_TIMEOUT)
+                data = b""
+                while len(data) < MAX_REQUEST_BYTES:
+                    chunk = connection.recv(4096)
+                    if not chunk:
+                        break
+                    data += chunk
+                reply = self.handle(json.loads(data))
+                connection.sendall(json.dumps(reply).encode() + b"\n")
+            except (OSError, ValueError):
+                # The client went away or sent garbage, the next one is served
+                pass
+
+    def handle(self, message):
+        """
+        Perform a request.
+
+        Args:
+            message (dict): The request.
+
+        Returns:
+            dict: The reply.
+        """
+        action = message.get("action")
+        session = str(message.get("session", ""))
+        try:
+            if action == "open":
+                key = (session, message.get("position", "left"))
+                self.open(message["path"], key)
+            elif action == "close_all":
+                for key in list(self.views):
+                    if key[0] == session:
+                        self.hide(key)
+            elif action != "ping":
+                return {"ok": False, "error": f"Unknown action {action!r}"}
+        except (KeyError, OSError, TclError) as e:
+            return {"ok": False, "error": str(e)}
+        return {"ok": True, "pid": os.getpid()}
+
+    def open(self, path, key):
+        """
+        Show a file in the window of a session and screen position.
+
+        Args:
+            path (str): The path to the file.
+            key (tuple): The session and the screen position, 'left' or 'right'.
+
+        Raises:
+            OSError: If the file cannot be opened.
+        """
+        window = self.windows.get(key)
+        if window is None:
+            window = self._window(key)
+        view = self.views.get(key)
+        if view is None or not view.shows(path):
+            self._clear(key)
+            self.views[key] = FileView(window, path)
+        window.title(f"Preview - {path}")
+        window.deiconify()
+        window.lift()
+
+    def _window(self, key):
+        # Take over a hidden window at the same position, or create one
+        for other in list(self.windows):
+            if other[1] == key[1] and self.views.get(other) is None:
+                window = self.windows.pop(other)
+                self.views.pop(other, None)
+                break
+        else:
+            window = tk.Toplevel(self.root)
+            window.geometry(GEOMETRY.get(key[1], GEOMETRY["left"]))
+        window.protocol("WM_DELETE_WINDOW", lambda: self.hide(key))
+        self.windows[key] = window
+        return window
+
+    def hide(self, key):
+        """
+        Hide the window of a session and screen position and release its file.
+
+        Args:
+            key (tuple): The session and the screen position.
+        """
+        self._clear(key)
+        self.windows[key].withdraw()
+        if not any(self.views.values()):
+            self.idle_since = time.monotonic()
+
+    def _clear(self, key):
+        view = self.views.pop(key, None)
+        if view is not None:
+            view.close()
+        for child in self.windows[key].winfo_children():
+            child.destroy()
+        self.views[key] = None
+
+    def _check_idle(self):
+        idle = time.monotonic() - self.idle_since
+        if not any(self.views.values()) and idle > IDLE_TIMEOUT:
+            self.root.quit()
+            return
+        self.root.after(IDLE_CHECK_INTERVAL, self._check_idle)
+
+
+def serve():
+    """
+    Run the preview server until it is idle, unless one is running already.
+
+    Returns:
+        None
+    """
+    path = presenter_client.socket_path()
+    # The lock is held while the server runs, so a second server exits right away
+    lock = open(path + ".lock", "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return
+    if os.path.exists(path):
+        # Left behind by a server that did not exit cleanly
+        os.unlink(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    previous_umask = os.umask(0o077)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(previous_umask)
+    listener.listen(8)
+    try:
+        root = tk.Tk()
+        root.withdraw()
+        PreviewServer(root, listener)
+        root.mainloop()
+    finally:
+        listener.close()
+        os.unlink(path)
+        lock.close()
+
 
 def file_presenter(provided_file=None, screen_position="left"):
     """
@@ -19,23 +583,7 @@ def file_presenter(provided_file=None, screen_position="left"):
     Returns:
         None
     """
-
-    def load_file(file_path):
-        """
-        Load the content of the specified file into the text widget.
-
-        Args:
-            file_path (str): The path to the file to load.
-
-        Returns:
-            None
-        """
-        with open(file_path, "r") as file:
-            content = file.read()
-            text_widget.config(state=tk.NORMAL)  # Enable editing to insert text
-            text_widget.delete(1.0, tk.END)  # Clear existing content
-            text_widget.insert(tk.END, content)  # Insert file content
-            text_widget.config(state=tk.DISABLED)  # Make text widget read-only
+    view = None
 
     def on_exit():
         """
@@ -46,6 +594,8 @@ def file_presenter(provided_file=None, screen_position="left"):
         Returns:
             None
         """
+        if view is not None:
+            view.close()
         lrfp.destroy()
 
     lrfp = tk.Tk()
@@ -54,19 +604,11 @@ def file_presenter(provided_file=None, screen_position="left"):
         "950x780+1920+0" if screen_position == "left" else "950x780+2880+0"
     )  # Adjust positions
 
-    # Create a scrollbar
-    scrollbar = tk.Scrollbar(lrfp)
-    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-    text_widget = tk.Text(lrfp, wrap="word", yscrollcommand=scrollbar.set)
-    text_widget.pack(expand=1, fill="both")
-    text_widget.config(state=tk.DISABLED)  # Make text widget read-only initially
-
-    # Configure the scrollbar
-    scrollbar.config(command=text_widget.yview)
-
     if provided_file:
-        load_file(provided_file)
+        try:
+            view = FileView(lrfp, provided_file)
+        except OSError as e:
+            messagebox.showerror("Preview", f"Cannot open {provided_file}: {e}")
     else:
         print("File to open was not found!")
 
@@ -76,12 +618,14 @@ def file_presenter(provided_file=None, screen_position="left"):
 
 if __name__ == "__main__":
     try:
-        if len(sys.argv) > 2:
+        if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+            serve()
+        elif len(sys.argv) > 2:
             file_presenter(sys.argv[1], sys.argv[2])
         elif len(sys.argv) > 1:
             file_presenter(sys.argv[1])
         else:
-            print("Usage: python lr_previewer.py <file_to_open> [left|right]")
+            print("Usage: python lr_previewer.py <file_to_open> [left|right] | --serve")
     except TclError:
         print("WARNING\tFile Presenter shut down unexpectedly.")
     except KeyboardInterrupt:
@@ -0,0 +1,65 @@
+"""
+In-memory flight recorder of the console messages.
+
+Every printer, verbose and debug message is recorded in a fixed-size ring buffer, also
+when it is not printed because debug mode is off. Nothing is written anywhere until an
+error, an uncaught exception or a KeyboardInterrupt is hit; then the recorded messages
+are dumped into the run report, so the report shows what led to the problem without
+running the whole session in debug mode.
+
+Recording is cheap: a record is a tuple of the time, the tag and the message as it was
+passed. Messages given as a format string and its arguments (see log_core) are only
+formatted at dump time; the arguments are the values at the time of the call, so loop
+variables changing afterwards do not change the text.
+
+The module has no dependencies on the rest of the application.
+"""
+import collections
+import datetime
+import time
+
+CAPACITY = 2000
+
+_records = collections.deque(maxlen=CAPACITY)
+
+
+def record(tag, message):
+    """
+    Record one message.
+
+    Args:
+        tag (str): The tag of the message, e.g. 'DEBUG'.
+        message (str or tuple): The message, or a format string and its arguments.
+    """
+    _records.append((time.time(), tag, message))
+
+
+def dump():
+    """
+    Format the recorded messages, oldest first, and clear the recorder.
+
+    Messages that cannot be formatted are replaced by the error raised.
+
+    Returns:
+        list: The formatted lines, each ending with a newline.
+    """
+    lines = []
+    while _records:
+        timestamp, tag, message = _records.popleft()
+        try:
+            if isinstance(message, tuple):
+                text = message[0].format(*message[1:])
+            else:
+                text = str(message)
+        except Exception as error:
+            text = f"<unformattable message: {error!r}>"
+        moment = datetime.datetime.fromtimestamp(timestamp).strftime("%H:%M:%S.%f")[:-3]
+        lines.append(f"    {moment} {tag:<8} {text}\n")
+    return lines
+
+
+def clear():
+    """
+    Drop all recorded messages.
+    """
+    _records.clear()
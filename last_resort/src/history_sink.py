@@ -0,0 +1,135 @@
+"""
+Buffered writing of the run report history.
+
+Every verbose() message and every debug(..., log=True) call ends up in the run report.
+Opening, appending to and closing the report for each of them costs hundreds of round
+trips to the file server per session, so the lines are collected in memory and appended
+in batches instead. A batch is written when enough lines are buffered, by a background
+thread every flush interval, and whenever flush() is called. A line is therefore written
+at most one flush interval after it was buffered.
+
+Lines are not lost when the application ends unexpectedly: the buffer is also written
+at interpreter exit and when the process is terminated by SIGTERM or SIGHUP. Only a
+SIGKILL can lose the lines of the last flush interval.
+
+The module has no dependencies on the rest of the application.
+"""
+import atexit
+import signal
+import threading
+
+MAX_BUFFERED_BYTES = 64 * 1024
+FLUSH_INTERVAL = 2.0
+FLUSH_SIGNALS = (signal.SIGTERM, signal.SIGHUP)
+
+
+class HistorySink:
+    """
+    Thread-safe buffer of run report lines, appended to the report in batches.
+    """
+
+    def __init__(
+        self,
+        report_file,
+        max_buffered_bytes=MAX_BUFFERED_BYTES,
+        flush_interval=FLUSH_INTERVAL,
+    ):
+        self.report_file = report_file
+        self.max_buffered_bytes = max_buffered_bytes
+        self.flush_interval = flush_interval
+        self.lines = []
+        self.buffered_bytes = 0
+        self.closed = False
+        self.lock = threading.RLock()
+        self.wakeup = threading.Event()
+        self.flusher = threading.Thread(
+            target=self._flush_periodically, name="history-flush", daemon=True
+        )
+        self.flusher.start()
+        atexit.register(self.close)
+        self._install_signal_handlers()
+
+    def write(self, line):
+        """
+        Buffer one line of the run report.
+
+        Args:
+            line (str): The line, including its line ending.
+
+        Raises:
+            OSError: If the buffer is full and cannot be written to the report.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.lines.append(line)
+            self.buffered_bytes += len(line)
+            if self.buffered_bytes >= self.max_buffered_bytes:
+                self.flush()
+
+    def flush(self):
+        """
+        Append the buffered lines to the run report.
+
+        The lines stay buffered if the report cannot be written, so a later flush
+        can retry. They are taken out of the buffer before they are written: the lock
+        is reentrant, and a signal handler interrupting the flush on the same thread
+        must not write them a second time.
+
+        Raises:
+            OSError: If the run report cannot be written.
+        """
+        with self.lock:
+            if not self.lines:
+                return
+            batch = self.lines
+            self.lines = []
+            self.buffered_bytes = 0
+            try:
+                with open(self.report_file, "a") as file:
+                    file.write("".join(batch))
+            except OSError:
+                self.lines[:0] = batch
+                self.buffered_bytes += sum(len(line) for line in batch)
+                raise
+
+    def close(self):
+        """
+        Write the remaining lines and stop buffering. Later lines are discarded.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                self.flush()
+            except OSError:
+                pass
+            self.closed = True
+        self.wakeup.set()
+        atexit.unregister(self.close)
+
+    def _flush_periodically(self):
+        while not self.wakeup.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def _install_signal_handlers(self):
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for signal_number in FLUSH_SIGNALS:
+            previous = signal.getsignal(signal_number)
+            if previous is signal.SIG_IGN:
+                continue
+
+            def handler(number, frame, previous=previous):
+                self.close()
+                if callable(previous):
+                    previous(number, frame)
+                else:
+                    # Terminate the way the signal would have without the handler
+                    signal.signal(number, signal.SIG_DFL)
+                    signal.raise_signal(number)
+
+            signal.signal(signal_number, handler)
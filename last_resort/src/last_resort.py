@@ -1,10 +1,11 @@
 #!/custom/tools/wrappers/lang/python
-import tkinter as tk
+import os
 
 import argument_parser
 
 import utils
 import file_operations
+import session_tape
 import user_interface
 
 
@@ -32,12 +33,13 @@ def main():
 
     1. Parses command-line arguments using the argument_parser module.
        - The arguments include options for silent mode, debug mode, verbose mode, test mode, and displaying help information.
-    2. Initializes the Tkinter root window.
-       - Sets up the main window for the graphical user interface.
+    2. Prints the introductory message.
+       - Displays a welcome message and information about the application.
     3. If the --info argument is provided, prints the help message and exits.
        - Provides users with detailed usage instructions and exits the application.
-    4. Prints the introductory message.
-       - Displays a welcome message and information about the application.
+         Tkinter is not loaded for it.
+    4. Initializes the Tkinter root window.
+       - Sets up the main window for the graphical user interface.
     5. Generates a unique identifier (RUID) for the session.
        - Creates a unique run identifier to track the session.
     6. Identifies all folders around the launch directory.
@@ -62,13 +64,17 @@ def main():
         FileNotFoundError: If no .po or .jb files are found in the revision directory.
     """
     arguments = argument_parser.get()
-    ui_root = tk.Tk()
     utils.print_intro()
 
     if arguments.info:
         utils.print_help()
         exit(0)
 
+    import tkinter as tk
+    from tkinter import messagebox
+
+    ui_root = tk.Tk()
+
         # identify all folders around launch dir
     user_interface.checklist_items = [
         "Mask-set",
@@ -88,7 +94,34 @@ def main():
         # Load the default configuration and update arguments
         arguments = argument_parser.get()
 
+    if arguments.replay:
+        # Before the RUID, the run archive of a replay is inside its snapshot
+        launch_dir = session_tape.start_replay(arguments.replay)
     file_operations.generate_ruid()
+    if arguments.profile:
+        import profiling
+
+        utils.debug(
+            message="Profiling this run into "
+            f"{file_operations.get_profile_base()}{profiling.PROF_SUFFIX}",
+            log=True,
+        )
+    if arguments.replay:
+        session_tape.install_messagebox(messagebox)
+        ui_root.withdraw()
+        utils.printer(
+            message=f"Replaying {arguments.replay} in {launch_dir}",
+            log_type=utils.Type.INFO,
+        )
+    elif arguments.record:
+        session_tape.start_recording(
+            file_operations.get_session_tape_path(), os.getcwd()
+        )
+        session_tape.install_messagebox(messagebox)
+        utils.printer(
+            message=f"Recording this session into {session_tape.tape_path}",
+            log_type=utils.Type.INFO,
+        )
 
     file_operations.init_folder_structure(ui_root)
     # ask for po and jb via gui
@@ -145,22 +178,60 @@ def main():
         utils.open_for_preview(selected_jb, "left")
         utils.open_for_preview(selected_po, "right")
         ui_root.attributes("-topmost", True)
-    # show main window
-    ui_root.mainloop()
+    if session_tape.replaying():
+        # The recorded clicks replace the user
+        session_tape.replay_actions(close_action="close", on_action=replayed_action)
+    else:
+        # show main window
+        ui_root.mainloop()
+
+
+def replayed_action(name, elapsed):
+    """
+    Report a main window action performed by a replay.
+
+    Args:
+        name (str): The name of the action.
+        elapsed (float): Seconds since the first action of the replay.
+    """
+    utils.printer(message=f"Replaying {name} (+{elapsed:.3f} s)", log_type=utils.Type.INFO)
+
+
+def profile_saved(paths):
+    """
+    Report where the results of --profile were saved.
+
+    Args:
+        paths (list): The paths of the saved files.
+    """
+    file_operations.record_event("profile_saved", phase="shutdown", paths=paths)
+    for path in paths:
+        utils.printer(message=f"Profile saved to {path}", log_type=utils.Type.INFO)
 
 
 if __name__ == "__main__":
     try:
-        main()
+        if argument_parser.get().profile:
+            import profiling
+
+            profiling.run(main, file_operations.get_profile_base, on_saved=profile_saved)
+        else:
+            main()
     except KeyboardInterrupt:
         utils.printer(
             message="Application forcefully terminated!", log_type=utils.Type.ERROR
         )
         utils.debug("Caught KeyboardInterrupt!", log=True)
+        utils.print_span_summary()
+        file_operations.record_event("run_end", phase="shutdown", reason="KeyboardInterrupt")
+        file_operations.flush_history()
         cleanup()
     except RuntimeError:
         utils.printer(
             message="Application forcefully terminated!", log_type=utils.Type.ERROR
         )
         utils.debug("Caught RuntimeError!", log=True)
+        utils.print_span_summary()
+        file_operations.record_event("run_end", phase="shutdown", reason="RuntimeError")
+        file_operations.flush_history()
         cleanup()
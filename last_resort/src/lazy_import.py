@@ -0,0 +1,62 @@
+"""
+Deferred import of modules that are slow to import.
+
+tkinter loads the Tcl/Tk libraries when it is imported. The modules of the application
+import each other, so a module imported at the top of any of them is imported before
+the application does anything, also for runs that never open a window, e.g. --info.
+A deferred module is imported on the first access to one of its attributes instead:
+
+    messagebox = lazy_import.module("tkinter.messagebox")
+    ...
+    messagebox.showinfo("Title", "Text")   # tkinter is imported here
+
+Attributes set on a deferred module are set on the imported module, so patching it,
+e.g. session_tape.install_messagebox(messagebox), affects every user of the module.
+
+Modules used at a single place are imported inside the function using them instead,
+e.g. psutil in utils.kill_processes.
+
+The module has no dependencies on the rest of the application.
+"""
+import importlib
+import sys
+
+
+class DeferredModule:
+    """
+    Stand-in for a module that is imported on the first attribute access.
+
+    Its own attributes are private, so they do not hide those of the module.
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, "_module_name", name)
+
+    def _load(self):
+        # Imported modules are found in sys.modules, later calls are cheap
+        return importlib.import_module(self._module_name)
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._load(), attribute, value)
+
+    def __repr__(self):
+        state = "imported" if self._module_name in sys.modules else "deferred"
+        return f"<{state} module {self._module_name!r}>"
+
+
+def module(name):
+    """
+    Return a module, deferring its import to the first attribute access.
+
+    Args:
+        name (str): The name of the module, e.g. 'tkinter.messagebox'.
+
+    Returns:
+        The module if it is imported already, otherwise a DeferredModule.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    return DeferredModule(name)
@@ -0,0 +1,176 @@
+"""
+Client of the preview server, see file_presenter.
+
+The .jb and .po previews of the built-in editor are windows of one long-running
+file_presenter process, the preview server, instead of one Python interpreter and Tk
+per previewed file. The server listens on a Unix socket of the user and the display.
+A client connects, sends one JSON request and reads one JSON reply:
+
+    {"action": "open", "session": "4321-9f2c", "path": "/masks/AB12.po",
+     "position": "right"}
+    {"action": "close_all", "session": "4321-9f2c"}
+    {"action": "ping"}
+
+    {"ok": true, "pid": 1234}  or  {"ok": false, "error": "..."}
+
+Every session has its own preview windows, identified by SESSION, so concurrent
+sessions do not replace or hide each other's previews. The first preview of a session
+starts the server if none is running. When a session ends, its previews are hidden; the
+server reuses the hidden windows for the next session and exits on its own after a
+while without shown windows.
+
+The module does not import tkinter and has no dependencies on the rest of the
+application.
+"""
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Seconds to wait for a started server to accept connections
+START_TIMEOUT = 10.0
+# Seconds to wait for the reply of the server
+REPLY_TIMEOUT = 10.0
+MAX_REPLY_BYTES = 64 * 1024
+# Identifies the previews of this process, the pid alone is reused
+SESSION = f"{os.getpid()}-{os.urandom(4).hex()}"
+
+
+def socket_path():
+    """
+    Return the path of the socket of the preview server of this user and display.
+
+    Returns:
+        str: The path, in XDG_RUNTIME_DIR or the temporary directory.
+    """
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    display = re.sub(r"[^\w.]", "_", os.environ.get("DISPLAY", ""))
+    name = f"last_resort_presenter-{os.getuid()}-{display}.sock"
+    return os.path.join(directory, name)
+
+
+def start_server():
+    """
+    Start a preview server in the background.
+
+    A server started while another one is running exits right away.
+
+    Returns:
+        subprocess.Popen: The server process.
+    """
+    presenter = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "file_presenter.py"
+    )
+    return subprocess.Popen(
+        [sys.executable, presenter, "--serve"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=True,
+        start_new_session=True,
+    )
+
+
+def _send(message):
+    path = socket_path()
+    # In a shared temporary directory, only a socket of this user is trusted
+    if os.stat(path).st_uid != os.getuid():
+        raise PermissionError(f"The preview socket {path} belongs to another user.")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(REPLY_TIMEOUT)
+        connection.connect(path)
+        connection.sendall(json.dumps(message).encode() + b"\n")
+        connection.shutdown(socket.SHUT_WR)
+        reply = b""
+        while len(reply) < MAX_REPLY_BYTES:
+            data = connection.recv(4096)
+            if not data:
+                break
+            reply += data
+    reply = json.loads(reply)
+    if not reply.get("ok"):
+        raise ConnectionError(reply.get("error", "The preview server failed."))
+    return reply
+
+
+def request(message, start=True):
+    """
+    Send a request to the preview server.
+
+    Args:
+        message (dict): The request.
+        start (bool, optional): Start the server if it is not running. Defaults to True.
+
+    Returns:
+        dict: The reply of the server.
+
+    Raises:
+        OSError: If the server cannot be reached or started, ConnectionError if it
+            failed to perform the request.
+        ValueError: If the reply is not valid JSON.
+    """
+    try:
+        return _send(message)
+    except (FileNotFoundError, ConnectionRefusedError):
+        if not start:
+            raise
+    server = start_server()
+    deadline = time.monotonic() + START_TIMEOUT
+    while True:
+        try:
+            return _send(message)
+        except (FileNotFoundError, ConnectionRefusedError):
+            # The server is still starting, unless it failed to
+            if server.poll() is not None and not os.path.exists(socket_path()):
+                raise
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def open_file(path, position="left"):
+    """
+    Show a file in the preview window of this session at a screen position.
+
+    The window of the position is reused, it shows the file instead of the previous one.
+
+    Args:
+        path (str): The path to the file.
+        position (str, optional): 'left' or 'right'. Defaults to 'left'.
+
+    Returns:
+        dict: The reply of the server.
+
+    Raises:
+        OSError: If the server cannot be reached or the file cannot be opened.
+        ValueError: If the reply is not valid JSON.
+    """
+    return request(
+        {
+            "action": "open",
+            "session": SESSION,
+            "path": os.path.abspath(path),
+            "position": position,
+        }
+    )
+
+
+def close_all():
+    """
+    Hide the preview windows of this session, if a server is running.
+
+    Returns:
+        bool: False if a running server could not be reached.
+    """
+    try:
+        request({"action": "close_all", "session": SESSION}, start=False)
+    except (FileNotFoundError, ConnectionRefusedError):
+        # No server, no previews
+        return True
+    except (OSError, ValueError):
+        return False
+    return True
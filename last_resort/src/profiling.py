@@ -0,0 +1,120 @@
+"""
+Profiling of a whole run, enabled by the --profile option.
+
+The application runs under cProfile and tracemalloc. When it ends, also by an exception
+or a KeyboardInterrupt, two files are saved next to each other, named by the RUID of
+the run:
+
+    <ruid>.prof              cProfile statistics, e.g. python -m pstats <ruid>.prof
+                             or snakeviz <ruid>.prof
+    <ruid>.allocations.txt   Wall time, peak traced memory, the slowest functions and
+                             the lines that allocated the most memory
+
+Both profilers slow the application down noticeably, so they are only enabled on
+request, e.g. to reproduce a run reported to be slow.
+
+The module has no dependencies on the rest of the application.
+"""
+import cProfile
+import io
+import pstats
+import sys
+import time
+import tracemalloc
+
+PROF_SUFFIX = ".prof"
+ALLOCATIONS_SUFFIX = ".allocations.txt"
+# Frames kept per allocation, enough to see who called the allocating line
+TRACEBACK_FRAMES = 8
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 30
+TOP_TRACEBACKS = 5
+
+# Allocations made by the profilers themselves and the import system are not interesting
+_IGNORED_FILES = (tracemalloc.__file__, cProfile.__file__, "<frozen importlib._bootstrap>")
+
+
+def run(function, output_base, on_saved=None):
+    """
+    Call a function under cProfile and tracemalloc and save the results.
+
+    Args:
+        function (callable): The function to profile, called without arguments.
+        output_base (callable): Returns the path of the files without suffix. It is called
+            after the function ended, so the path can depend on the RUID of the run.
+        on_saved (callable, optional): Called with the paths of the saved files.
+            Defaults to None.
+
+    Returns:
+        The return value of the function. Exceptions of the function are raised after
+        the results are saved.
+    """
+    tracemalloc.start(TRACEBACK_FRAMES)
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        return profiler.runcall(function)
+    finally:
+        elapsed = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        try:
+            paths = save(profiler, snapshot, output_base(), elapsed, current, peak)
+            if on_saved is not None:
+                on_saved(paths)
+        except Exception as error:
+            # The exception of the run, if any, must not be replaced
+            print(f"WARNING     Cannot save the profile: {error}", file=sys.stderr)
+
+
+def save(profiler, snapshot, base, elapsed, current, peak):
+    """
+    Save the cProfile statistics and the allocations report.
+
+    Args:
+        profiler (cProfile.Profile): The stopped profiler.
+        snapshot (tracemalloc.Snapshot): The memory snapshot taken at the end.
+        base (str): The path of the files without suffix.
+        elapsed (float): Wall time of the profiled function in seconds.
+        current (int): Traced memory at the end in bytes.
+        peak (int): Peak traced memory in bytes.
+
+    Returns:
+        list: The paths of the .prof file and the allocations report.
+
+    Raises:
+        OSError: If the files cannot be written.
+    """
+    prof_path = base + PROF_SUFFIX
+    profiler.dump_stats(prof_path)
+
+    functions = io.StringIO()
+    stats = pstats.Stats(profiler, stream=functions)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+
+    snapshot = snapshot.filter_traces(
+        [tracemalloc.Filter(False, pattern) for pattern in _IGNORED_FILES]
+    )
+    report_path = base + ALLOCATIONS_SUFFIX
+    with open(report_path, "w") as report:
+        report.write(f"Command:          {' '.join(sys.argv)}\n")
+        report.write(f"Wall time:        {elapsed:.3f} s\n")
+        report.write(f"Peak memory:      {peak / 1024**2:.1f} MB (traced)\n")
+        report.write(f"Memory at exit:   {current / 1024**2:.1f} MB (traced)\n\n")
+
+        report.write(f"Top {TOP_ALLOCATIONS} lines by memory still allocated at exit:\n")
+        for statistic in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+            report.write(f"    {statistic}\n")
+
+        report.write(f"\nTop {TOP_TRACEBACKS} allocations with their callers:\n")
+        for statistic in snapshot.statistics("traceback")[:TOP_TRACEBACKS]:
+            report.write(
+                f"\n    {statistic.count} blocks, {statistic.size / 1024:.1f} KiB\n"
+            )
+            for line in statistic.traceback.format(most_recent_first=True):
+                report.write(f"    {line}\n")
+
+        report.write(f"\nTop {TOP_FUNCTIONS} functions by cumulative time:\n")
+        report.write(functions.getvalue())
+    return [prof_path, report_path]
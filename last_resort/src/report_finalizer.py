@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+"""
+Finalisation of run reports outside of the application process.
+
+When the application closes, the conversion of the .lr run report into a locked PDF
+and the closing of the preview editors are handed to a detached worker process, so
+the application can exit immediately.
+
+Every session keeps a marker (<report>.pending) next to its report, locked for as long
+as the session runs. On close the cleanup details are written into the marker and the
+worker removes it once the report is converted. Markers left behind by a crashed
+session or an interrupted worker are unlocked, they are picked up on the next launch
+by resume_pending() or by convert_run_archive.py. A locked marker means the report is
+still in use and must not be touched.
+
+Finished runs are added to the run index (see run_index) by the worker as well.
+
+The module only depends on report_pdf and run_index, so the worker does not go through
+the argument parser or the configuration of the application.
+
+Usage:
+    python report_finalizer.py [--cleanup] <run_report.lr> [<run_report.lr> ...]
+"""
+import fcntl
+import json
+import os
+import signal
+import subprocess
+import sys
+
+import report_pdf
+import run_index
+
+MARKER_SUFFIX = ".pending"
+
+# Marker of the running session, locked until the process exits
+session_marker = None
+
+
+def marker_path(report_file):
+    """
+    Return the path of the retry marker of a run report.
+
+    Args:
+        report_file (str): The path to the .lr run report.
+
+    Returns:
+        str: The path to the marker file.
+    """
+    return report_file + MARKER_SUFFIX
+
+
+def read_ruid(report_file):
+    """
+    Read the RUID from the first line of a run report.
+
+    Args:
+        report_file (str): The path to the .lr run report.
+
+    Returns:
+        str: The RUID, or 'unknown' if the report does not start with one.
+    """
+    with open(report_file, "r", encoding="utf-8", errors="replace") as file:
+        first_line = file.readline().strip()
+    if first_line.startswith("RUID:"):
+        return first_line.split(":", 1)[1].strip()
+    return "unknown"
+
+
+def finalize_report(report_file):
+    """
+    Convert a run report into a read-only PDF and remove the .lr file.
+
+    The PDF is written under a temporary name and renamed when complete, so an existing
+    PDF next to the report always means the conversion has finished. Calling the function
+    again for a report that was already converted only removes the leftovers.
+
+    Args:
+        report_file (str): The path to the .lr run report.
+
+    Returns:
+        str: The path to the PDF file.
+    """
+    pdf_file = os.path.splitext(report_file)[0] + ".pdf"
+    if os.path.exists(report_file) and not os.path.exists(pdf_file):
+        partial_file = pdf_file + ".part"
+        if os.path.exists(partial_file):
+            # Left behind by an interrupted worker, and read-only already
+            os.remove(partial_file)
+        report_pdf.text_file_to_pdf(
+            report_file, partial_file, footer_text=f"RUID: {read_ruid(report_file)}"
+        )
+        os.chmod(partial_file, 0o444)
+        os.replace(partial_file, pdf_file)
+    if os.path.exists(report_file):
+        os.remove(report_file)
+    if os.path.exists(marker_path(report_file)):
+        os.remove(marker_path(report_file))
+    return pdf_file
+
+
+def close_editors(editor=None, pids=(), swp_dir=None):
+    """
+    Close the preview editors of a finished session and remove their swap files.
+
+    Args:
+        editor (str, optional): Process name of the external editor to close. Defaults to None.
+        pids (iterable, optional): Process IDs of editor windows started by the session.
+        swp_dir (str, optional): Directory searched for leftover .swp files. Defaults to None.
+    """
+    pids = set(pids)
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    if editor:
+        import psutil
+
+        for process in psutil.process_iter(["name"]):
+            if process.info["name"] == editor and process.pid not in pids:
+                try:
+                    process.kill()
+                except psutil.Error:
+                    pass
+    if swp_dir:
+        for root, dirs, files in os.walk(swp_dir):
+            for file in files:
+                if file.endswith(".swp"):
+                    try:
+                        os.remove(os.path.join(root, file))
+                    except OSError:
+                        pass
+
+
+def start_session(report_file):
+    """
+    Create the marker of the running session and lock it until the process exits.
+
+    Args:
+        report_file (str): The path to the .lr run report of the session.
+    """
+    global session_marker
+    session_marker = open(marker_path(report_file), "w+")
+    try:
+        fcntl.lockf(session_marker, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        pass
+
+
+def end_session(report_file):
+    """
+    Remove the marker of the running session once its report was finalised in-process.
+
+    Args:
+        report_file (str): The path to the .lr run report of the session.
+    """
+    global session_marker
+    if session_marker is not None:
+        session_marker.close()
+        session_marker = None
+    if os.path.exists(marker_path(report_file)):
+        os.remove(marker_path(report_file))
+
+
+def finalize_locked(report_file, cleanup=False, wait=False):
+    """
+    Finalise one report while holding the lock on its marker.
+
+    Reports without a marker are not used by any session and are finalised directly.
+
+    Args:
+        report_file (str): The path to the .lr run report.
+        cleanup (bool, optional): Close the editors recorded in the marker. Defaults to False.
+        wait (bool, optional): Wait for the session holding the marker to exit. Defaults to False.
+
+    Returns:
+        bool: False if the report is still in use, True otherwise.
+    """
+    marker = marker_path(report_file)
+    try:
+        lock = open(marker, "r+")
+    except FileNotFoundError:
+        finalize_report(report_file)
+        index_run(report_file)
+        return True
+    with lock:
+        try:
+            fcntl.lockf(lock, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        except OSError:
+            return False
+        if cleanup:
+            try:
+                details = json.load(lock)
+            except ValueError:
+                details = {}
+            close_editors(
+                editor=details.get("editor"),
+                pids=details.get("pids", ()),
+                swp_dir=details.get("swp_dir"),
+            )
+        finalize_report(report_file)
+    index_run(report_file)
+    return True
+
+
+def index_run(report_file):
+    """
+    Add the finished run of a report to the run index.
+
+    A failure to index is not fatal, the run is indexed by the next 'run_index.py update'.
+
+    Args:
+        report_file (str): The path to the .lr run report.
+    """
+    try:
+        run_index.index_report(report_file)
+    except Exception:
+        pass
+
+
+def spawn(report_file, editor=None, pids=(), swp_dir=None):
+    """
+    Hand the finalisation of a run report to a detached worker process.
+
+    A retry marker holding the cleanup details is written first, so the conversion
+    is completed on a later launch if the worker does not finish.
+
+    Args:
+        report_file (str): The path to the .lr run report.
+        editor (str, optional): Process name of the external editor to close. Defaults to None.
+        pids (iterable, optional): Process IDs of editor windows started by the session.
+        swp_dir (str, optional): Directory searched for leftover .swp files. Defaults to None.
+
+    Returns:
+        subprocess.Popen: The worker process.
+    """
+    details = {"editor": editor, "pids": list(pids), "swp_dir": swp_dir}
+    if session_marker is not None:
+        session_marker.seek(0)
+        session_marker.truncate()
+        json.dump(details, session_marker)
+        session_marker.flush()
+    else:
+        with open(marker_path(report_file), "w") as marker:
+            json.dump(details, marker)
+    # The worker waits for the lock on the marker, which is released when this process exits
+    return _start_worker(["--cleanup", report_file])
+
+
+def _start_worker(arguments):
+    return subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__)] + arguments,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=True,
+        start_new_session=True,
+    )
+
+
+def pending_reports(archive_dir):
+    """
+    List the run reports in the run archive whose finalisation did not complete.
+
+    Args:
+        archive_dir (str): The run archive directory.
+
+    Returns:
+        list: Paths to the .lr run reports with a retry marker.
+    """
+    return sorted(
+        os.path.join(archive_dir, name[: -len(MARKER_SUFFIX)])
+        for name in os.listdir(archive_dir)
+        if name.endswith(".lr" + MARKER_SUFFIX)
+    )
+
+
+def in_use(report_file):
+    """
+    Check whether a session or a worker holds the marker of a run report.
+
+    Args:
+        report_file (str): The path to the .lr run report.
+
+    Returns:
+        bool: True if the marker is locked by another process or is the marker of the
+            running session.
+    """
+    marker = marker_path(report_file)
+    if session_marker is not None and os.path.abspath(
+        session_marker.name
+    ) == os.path.abspath(marker):
+        # Closing a probe of it would release the lock of this process
+        return True
+    try:
+        with open(marker, "r+") as probe:
+            fcntl.lockf(probe, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except FileNotFoundError:
+        # Finalised meanwhile
+        return True
+    except OSError:
+        return True
+    return False
+
+
+def resume_pending(archive_dir):
+    """
+    Start a detached worker completing unfinished finalisations, if there are any.
+
+    Editors are not closed again, the process IDs recorded by an old session are stale.
+    The markers of running sessions are locked, no worker is started for them.
+
+    Args:
+        archive_dir (str): The run archive directory.
+
+    Returns:
+        list: Paths to the run reports handed to the worker.
+    """
+    pending = [
+        report for report in pending_reports(archive_dir) if not in_use(report)
+    ]
+    if pending:
+        _start_worker(pending)
+    return pending
+
+
+def main(arguments):
+    cleanup = "--cleanup" in arguments
+    reports = [argument for argument in arguments if argument != "--cleanup"]
+    if not reports:
+        print(__doc__)
+        return 1
+    failed = 0
+    for report_file in reports:
+        try:
+            finalize_locked(report_file, cleanup=cleanup, wait=cleanup)
+        except Exception:
+            # The marker stays in place, the next launch retries
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
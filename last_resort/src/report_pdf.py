@@ -0,0 +1,375 @@
+"""
+Bulk text to PDF rendering for run reports and checklists.
+
+Run reports can be many thousands of lines long. Laying them out with one
+FPDF.multi_cell call per line re-measures every string from scratch, so this module
+lays the text out itself: glyph widths of the core fonts are cached as lookup tables,
+each line is wrapped in a single pass and every finished page is streamed to the
+output file, with the cross-reference table written at the end. The page geometry
+matches the former FPDF based output (A4, Helvetica 12, 10 mm margins, 15 mm line
+height and a centered footer).
+
+The module has no dependencies on the rest of the application, so it can also be used
+by helper processes that do not go through the argument parser.
+"""
+import array
+import datetime
+import functools
+import zlib
+
+MM = 72 / 25.4
+PAGE_WIDTH = 210.0015555555555 * MM
+PAGE_HEIGHT = 297.0000833333333 * MM
+MARGIN = 10 * MM
+BOTTOM_MARGIN = 15 * MM
+CELL_MARGIN = 1 * MM
+LINE_HEIGHT = 15 * MM
+FONT_SIZE = 12
+FOOTER_FONT_SIZE = 8
+TAB_SIZE = 4
+
+FONTS = {"F1": "Helvetica", "F2": "Helvetica-Oblique"}
+
+
+@functools.lru_cache(maxsize=None)
+def glyph_widths(font="helvetica"):
+    """
+    Return the glyph widths of a core font as a table indexed by the latin-1 code.
+
+    The widths are in thousandths of the font size. The table is built once per font.
+
+    Args:
+        font (str, optional): The fpdf name of the core font. Defaults to 'helvetica'.
+
+    Returns:
+        tuple: 256 glyph widths.
+    """
+    from fpdf.fonts import CORE_FONTS_CHARWIDTHS
+
+    widths = CORE_FONTS_CHARWIDTHS[font]
+    return tuple(widths[chr(code)] for code in range(256))
+
+
+def encode(text):
+    """
+    Encode a line of text the way it is written into the PDF.
+
+    Tabs are expanded, line endings dropped and characters outside of latin-1 replaced.
+
+    Args:
+        text (str): The text to encode.
+
+    Returns:
+        bytes: The latin-1 encoded text.
+    """
+    return (
+        text.rstrip("\r\n")
+        .expandtabs(TAB_SIZE)
+        .encode("latin-1", errors="replace")
+    )
+
+
+def escape(data):
+    """
+    Escape the characters that have a special meaning in PDF string literals.
+
+    Args:
+        data (bytes): The encoded text.
+
+    Returns:
+        bytes: The escaped text.
+    """
+    return (
+        data.replace(b"\\", b"\\\\")
+        .replace(b"(", b"\\(")
+        .replace(b")", b"\\)")
+        .replace(b"\r", b"")
+    )
+
+
+class TextLayout:
+    """
+    Wrap lines of text to the page width in a single pass using cached glyph widths.
+    """
+
+    def __init__(self, font="helvetica", font_size=FONT_SIZE, max_width=None):
+        if max_width is None:
+            max_width = PAGE_WIDTH - 2 * MARGIN - 2 * CELL_MARGIN
+        self.widths = glyph_widths(font)
+        # Compare in glyph units to avoid a multiplication per character
+        self.limit = max_width * 1000 / font_size
+        self.space = self.widths[32]
+
+    def width(self, data):
+        """
+        Measure encoded text in glyph units.
+
+        Args:
+            data (bytes): The encoded text.
+
+        Returns:
+            int: The width in thousandths of the font size.
+        """
+        return sum(map(self.widths.__getitem__, data))
+
+    def wrap(self, text):
+        """
+        Break one line of text into rows that fit the page width.
+
+        Lines are broken at spaces, words longer than a row are broken by characters.
+
+        Args:
+            text (str): The line to wrap.
+
+        Returns:
+            list: The encoded rows (bytes). An empty line yields one empty row.
+        """
+        data = encode(text)
+        if self.width(data) <= self.limit:
+            return [data]
+
+        rows = []
+        row = []
+        row_width = 0
+        for word in data.split(b" "):
+            word_width = self.width(word)
+            needed = word_width + (self.space if row else 0)
+            if row_width + needed <= self.limit:
+                row.append(word)
+                row_width += needed
+                continue
+            if row:
+                rows.append(b" ".join(row))
+                row, row_width = [], 0
+            if word_width <= self.limit:
+                row, row_width = [word], word_width
+                continue
+            # Break a word that does not fit on a row of its own
+            start = 0
+            chunk_width = 0
+            for index, code in enumerate(word):
+                glyph = self.widths[code]
+                if chunk_width + glyph > self.limit and index > start:
+                    rows.append(word[start:index])
+                    start, chunk_width = index, 0
+                chunk_width += glyph
+            row, row_width = [word[start:]], chunk_width
+        if row:
+            rows.append(b" ".join(row))
+        return rows
+
+
+class PdfWriter:
+    """
+    Streaming writer of PDF documents made of text pages in the core Helvetica fonts.
+
+    Pages are added as lists of already wrapped rows and written to the output stream
+    right away, so memory use does not grow with the document. Only the byte offsets of
+    the written objects are kept, to produce the cross-reference table on close().
+    """
+
+    CATALOG = 1
+    PAGES = 2
+
+    def __init__(self, stream, footer_text=None):
+        self.stream = stream
+        self.footer = self._footer_stream(footer_text)
+        self.position = 0
+        # Byte offset of every object, indexed by object number (0 is the free entry)
+        self.offsets = array.array("Q", [0] * (self.PAGES + 1))
+        self.next_number = self.PAGES + 1
+        self.page_count = 0
+        self.first_page = None
+
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        font_numbers = {}
+        for name, base_font in FONTS.items():
+            font_numbers[name] = self._add_object(
+                b"<< /Type /Font /Subtype /Type1 /BaseFont /%s "
+                b"/Encoding /WinAnsiEncoding >>" % base_font.encode()
+            )
+        self.resources = b"<< /Font << %s >> >>" % b" ".join(
+            b"/%s %d 0 R" % (name.encode(), number)
+            for name, number in font_numbers.items()
+        )
+
+    def _write(self, data):
+        self.stream.write(data)
+        self.position += len(data)
+
+    def _add_object(self, body, number=None):
+        if number is None:
+            number = self.next_number
+            self.next_number += 1
+            self.offsets.append(self.position)
+        else:
+            self.offsets[number] = self.position
+        self._write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        return number
+
+    @staticmethod
+    def _footer_stream(footer_text):
+        if not footer_text:
+            return b""
+        data = encode(footer_text)
+        text_width = (
+            sum(map(glyph_widths("helveticaI").__getitem__, data))
+            * FOOTER_FONT_SIZE
+            / 1000
+        )
+        x = MARGIN + (PAGE_WIDTH - 2 * MARGIN - text_width) / 2
+        y = 15 * MM - 5 * MM - 0.3 * FOOTER_FONT_SIZE
+        return b"BT /F2 %d Tf %.2f %.2f Td (%s) Tj ET\n" % (
+            FOOTER_FONT_SIZE,
+            x,
+            y,
+            escape(data),
+        )
+
+    @staticmethod
+    def rows_per_page():
+        """
+        Return how many rows fit on a page.
+
+        Returns:
+            int: The number of rows per page.
+        """
+        return int((PAGE_HEIGHT - MARGIN - BOTTOM_MARGIN) / LINE_HEIGHT)
+
+    def page_content(self, rows):
+        """
+        Build the compressed content stream of one page.
+
+        Args:
+            rows (list): The encoded rows of the page.
+
+        Returns:
+            bytes: The compressed content stream.
+        """
+        first_baseline = (
+            PAGE_HEIGHT - MARGIN - LINE_HEIGHT / 2 - 0.3 * FONT_SIZE
+        )
+        parts = [
+            b"BT /F1 %d Tf %.2f TL %.2f %.2f Td\n"
+            % (FONT_SIZE, LINE_HEIGHT, MARGIN + CELL_MARGIN, first_baseline + LINE_HEIGHT)
+        ]
+        parts.extend(b"(%s) '\n" % escape(row) for row in rows)
+        parts.append(b"ET\n")
+        parts.append(self.footer)
+        return zlib.compress(b"".join(parts))
+
+    def add_page(self, rows):
+        """
+        Write a page holding the given rows.
+
+        Every page takes two consecutive objects, its content stream and the page itself.
+
+        Args:
+            rows (list): The encoded rows of the page, at most rows_per_page().
+        """
+        content = self.page_content(rows)
+        stream = self._add_object(
+            b"<< /Filter /FlateDecode /Length %d >>\nstream\n%s\nendstream"
+            % (len(content), content)
+        )
+        page = self._add_object(
+            b"<< /Type /Page /Parent %d 0 R /Contents %d 0 R /Resources %s >>"
+            % (self.PAGES, stream, self.resources)
+        )
+        if self.first_page is None:
+            self.first_page = page
+        self.page_count += 1
+
+    def close(self):
+        """
+        Write the page tree, catalog, cross-reference table and trailer.
+
+        An empty page is added if no page was written, so the document is always valid.
+        """
+        if not self.page_count:
+            self.add_page([])
+        kids = b" ".join(
+            b"%d 0 R" % (self.first_page + 2 * index) for index in range(self.page_count)
+        )
+        self._add_object(
+            b"<< /Type /Pages /Kids [%s] /Count %d /MediaBox [0 0 %.2f %.2f] >>"
+            % (kids, self.page_count, PAGE_WIDTH, PAGE_HEIGHT),
+            number=self.PAGES,
+        )
+        self._add_object(
+            b"<< /Type /Catalog /Pages %d 0 R >>" % self.PAGES, number=self.CATALOG
+        )
+        info = self._add_object(
+            b"<< /Producer (Last Resort) /CreationDate (D:%s) >>"
+            % datetime.datetime.now().strftime("%Y%m%d%H%M%S").encode()
+        )
+
+        xref_position = self.position
+        size = self.next_number
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        for start in range(1, size, 1024):
+            self._write(
+                b"".join(
+                    b"%010d 00000 n \n" % offset
+                    for offset in self.offsets[start : min(start + 1024, size)]
+                )
+            )
+        self._write(
+            b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (size, self.CATALOG, info, xref_position)
+        )
+
+
+def render_lines(lines, stream, footer_text=None):
+    """
+    Lay out lines of text and stream them as a PDF document.
+
+    Finished pages are written to the stream as soon as they are full, so only one
+    page of text is held in memory at a time.
+
+    Args:
+        lines (iterable): The lines of text, with or without line endings.
+        stream (file): A binary file object the PDF is written to.
+        footer_text (str, optional): Text printed centered at the bottom of each page. Defaults to None.
+
+    Returns:
+        int: The number of pages written.
+    """
+    writer = PdfWriter(stream, footer_text)
+    layout = TextLayout()
+    rows_per_page = writer.rows_per_page()
+    page = []
+    for line in lines:
+        for row in layout.wrap(line):
+            page.append(row)
+            if len(page) == rows_per_page:
+                writer.add_page(page)
+                page = []
+    if page:
+        writer.add_page(page)
+    writer.close()
+    return writer.page_count
+
+
+def text_file_to_pdf(txt_file, pdf_file, footer_text=None):
+    """
+    Convert a text file into a PDF file.
+
+    The text file is read line by line and the PDF is written page by page, so even
+    very large run reports are converted with bounded memory.
+
+    Args:
+        txt_file (str): The path to the text file.
+        pdf_file (str): The path of the PDF file to create.
+        footer_text (str, optional): Text printed centered at the bottom of each page. Defaults to None.
+
+    Returns:
+        str: The path to the created PDF file.
+
+    Raises:
+        PermissionError: If the PDF file cannot be written.
+    """
+    with open(txt_file, "r", encoding="utf-8", errors="replace") as source:
+        with open(pdf_file, "wb") as target:
+            render_lines(source, target, footer_text)
+    return pdf_file
@@ -0,0 +1,154 @@
+"""
+Structured event stream of a run.
+
+Next to the free text .lr run report, every run writes a JSON-lines file into the
+'events' folder of the run archive, named like the report (run_<date>.jsonl). Each line
+is one event object with the fields:
+
+    ruid      RUID of the run.
+    seq       Sequence number of the event within the run, starting at 0.
+    t         Seconds since the start of the run, from the monotonic clock.
+    time      Wall clock time of the event (ISO 8601, milliseconds).
+    type      Event type, one of EVENT_TYPES.
+    phase     Phase of the run the event belongs to, one of PHASES.
+    paths     Files or folders the event is about (list, may be empty).
+    duration  Duration of the operation in seconds, or null.
+
+Events may carry additional fields, e.g. 'message' for message events, 'files',
+'bytes' and 'sha256' for archive_created or 'reason' for email_failed. Events without
+an explicit phase belong to the phase of the previous event. Lines are buffered and
+appended in batches by a HistorySink.
+
+The module only depends on history_sink, so archived runs can be read by tools that do
+not go through the argument parser of the application.
+"""
+import datetime
+import json
+import os
+import threading
+import time
+
+import history_sink
+
+EVENTS_DIR = "events"
+EVENTS_SUFFIX = ".jsonl"
+
+PHASES = ("startup", "setup", "checklist", "archive", "secret", "email", "shutdown")
+EVENT_TYPES = (
+    "run_start",
+    "message",
+    "folders_identified",
+    "checklist_saved",
+    "archive_created",
+    "secret_started",
+    "email_sent",
+    "email_failed",
+    "report_locked",
+    "span",
+    "profile_saved",
+    "run_end",
+)
+
+
+def events_path(report_file):
+    """
+    Return the path of the events file belonging to a run report.
+
+    Args:
+        report_file (str): The path to the .lr run report in the run archive.
+
+    Returns:
+        str: The path to the .jsonl events file.
+    """
+    archive_dir, report_name = os.path.split(report_file)
+    return os.path.join(
+        archive_dir, EVENTS_DIR, os.path.splitext(report_name)[0] + EVENTS_SUFFIX
+    )
+
+
+class EventLog:
+    """
+    Writer of the event stream of one run.
+
+    Events are emitted from the main thread and from the task runner workers, the
+    sequence and phase bookkeeping is done under a lock, so the events are numbered
+    and written in the same order.
+    """
+
+    def __init__(self, events_file, ruid):
+        self.events_file = events_file
+        self.ruid = ruid
+        self.start = time.monotonic()
+        self.sequence = 0
+        self.phase = PHASES[0]
+        self.lock = threading.Lock()
+        self.sink = history_sink.HistorySink(events_file)
+
+    def emit(self, event_type, phase=None, paths=(), duration=None, **fields):
+        """
+        Append one event to the stream.
+
+        Args:
+            event_type (str): The event type, one of EVENT_TYPES.
+            phase (str, optional): The phase of the run. Defaults to the phase of the previous event.
+            paths (iterable, optional): Files or folders the event is about. Defaults to none.
+            duration (float, optional): Duration of the operation in seconds. Defaults to None.
+            **fields: Additional fields of the event, must be JSON serialisable.
+
+        Raises:
+            OSError: If the buffered events cannot be written to the events file.
+        """
+        paths = [str(path) for path in paths]
+        with self.lock:
+            if phase is not None:
+                self.phase = phase
+            event = {
+                "ruid": self.ruid,
+                "seq": self.sequence,
+                "t": round(time.monotonic() - self.start, 6),
+                "time": datetime.datetime.now().isoformat(timespec="milliseconds"),
+                "type": event_type,
+                "phase": self.phase,
+                "paths": paths,
+                "duration": None if duration is None else round(duration, 6),
+            }
+            event.update(fields)
+            self.sequence += 1
+            line = json.dumps(event, separators=(",", ":"), default=str) + "\n"
+            self.sink.write(line)
+
+    def flush(self):
+        """
+        Write the buffered events to the events file.
+
+        Raises:
+            OSError: If the events file cannot be written.
+        """
+        self.sink.flush()
+
+    def close(self):
+        """
+        Write the remaining events and stop writing.
+        """
+        self.sink.close()
+
+
+def read_events(events_file):
+    """
+    Read the events of a run.
+
+    A line that cannot be parsed, like the last line of a run that was killed while
+    writing, is skipped.
+
+    Args:
+        events_file (str): The path to the .jsonl events file.
+
+    Yields:
+        dict: The events in the order they were written.
+    """
+    with open(events_file, "r", encoding="utf-8", errors="replace") as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
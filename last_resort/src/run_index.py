@@ -0,0 +1,413 @@
+#!/usr/bin/env python
+"""
+SQLite index over the runs in the run archive.
+
+The index (run_index.sqlite in the run archive) holds one row per run with its RUID,
+user, mask, revision, final folder and outcome, the archives created by the run with
+their checksums, and the time spent in each phase of the run. It is built from the
+JSON-lines event streams of the runs (see run_events) and updated incrementally: the
+finalisation worker indexes every run as it finishes, and 'update' indexes the runs
+whose event stream is new or has changed since it was last indexed.
+
+The outcome of a run is 'shipped' if the email was sent, otherwise the reason the run
+ended ('closed', 'KeyboardInterrupt', ...) or 'incomplete' if it did not end cleanly.
+
+Usage:
+    python run_index.py [-a ARCHIVE] update
+    python run_index.py [-a ARCHIVE] query [--mask MASK] [--user USER] [--since DATE]
+                                           [--ruid RUID] [--sha256 HASH] [--details]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import run_events
+
+INDEX_NAME = "run_index.sqlite"
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    ruid TEXT PRIMARY KEY,
+    events_file TEXT UNIQUE NOT NULL,
+    events_size INTEGER NOT NULL,
+    events_mtime REAL NOT NULL,
+    started TEXT,
+    ended TEXT,
+    duration REAL,
+    user TEXT,
+    mask TEXT,
+    revision TEXT,
+    dataprep TEXT,
+    final_folder TEXT,
+    outcome TEXT
+);
+CREATE TABLE IF NOT EXISTS archives (
+    ruid TEXT NOT NULL REFERENCES runs (ruid) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    sha256 TEXT,
+    files INTEGER,
+    bytes INTEGER,
+    archive_bytes INTEGER,
+    delta INTEGER,
+    created TEXT
+);
+CREATE TABLE IF NOT EXISTS phases (
+    ruid TEXT NOT NULL REFERENCES runs (ruid) ON DELETE CASCADE,
+    phase TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (ruid, phase)
+);
+CREATE INDEX IF NOT EXISTS runs_mask ON runs (mask, started);
+CREATE INDEX IF NOT EXISTS runs_user ON runs (user, started);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+CREATE INDEX IF NOT EXISTS archives_ruid ON archives (ruid);
+CREATE INDEX IF NOT EXISTS archives_sha256 ON archives (sha256);
+"""
+
+
+def index_path(archive_dir):
+    """
+    Return the path of the index database of a run archive.
+
+    Args:
+        archive_dir (str): The run archive directory.
+
+    Returns:
+        str: The path to the SQLite database.
+    """
+    return os.path.join(archive_dir, INDEX_NAME)
+
+
+def connect(archive_dir):
+    """
+    Open the index of a run archive, creating it if it does not exist.
+
+    Args:
+        archive_dir (str): The run archive directory.
+
+    Returns:
+        sqlite3.Connection: The open database.
+    """
+    connection = sqlite3.connect(index_path(archive_dir), timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA foreign_keys = ON")
+    if connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        with connection:
+            connection.executescript(SCHEMA)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return connection
+
+
+def summarize(events):
+    """
+    Condense the event stream of a run into the rows of the index.
+
+    Args:
+        events (iterable): The events of the run, in order.
+
+    Returns:
+        tuple: The run (dict), its archives (list of dicts) and its phase timings (dict),
+            or None if the stream does not contain a run_start event.
+    """
+    run = None
+    archives = []
+    phases = {}
+    previous = None
+    shipped = False
+    for event in events:
+        if previous is not None:
+            phases[previous["phase"]] = phases.get(previous["phase"], 0.0) + max(
+                event.get("t", 0.0) - previous.get("t", 0.0), 0.0
+            )
+        previous = event
+        event_type = event.get("type")
+        if event_type == "run_start":
+            run = {
+                "ruid": event.get("ruid"),
+                "started": event.get("time"),
+                "ended": None,
+                "duration": None,
+                "user": event.get("user"),
+                "mask": None,
+                "revision": None,
+                "dataprep": None,
+                "final_folder": None,
+                "outcome": "incomplete",
+            }
+        elif run is None:
+            continue
+        elif event_type == "folders_identified":
+            folders = event.get("folders") or {}
+            run["mask"] = os.path.basename(folders.get("mask_name") or "") or None
+            run["revision"] = os.path.basename(folders.get("revision") or "") or None
+            run["dataprep"] = folders.get("dataprep")
+            run["final_folder"] = folders.get("final_mask")
+        elif event_type == "archive_created":
+            archives.append(
+                {
+                    "path": (event.get("paths") or [None])[0],
+                    "sha256": event.get("sha256"),
+                    "files": event.get("files"),
+                    "bytes": event.get("bytes"),
+                    "archive_bytes": event.get("archive_bytes"),
+                    "delta": int(bool(event.get("delta"))),
+                    "created": event.get("time"),
+                }
+            )
+        elif event_type == "email_sent":
+            shipped = True
+        elif event_type == "run_end":
+            run["ended"] = event.get("time")
+            run["outcome"] = event.get("reason") or "closed"
+    if run is None:
+        return None
+    if previous is not None:
+        run["duration"] = previous.get("t")
+    if shipped:
+        run["outcome"] = "shipped"
+    return run, archives, phases
+
+
+def ingest(connection, events_file, force=False):
+    """
+    Add or refresh the index rows of one run.
+
+    Runs whose event stream did not change since it was indexed are skipped.
+
+    Args:
+        connection (sqlite3.Connection): The open index.
+        events_file (str): The path to the .jsonl events file of the run.
+        force (bool, optional): Index the run even if it did not change. Defaults to False.
+
+    Returns:
+        bool: True if the run was (re)indexed, False if it was skipped.
+    """
+    stat = os.stat(events_file)
+    if not force:
+        row = connection.execute(
+            "SELECT events_size, events_mtime FROM runs WHERE events_file = ?",
+            (events_file,),
+        ).fetchone()
+        if row is not None and (row[0], row[1]) == (stat.st_size, stat.st_mtime):
+            return False
+    summary = summarize(run_events.read_events(events_file))
+    if summary is None:
+        return False
+    run, archives, phases = summary
+    run.update(
+        events_file=events_file,
+        events_size=stat.st_size,
+        events_mtime=stat.st_mtime,
+    )
+    with connection:
+        connection.execute(
+            "DELETE FROM runs WHERE ruid = ? OR events_file = ?",
+            (run["ruid"], events_file),
+        )
+        columns = ", ".join(run)
+        connection.execute(
+            f"INSERT INTO runs ({columns}) VALUES ({', '.join('?' * len(run))})",
+            tuple(run.values()),
+        )
+        connection.executemany(
+            "INSERT INTO archives (ruid, path, sha256, files, bytes, archive_bytes, delta,"
+            " created) VALUES (:ruid, :path, :sha256, :files, :bytes, :archive_bytes,"
+            " :delta, :created)",
+            [dict(archive, ruid=run["ruid"]) for archive in archives],
+        )
+        connection.executemany(
+            "INSERT INTO phases (ruid, phase, seconds) VALUES (?, ?, ?)",
+            [(run["ruid"], phase, seconds) for phase, seconds in phases.items()],
+        )
+    return True
+
+
+def index_report(report_file):
+    """
+    Index the run of a finalised run report, used by the finalisation worker.
+
+    Args:
+        report_file (str): The path to the .lr run report in the run archive.
+
+    Returns:
+        bool: True if the run was indexed.
+    """
+    events_file = run_events.events_path(report_file)
+    if not os.path.exists(events_file):
+        return False
+    connection = connect(os.path.dirname(report_file))
+    try:
+        return ingest(connection, events_file)
+    finally:
+        connection.close()
+
+
+def update(archive_dir):
+    """
+    Index all runs of the run archive that are new or changed since the last update.
+
+    Args:
+        archive_dir (str): The run archive directory.
+
+    Returns:
+        int: The number of runs (re)indexed.
+    """
+    events_dir = os.path.join(archive_dir, run_events.EVENTS_DIR)
+    if not os.path.isdir(events_dir):
+        return 0
+    connection = connect(archive_dir)
+    try:
+        indexed = 0
+        for name in sorted(os.listdir(events_dir)):
+            if name.endswith(run_events.EVENTS_SUFFIX):
+                indexed += ingest(connection, os.path.join(events_dir, name))
+        return indexed
+    finally:
+        connection.close()
+
+
+def query(
+    connection, mask=None, user=None, since=None, ruid=None, sha256=None, limit=50
+):
+    """
+    Look up runs in the index, newest first.
+
+    Args:
+        connection (sqlite3.Connection): The open index.
+        mask (str, optional): Mask name, case-insensitive, '*' and '?' wildcards are allowed.
+            Defaults to None.
+        user (str, optional): User name. Defaults to None.
+        since (str, optional): Only runs started on or after this ISO date. Defaults to None.
+        ruid (str, optional): RUID, or its beginning. Defaults to None.
+        sha256 (str, optional): Checksum of an archive created by the run. Defaults to None.
+        limit (int, optional): Maximum number of runs returned. Defaults to 50.
+
+    Returns:
+        list: The matching runs (sqlite3.Row).
+    """
+    conditions = []
+    parameters = []
+    if mask:
+        conditions.append("runs.mask LIKE ?")
+        parameters.append(mask.replace("*", "%").replace("?", "_"))
+    if user:
+        conditions.append("runs.user = ?")
+        parameters.append(user)
+    if since:
+        conditions.append("runs.started >= ?")
+        parameters.append(since)
+    if ruid:
+        conditions.append("runs.ruid LIKE ?")
+        parameters.append(ruid + "%")
+    if sha256:
+        conditions.append(
+            "runs.ruid IN (SELECT ruid FROM archives WHERE sha256 = ?)"
+        )
+        parameters.append(sha256)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return connection.execute(
+        f"SELECT * FROM runs {where} ORDER BY started DESC LIMIT ?",
+        parameters + [limit],
+    ).fetchall()
+
+
+def print_runs(connection, runs, details=False):
+    """
+    Print runs as a table, optionally with their archives and phase timings.
+
+    Args:
+        connection (sqlite3.Connection): The open index.
+        runs (list): The runs returned by query().
+        details (bool, optional): Also print archives and phase timings. Defaults to False.
+    """
+    print(
+        f"{'started':<19}  {'user':<10} {'mask':<12} {'rev':<6} {'outcome':<17} ruid"
+    )
+    for run in runs:
+        print(
+            f"{(run['started'] or '')[:19]:<19}  {run['user'] or '':<10} "
+            f"{run['mask'] or '':<12} {run['revision'] or '':<6} "
+            f"{run['outcome'] or '':<17} {run['ruid']}"
+        )
+        if not details:
+            continue
+        print(f"    final folder: {run['final_folder']}")
+        for archive in connection.execute(
+            "SELECT * FROM archives WHERE ruid = ? ORDER BY created", (run["ruid"],)
+        ):
+            print(
+                f"    archive: {archive['path']} ({archive['files']} files, "
+                f"{'delta, ' if archive['delta'] else ''}sha256 {archive['sha256']})"
+            )
+        timings = ", ".join(
+            f"{phase} {seconds:.1f} s"
+            for phase, seconds in connection.execute(
+                "SELECT phase, seconds FROM phases WHERE ruid = ?", (run["ruid"],)
+            )
+        )
+        print(f"    phases: {timings}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index and query the run archive.")
+    parser.add_argument(
+        "-a",
+        "--archive",
+        help="Run archive directory. Defaults to run_archive_path of the configuration.",
+    )
+    parser.add_argument("-c", "--config", help="Path to the config file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("update", help="Index new and changed runs.")
+    query_parser = commands.add_parser("query", help="Look up runs, newest first.")
+    query_parser.add_argument("--mask", help="Mask name, wildcards allowed (e.g. 'AB12*').")
+    query_parser.add_argument("--user", help="User name.")
+    query_parser.add_argument("--since", help="Only runs started on or after this date.")
+    query_parser.add_argument("--ruid", help="RUID or its beginning.")
+    query_parser.add_argument("--sha256", help="Checksum of a shipped archive.")
+    query_parser.add_argument("--limit", type=int, default=50)
+    query_parser.add_argument(
+        "--details", action="store_true", help="Show archives and phase timings."
+    )
+    arguments = parser.parse_args()
+
+    archive_dir = arguments.archive
+    if archive_dir is None:
+        import convert_run_archive
+
+        archive_dir = convert_run_archive.default_archive_dir(arguments.config)
+    if not os.path.isdir(archive_dir):
+        print(f"ERROR       Run archive not found: {archive_dir}")
+        return 1
+
+    start = time.perf_counter()
+    if arguments.command == "update":
+        indexed = update(archive_dir)
+        print(
+            f"INFO        {indexed} runs indexed in {time.perf_counter() - start:.2f} s"
+        )
+        return 0
+
+    connection = connect(archive_dir)
+    try:
+        runs = query(
+            connection,
+            mask=arguments.mask,
+            user=arguments.user,
+            since=arguments.since,
+            ruid=arguments.ruid,
+            sha256=arguments.sha256,
+            limit=arguments.limit,
+        )
+        print_runs(connection, runs, details=arguments.details)
+    finally:
+        connection.close()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"INFO        {len(runs)} runs found in {elapsed:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
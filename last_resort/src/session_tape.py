@@ -0,0 +1,478 @@
+"""
+Recording and replaying of sessions, for reproducible performance comparisons.
+
+With --record, everything a session depends on besides the code is written to a tape,
+run_archive/sessions/<ruid>.tape.jsonl:
+
+- the inventory of the mask set folder tree: every folder, every file with its size,
+  and the content of the small files that are parsed (.po, .jb),
+- the answers of the user in order: message boxes, prompt_selection, the checklist and
+  the buttons clicked in the main window,
+- the results of the external tools: the email script output, the files created by
+  daps_po2pdf.
+
+With --replay TAPE, the inventory is recreated as a snapshot tree (files that are not
+parsed are sparse files of the recorded size), the application is started in it and
+the tape drives the session without a visible window: the answers are taken from the
+tape, the external tools are not run and the recorded buttons are clicked in order.
+Replaying the same tape with two versions gives comparable timings, see the span
+summary and --profile. A replay keeps its run report, events, run index and shipment
+manifests in a run archive inside the snapshot and writes no metrics, so it leaves no
+trace in the real run archive besides the --profile results. A temporary snapshot is
+removed when the replay ends. Tkinter still needs a display, on a machine without one
+use e.g. xvfb-run.
+
+The tape is a JSON-lines file: a header with the version and the environment, the
+inventory and the launch directory once the tree is known, then one line per
+interaction, appended as it happens. A line cut short by a crash of the recorded session is ignored on replay.
+Paths inside the recorded tree are stored relative to it, so a tape replays in any
+snapshot directory. A replay that asks for something the tape does not hold next, or
+in another order, stops with ReplayError: the code paths of the versions differ.
+
+The module has no dependencies on the rest of the application.
+"""
+import atexit
+import functools
+import json
+import os
+import shutil
+import tempfile
+import time
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+TAPE_VERSION = 2
+TAPE_SUFFIX = ".tape.jsonl"
+# Files whose content is kept on the tape, the others are recreated empty
+CONTENT_SUFFIXES = (".po", ".jb")
+MAX_CONTENT_SIZE = 1024 * 1024
+# Placeholder of the tree directory in recorded paths
+TREE_MARKER = "<tree>"
+# Environment variables that change the code paths, restored on replay
+ENVIRONMENT = ("RDPSITE",)
+
+MESSAGEBOX_FUNCTIONS = (
+    "askokcancel",
+    "askquestion",
+    "askretrycancel",
+    "askyesno",
+    "askyesnocancel",
+    "showerror",
+    "showinfo",
+    "showwarning",
+)
+
+mode = OFF
+tape_path = None
+tape = None
+# Directory the mask set folder is in, recorded paths are relative to it
+tree_dir = None
+
+_position = 0
+# The tape file being recorded, line buffered
+_tape_file = None
+# Main window actions by name, see action()
+_actions = {}
+
+
+class ReplayError(RuntimeError):
+    """
+    Raised when a replayed session does not follow its tape.
+    """
+
+
+class ReplayedProcess:
+    """
+    Stand-in for a subprocess.Popen of an external tool that is not run on replay.
+
+    Attributes:
+        args (list): The command that would have been run.
+        pid (int): Always 0.
+        returncode (int): Always 0.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.pid = 0
+        self.returncode = 0
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+    def kill(self):
+        pass
+
+    def terminate(self):
+        pass
+
+
+def recording():
+    """
+    Check whether the session is being recorded.
+
+    Returns:
+        bool: True with --record.
+    """
+    return mode == RECORD
+
+
+def replaying():
+    """
+    Check whether the session is being replayed.
+
+    Returns:
+        bool: True with --replay.
+    """
+    return mode == REPLAY
+
+
+def start_recording(path, launch_dir):
+    """
+    Start recording the session into a tape.
+
+    Args:
+        path (str): The path of the tape file.
+        launch_dir (str): The directory the application was started in.
+    """
+    global mode, tape_path, tape, _tape_file
+    mode = RECORD
+    tape_path = path
+    header = {
+        "version": TAPE_VERSION,
+        "recorded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "launch_dir": os.path.abspath(launch_dir),
+        "environment": {name: os.environ.get(name) for name in ENVIRONMENT},
+    }
+    tape = dict(header, inventory=[], interactions=[])
+    _tape_file = open(path, "w", buffering=1)
+    _append(header)
+
+
+def start_replay(path, snapshot_dir=None):
+    """
+    Load a tape, recreate its folder tree and change into the launch directory.
+
+    Args:
+        path (str): The path of the tape file.
+        snapshot_dir (str, optional): The directory to recreate the tree in. Defaults to
+            a new temporary directory, removed when the process exits.
+
+    Returns:
+        str: The launch directory inside the snapshot tree.
+
+    Raises:
+        ReplayError: If the tape cannot be read or has an unknown version.
+    """
+    global mode, tape_path, tape, tree_dir, _position
+    tape = _load(path)
+    mode = REPLAY
+    tape_path = path
+    _position = 0
+    if snapshot_dir:
+        tree_dir = snapshot_dir
+    else:
+        tree_dir = tempfile.mkdtemp(prefix="last_resort_replay_")
+        # Registered before the run report is created, so it is removed last
+        atexit.register(shutil.rmtree, tree_dir, ignore_errors=True)
+    materialize(tape["inventory"], tree_dir)
+    for name, value in tape["environment"].items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+    launch_dir = _restore_paths(tape["launch_dir"])
+    os.chdir(launch_dir)
+    return launch_dir
+
+
+def set_tree(directory):
+    """
+    Set the directory the recorded mask set folder is in and take its inventory.
+
+    Args:
+        directory (str): The directory containing the mask set folder.
+    """
+    global tree_dir
+    if mode != RECORD:
+        return
+    tree_dir = os.path.abspath(directory)
+    mask_set_dir = os.path.relpath(tape["launch_dir"], tree_dir).split(os.sep)[0]
+    tape["inventory"] = take_inventory(tree_dir, mask_set_dir)
+    # The launch directory again, now relative to the tree
+    _append({"launch_dir": tape["launch_dir"], "inventory": tape["inventory"]})
+
+
+def take_inventory(directory, subdirectory):
+    """
+    List the folders and files of a folder tree.
+
+    Args:
+        directory (str): The directory the paths are relative to.
+        subdirectory (str): The folder inside the directory to list.
+
+    Returns:
+        list: Dicts with the relative path, and the size and optionally the content
+            (latin-1) of files.
+    """
+    inventory = []
+    for folder, folders, files in os.walk(os.path.join(directory, subdirectory)):
+        relative = os.path.relpath(folder, directory)
+        inventory.append({"path": relative})
+        for name in sorted(files):
+            path = os.path.join(folder, name)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                # Broken link or a file removed while walking
+                continue
+            entry = {"path": os.path.join(relative, name), "size": size}
+            if name.endswith(CONTENT_SUFFIXES) and size <= MAX_CONTENT_SIZE:
+                with open(path, "rb") as file:
+                    entry["content"] = file.read().decode("latin-1")
+            inventory.append(entry)
+        folders.sort()
+    return inventory
+
+
+def materialize(inventory, directory):
+    """
+    Recreate a folder tree from its inventory.
+
+    Args:
+        inventory (list): The inventory, see take_inventory().
+        directory (str): The directory to recreate the tree in.
+    """
+    for entry in inventory:
+        path = os.path.join(directory, entry["path"])
+        if "size" not in entry:
+            os.makedirs(path, exist_ok=True)
+            continue
+        with open(path, "wb") as file:
+            if "content" in entry:
+                file.write(entry["content"].encode("latin-1"))
+            else:
+                file.truncate(entry["size"])
+
+
+def _store_paths(value):
+    # Paths inside the tree are stored relative to it
+    if isinstance(value, str) and tree_dir and os.path.isabs(value):
+        if value == tree_dir or value.startswith(tree_dir + os.sep):
+            return TREE_MARKER + value[len(tree_dir) :]
+    if isinstance(value, (list, tuple)):
+        return [_store_paths(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _store_paths(item) for key, item in value.items()}
+    return value
+
+
+def _restore_paths(value):
+    if isinstance(value, str) and value.startswith(TREE_MARKER):
+        return tree_dir + value[len(TREE_MARKER) :]
+    if isinstance(value, list):
+        return [_restore_paths(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _restore_paths(item) for key, item in value.items()}
+    return value
+
+
+def _append(record):
+    # One line per record, written at once, so the tape of a crashed session is complete
+    _tape_file.write(json.dumps(_store_paths(record), separators=(",", ":")) + "\n")
+
+
+def _load(path):
+    try:
+        with open(path) as file:
+            lines = file.read().split("\n")
+    except OSError as error:
+        raise ReplayError(f"Cannot read the tape {path}: {error}")
+    records = []
+    for number, line in enumerate(lines, 1):
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError as error:
+            if number == len(lines):
+                # Cut short by a crash of the recorded session, no newline written
+                break
+            raise ReplayError(f"Cannot read line {number} of the tape {path}: {error}")
+    if not records or records[0].get("version") != TAPE_VERSION:
+        version = records[0].get("version") if records else None
+        raise ReplayError(f"Unsupported tape version: {version}")
+    loaded = dict(records[0], inventory=[], interactions=[])
+    for record in records[1:]:
+        if "inventory" in record:
+            loaded.update(record)
+        else:
+            loaded["interactions"].append(record)
+    return loaded
+
+
+def _next(kind, key):
+    global _position
+    interactions = tape["interactions"]
+    if _position >= len(interactions):
+        raise ReplayError(f"The tape ended, the session asked for {kind} {key!r}")
+    entry = interactions[_position]
+    if entry["kind"] != kind or entry["key"] != key:
+        raise ReplayError(
+            f"The session asked for {kind} {key!r}, the tape holds "
+            f"{entry['kind']} {entry['key']!r} at position {_position}"
+        )
+    _position += 1
+    return _restore_paths(entry.get("value"))
+
+
+def interaction(kind, key, live, replay=None):
+    """
+    Run one interaction with the user or an external tool through the tape.
+
+    Args:
+        kind (str): The kind of interaction, e.g. 'messagebox'.
+        key (str): Identifies the interaction within its kind, e.g. the dialog title.
+        live (callable): Performs the interaction, its result must be JSON serialisable.
+        replay (callable, optional): Called with the recorded result on replay, to
+            reproduce side effects of the interaction. Defaults to None.
+
+    Returns:
+        The result of the interaction, recorded or live.
+
+    Raises:
+        ReplayError: If the tape does not hold this interaction next.
+    """
+    if mode == REPLAY:
+        value = _next(kind, key)
+        if replay is not None:
+            replay(value)
+        return value
+    value = live()
+    if mode == RECORD:
+        entry = {"kind": kind, "key": key, "value": value}
+        tape["interactions"].append(entry)
+        _append(entry)
+    return value
+
+
+def recorded(kind, key_argument=None, replay=None):
+    """
+    Decorate a function so that its calls are interactions, see interaction().
+
+    Args:
+        kind (str): The kind of interaction.
+        key_argument (str, optional): The argument identifying the call. Defaults to None.
+        replay (callable, optional): Reproduces side effects on replay. Defaults to None.
+
+    Returns:
+        callable: The decorator.
+    """
+
+    def decorator(function):
+        signatures = []
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            key = None
+            if key_argument is not None:
+                if not signatures:
+                    # inspect is slow to import, the decorators are applied at startup
+                    import inspect
+
+                    signatures.append(inspect.signature(function))
+                key = signatures[0].bind(*args, **kwargs).arguments.get(key_argument)
+            return interaction(
+                kind, key, lambda: function(*args, **kwargs), replay=replay
+            )
+
+        return wrapper
+
+    return decorator
+
+
+def install_messagebox(messagebox):
+    """
+    Route the dialogs of the tkinter messagebox module through the tape.
+
+    Args:
+        messagebox (module): The tkinter.messagebox module.
+    """
+    for name in MESSAGEBOX_FUNCTIONS:
+        function = getattr(messagebox, name)
+        if getattr(function, "__wrapped__", None) is not None:
+            continue
+
+        def dialog(title=None, message=None, _function=function, _name=name, **options):
+            return interaction(
+                "messagebox",
+                f"{_name}: {title}",
+                lambda: _function(title, message, **options),
+            )
+
+        dialog.__wrapped__ = function
+        setattr(messagebox, name, dialog)
+
+
+def action(name, function):
+    """
+    Register a main window action and return the callback for its button.
+
+    Clicks are recorded in order; on replay, replay_actions() performs them.
+
+    Args:
+        name (str): The name of the action, unique in the main window.
+        function (callable): The action, called without arguments.
+
+    Returns:
+        callable: The button callback.
+    """
+    _actions[name] = function
+
+    def callback():
+        if mode == RECORD:
+            entry = {"kind": "action", "key": name}
+            tape["interactions"].append(entry)
+            _append(entry)
+        return function()
+
+    return callback
+
+
+def replay_actions(close_action, on_action=None):
+    """
+    Perform the recorded main window actions in order, instead of the main loop.
+
+    Args:
+        close_action (str): The action closing the application, performed at the end
+            of a tape that does not end with it.
+        on_action (callable, optional): Called with the name of each action and the
+            seconds since the first one, before the action is performed. Defaults to
+            None.
+
+    Raises:
+        ReplayError: If the tape holds an unknown action or something else than an
+            action where the user had the main window.
+    """
+    global _position
+    start = time.perf_counter()
+    interactions = tape["interactions"]
+    last_action = None
+    while _position < len(interactions):
+        entry = interactions[_position]
+        if entry["kind"] != "action" or entry["key"] not in _actions:
+            raise ReplayError(
+                f"Expected a main window action at position {_position}, the tape "
+                f"holds {entry['kind']} {entry['key']!r}"
+            )
+        _position += 1
+        if on_action is not None:
+            on_action(entry["key"], time.perf_counter() - start)
+        last_action = entry["key"]
+        _actions[last_action]()
+    if last_action != close_action:
+        _actions[close_action]()
@@ -0,0 +1,23 @@
+"""
+Import path of the modules shared with the other tools.
+
+log_core and metrics are kept once, in zee_utils, and used by Last Resort, the zee
+tools and mebes_converter. Importing this module appends zee_utils to sys.path, after
+the directory of the application, so a module of the application is never shadowed by
+a zee_utils module of the same name, e.g. argument_parser.
+
+The directory is taken from the ZEE_UTILS_DIR environment variable, falling back to the
+zee_utils folder next to the last_resort folder.
+
+The module has no dependencies on the rest of the application.
+"""
+import os
+import sys
+
+SHARED_DIR = os.environ.get("ZEE_UTILS_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "zee_utils",
+)
+
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
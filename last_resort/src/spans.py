@@ -0,0 +1,167 @@
+"""
+Timing spans for the phases of a run.
+
+A span measures the wall clock time and the CPU time of one phase, e.g. identifying the
+folders or creating the archives. The CPU time is split into the time spent in the
+thread running the phase and the time spent in finished child processes (daps_po2pdf,
+the email script).
+Spans are used as a decorator or as a context manager:
+
+    @spans.timed("tar_file")
+    def tar_file(): ...
+
+    with spans.Span("daps_po2pdf"):
+        subprocess.run(...)
+
+Finished spans are kept in memory for the summary table and passed to the listeners,
+which write them into the run report and the event stream of the run.
+
+The module has no dependencies on the rest of the application, so it can be used by the
+modules that import each other at start-up.
+"""
+import functools
+import os
+import threading
+import time
+
+# Finished spans of this process, in the order they ended
+records = []
+# Callables notified with each finished span
+listeners = []
+
+# Names of the spans that are running in each thread, outermost first. The background
+# tasks of the main window measure their phases in their own threads.
+_local = threading.local()
+
+
+def _active():
+    names = getattr(_local, "names", None)
+    if names is None:
+        names = _local.names = []
+    return names
+
+
+class Span:
+    """
+    Context manager measuring the wall and CPU time of one phase.
+
+    Attributes:
+        name (str): The name of the phase.
+        depth (int): Number of spans this span is nested in.
+        recursive (bool): Whether a span of the same name encloses this one.
+        wall (float): Elapsed wall clock time in seconds.
+        cpu (float): CPU time of the thread running the span in seconds.
+        children_cpu (float): CPU time of child processes that finished during the span.
+        failed (bool): Whether the phase ended with an exception.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.depth = 0
+        self.recursive = False
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.children_cpu = 0.0
+        self.failed = False
+
+    def __enter__(self):
+        active = _active()
+        self.depth = len(active)
+        self.recursive = self.name in active
+        active.append(self.name)
+        times = os.times()
+        self._children_start = times.children_user + times.children_system
+        self._cpu_start = time.thread_time()
+        self._wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall = time.perf_counter() - self._wall_start
+        self.cpu = time.thread_time() - self._cpu_start
+        times = os.times()
+        self.children_cpu = (
+            times.children_user + times.children_system - self._children_start
+        )
+        self.failed = exc_type is not None
+        _active().pop()
+        records.append(self)
+        for listener in listeners:
+            try:
+                listener(self)
+            except Exception:
+                # Timing must never break the phase it measures
+                pass
+        return False
+
+
+def timed(name=None):
+    """
+    Decorate a function so that every call is measured as a span.
+
+    Args:
+        name (str, optional): The name of the span. Defaults to the function name.
+
+    Returns:
+        callable: The decorator.
+    """
+
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Span(span_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def summary():
+    """
+    Aggregate the finished spans by name.
+
+    The times of a span enclosed by a span of the same name, like a retry calling the
+    function again, are already part of the enclosing span and are not added twice.
+
+    Returns:
+        list: Tuples of name, calls, total wall time, total CPU time, total child CPU time
+            and the longest wall time, in the order the phases first ended.
+    """
+    totals = {}
+    for span in records:
+        calls, wall, cpu, children_cpu, longest = totals.get(span.name, (0, 0, 0, 0, 0))
+        if span.recursive:
+            totals[span.name] = (calls + 1, wall, cpu, children_cpu, longest)
+            continue
+        totals[span.name] = (
+            calls + 1,
+            wall + span.wall,
+            cpu + span.cpu,
+            children_cpu + span.children_cpu,
+            max(longest, span.wall),
+        )
+    return [(name,) + values for name, values in totals.items()]
+
+
+def format_summary():
+    """
+    Format the summary of the finished spans as a table.
+
+    Returns:
+        list: The lines of the table, empty if no span finished.
+    """
+    rows = summary()
+    if not rows:
+        return []
+    lines = [
+        f"{'phase':<22} {'calls':>5} {'wall [s]':>9} {'cpu [s]':>8} "
+        f"{'child cpu [s]':>13} {'max [s]':>8}"
+    ]
+    for name, calls, wall, cpu, children_cpu, longest in rows:
+        lines.append(
+            f"{name:<22} {calls:>5} {wall:>9.3f} {cpu:>8.3f} "
+            f"{children_cpu:>13.3f} {longest:>8.3f}"
+        )
+    return lines
@@ -0,0 +1,173 @@
+"""
+Syntax highlighting of the .po and .jb previews.
+
+The tokens a reviewer checks are tagged in the text widget of a file_presenter.FileView:
+the layer names, the prices, the mask grades and the labels of a .po file, the keywords
+and the layer names of a .jb job deck. The item lines of a .po file are split into
+columns like zee_utils/po_parser does, the layer name is the third column and the grade
+the ninth.
+
+Highlighting a whole file at once would freeze Tk, so a Highlighter tags a few lines per
+idle callback, the lines in view first, then the loaded lines nearest to the view. Only
+the lines loaded in the widget are highlighted, the lines the view loads later are
+tagged as they come.
+
+The module does not import tkinter and has no dependencies on the rest of the
+application.
+"""
+import os
+import re
+
+# Lines tagged per idle callback
+LINES_PER_TICK = 100
+
+# Tag name: foreground colour
+TAG_COLOURS = {
+    "keyword": "#1f5fbf",
+    "layer": "#8a3ab9",
+    "price": "#1e7b34",
+    "grade": "#b35c00",
+}
+
+PO_LABEL = re.compile(r"\b(?:VENDOR|P\.O\. #|REQUESTOR|DEPT|OU|CC):|T O T A L")
+PO_ITEM_LINE = re.compile(r"\|\s+\d+\s+[A-Za-z]{2}\d{2}")
+PO_COLUMN = re.compile(r"[^\s|]+")
+PO_LAYER_COLUMN = 2
+PO_GRADE_COLUMN = 8
+PRICE = re.compile(r"(?<![\w.])\d+\.\d{2}(?![\w.])")
+
+JB_KEYWORD = re.compile(
+    r"^\s*(?:TITLE|JOB|OPTIONS?|CHIP|PATTERN|LAYER|ROW|COLUMN|ARRAY|PLACE|ORIGIN|"
+    r"SCALE|MIRROR|ROTATE|SIZE|FRAME|INCLUDE|END)\b"
+)
+JB_LAYER = re.compile(r"\b(?:LAYER|PATTERN)\s+([^\s,;]+)")
+
+
+def _po_spans(line):
+    for match in PO_LABEL.finditer(line):
+        yield "keyword", match.start(), match.end()
+    for match in PRICE.finditer(line):
+        yield "price", match.start(), match.end()
+    if PO_ITEM_LINE.match(line):
+        for column, match in enumerate(PO_COLUMN.finditer(line)):
+            if column == PO_LAYER_COLUMN:
+                yield "layer", match.start(), match.end()
+            elif column == PO_GRADE_COLUMN:
+                yield "grade", match.start(), match.end()
+                break
+
+
+def _jb_spans(line):
+    match = JB_KEYWORD.match(line)
+    if match:
+        yield "keyword", match.end() - len(match.group().lstrip()), match.end()
+    for match in JB_LAYER.finditer(line):
+        yield "layer", match.start(1), match.end(1)
+
+
+SPANS = {".po": _po_spans, ".jb": _jb_spans}
+
+
+def spans_function(path):
+    """
+    Return the function finding the tokens of the lines of a file.
+
+    Args:
+        path (str): The path to the file.
+
+    Returns:
+        callable: Called with a line, yields (tag, start, end) with the columns of the
+            tokens; None for a file that is not highlighted.
+    """
+    return SPANS.get(os.path.splitext(path)[1].lower())
+
+
+class Highlighter:
+    """
+    Tags the lines loaded in a FileView in idle callbacks, nearest to the view first.
+
+    The view calls reset() when it replaced its lines and schedule() when it loaded new
+    ones. Lines dropped by the view lose their tags with their text.
+
+    Attributes:
+        view (file_presenter.FileView): The view.
+        spans (callable): See spans_function(), None for a file that is not highlighted.
+        done (set): The highlighted lines of the file.
+    """
+
+    def __init__(self, view, path):
+        """
+        Args:
+            view (file_presenter.FileView): The view, its text widget is configured.
+            path (str): The path to the file shown by the view.
+        """
+        self.view = view
+        self.spans = spans_function(path)
+        self.done = set()
+        self._scheduled = False
+        if self.spans is not None:
+            for tag, colour in TAG_COLOURS.items():
+                view.text.tag_configure(tag, foreground=colour)
+
+    def reset(self):
+        """
+        Forget the highlighted lines, after the view replaced the content of the widget.
+        """
+        self.done.clear()
+        self.schedule()
+
+    def schedule(self):
+        """
+        Highlight the loaded lines that are not highlighted yet, in idle callbacks.
+        """
+        if self.spans is None or self._scheduled:
+            return
+        self._scheduled = True
+        self.view.master.after_idle(self._tick)
+
+    def _tick(self):
+        self._scheduled = False
+        view = self.view
+        if view.index.closed:
+            return
+        # The lines dropped by the view are highlighted again if loaded again
+        self.done.intersection_update(range(view.first, view.last))
+        lines = []
+        for line in self._by_distance():
+            if line not in self.done:
+                lines.append(line)
+                if len(lines) == LINES_PER_TICK:
+                    break
+        for line in lines:
+            self.highlight(line)
+        if len(self.done) < view.last - view.first:
+            # Scheduled again from an idle callback, it runs after the pending events
+            self.schedule()
+
+    def _by_distance(self):
+        # The lines in view, then the lines below and above, alternately
+        view = self.view
+        top = max(view.top_line(), view.first)
+        bottom = min(view.bottom_line(), view.last - 1)
+        yield from range(top, bottom + 1)
+        below, above = bottom + 1, top - 1
+        while below < view.last or above >= view.first:
+            if below < view.last:
+                yield below
+                below += 1
+            if above >= view.first:
+                yield above
+                above -= 1
+
+    def highlight(self, line):
+        """
+        Tag the tokens of a loaded line.
+
+        Args:
+            line (int): The line of the file, from 0.
+        """
+        row = line - self.view.first + 1
+        text = self.view.text
+        for tag, start, end in self.spans(text.get(f"{row}.0", f"{row}.end")):
+            text.tag_add(tag, f"{row}.{start}", f"{row}.{end}")
+        self.done.add(line)
@@ -0,0 +1,338 @@
+"""
+Background tasks of the main window.
+
+The buttons of the main window start actions that take seconds or minutes: the email
+script, secret, creating the archives and the final folder. Run in a Tk callback, they
+freeze the window until they end. A TaskRunner runs them in a few worker threads
+instead:
+
+    tasks = task_runner.TaskRunner(root, on_status=show_status)
+    tasks.submit("tar", "Force tar file operation", utils.tar_file, group="archive")
+
+Tk may only be used from the thread running the main loop. A task asks the Tk thread to
+do something with call_in_ui(), which waits for the result. The requests and the ends of
+the tasks are put in a queue that the Tk thread polls with root.after() while tasks are
+running. install_messagebox() routes the dialogs of the messagebox module through
+call_in_ui(), so the actions ask their questions as before and wait for the answer in
+their worker.
+
+A task is not started while a task of the same name or group is running, submit()
+returns False then. Tasks of a group write the same files, e.g. the archives. The
+status of every task is passed to on_status in the Tk thread. An exception of a task is
+reported through root.report_callback_exception, like one of a Tk callback.
+
+The workers are daemon threads, closing the application does not wait for them.
+
+The module has no dependencies on the rest of the application.
+"""
+import queue
+import sys
+import threading
+import time
+
+# Number of tasks running at the same time
+MAX_WORKERS = 2
+# Milliseconds between two polls of the queue while tasks are running
+POLL_INTERVAL = 50
+# Seconds between two checks for a closed window while waiting for the Tk thread
+CLOSED_CHECK_INTERVAL = 0.5
+
+WAITING = "waiting"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+MESSAGEBOX_FUNCTIONS = (
+    "askokcancel",
+    "askquestion",
+    "askretrycancel",
+    "askyesno",
+    "askyesnocancel",
+    "showerror",
+    "showinfo",
+    "showwarning",
+)
+
+
+class Task:
+    """
+    One run of a background task.
+
+    Attributes:
+        name (str): Identifies the task, a task is not started twice at a time.
+        label (str): The name shown to the user.
+        group (str): Tasks of the same group do not run at the same time.
+        state (str): WAITING, RUNNING, DONE or FAILED.
+        started (float): time.monotonic() when the task started, or None.
+        elapsed (float): Seconds the task took, once it ended.
+        result: The return value of the task function.
+        error (BaseException): The exception the task failed with, or None.
+    """
+
+    def __init__(self, name, label, group, function, args, kwargs):
+        self.name = name
+        self.label = label
+        self.group = group
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.state = WAITING
+        self.started = None
+        self.elapsed = 0.0
+        self.result = None
+        self.error = None
+        self._traceback = None
+
+    def run(self):
+        self.state = RUNNING
+        self.started = time.monotonic()
+        try:
+            self.result = self.function(*self.args, **self.kwargs)
+            self.state = DONE
+        except Exception as error:
+            self.fail(error)
+        finally:
+            self.elapsed = time.monotonic() - self.started
+
+    def fail(self, error):
+        self.error = error
+        self._traceback = error.__traceback__
+        self.state = FAILED
+
+
+class _Call:
+    # A request of a worker to the Tk thread
+    def __init__(self, function, args, kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class TaskRunner:
+    """
+    Runs the actions of a Tk window in worker threads.
+
+    Attributes:
+        root (tk.Tk): The root window, its main loop runs in the Tk thread.
+        tasks (dict): The last run of every task, by name.
+    """
+
+    def __init__(self, root, on_status=None, max_workers=MAX_WORKERS):
+        """
+        Args:
+            root (tk.Tk): The root window.
+            on_status (callable, optional): Called with a Task in the Tk thread whenever
+                its state changes. Defaults to None.
+            max_workers (int, optional): Number of worker threads. Defaults to
+                MAX_WORKERS.
+        """
+        self.root = root
+        self.on_status = on_status
+        self.max_workers = max_workers
+        self.tasks = {}
+        # Tasks whose end the Tk thread did not handle yet, by name
+        self._active = {}
+        self._thread = threading.current_thread()
+        self._work = queue.Queue()
+        self._events = queue.Queue()
+        self._workers = []
+        self._polling = False
+        self._closed = False
+
+    def in_ui_thread(self):
+        """
+        Check whether the caller runs in the Tk thread.
+
+        Returns:
+            bool: True in the thread that created the runner.
+        """
+        return threading.current_thread() is self._thread
+
+    def active(self):
+        """
+        List the tasks that have not ended.
+
+        Returns:
+            list: The waiting and running tasks.
+        """
+        return list(self._active.values())
+
+    def running(self, name=None, group=None):
+        """
+        Find a task that has not ended, by name or by group.
+
+        Args:
+            name (str, optional): The name of the task. Defaults to None.
+            group (str, optional): The group of the task. Defaults to None.
+
+        Returns:
+            Task: The waiting or running task, or None.
+        """
+        for task in self._active.values():
+            if task.name == name or (group is not None and task.group == group):
+                return task
+        return None
+
+    def submit(self, name, label, function, *args, group=None, wait=False, **kwargs):
+        """
+        Start a task in a worker thread.
+
+        Args:
+            name (str): Identifies the task.
+            label (str): The name shown to the user.
+            function (callable): The task, called with the remaining arguments.
+            group (str, optional): Tasks of the same group do not run at the same time.
+                Defaults to the name.
+            wait (bool, optional): Run the task in the calling thread and return when it
+                ended, e.g. to keep the order of a recorded session. Defaults to False.
+
+        Returns:
+            bool: False if the task or a task of its group did not end yet.
+        """
+        group = group or name
+        if self.running(name, group) is not None:
+            return False
+        task = Task(name, label, group, function, args, kwargs)
+        self.tasks[name] = task
+        self._active[name] = task
+        self._notify(task)
+        if wait:
+            task.run()
+            self._finished(task)
+            return True
+        if len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._work_loop,
+                name=f"task-worker-{len(self._workers)}",
+                daemon=True,
+            )
+            self._workers.append(worker)
+            worker.start()
+        self._work.put(task)
+        self._start_polling()
+        return True
+
+    def call_in_ui(self, function, *args, **kwargs):
+        """
+        Call a function in the Tk thread and return its result.
+
+        Called in the Tk thread, the function is called right away.
+
+        Args:
+            function (callable): The function, called with the remaining arguments.
+
+        Returns:
+            The return value of the function.
+
+        Raises:
+            RuntimeError: If the window was closed.
+            Exception: The exception raised by the function.
+        """
+        if self.in_ui_thread():
+            return function(*args, **kwargs)
+        if self._closed:
+            raise RuntimeError("The main window is closed.")
+        call = _Call(function, args, kwargs)
+        self._events.put(call)
+        while not call.done.wait(CLOSED_CHECK_INTERVAL):
+            if self._closed:
+                raise RuntimeError("The main window is closed.")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def close(self):
+        """
+        Stop serving the tasks, calls to the Tk thread fail from now on.
+        """
+        self._closed = True
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(event, _Call):
+                event.error = RuntimeError("The main window is closed.")
+                event.done.set()
+
+    def _work_loop(self):
+        while True:
+            task = self._work.get()
+            self._events.put(("started", task))
+            try:
+                task.run()
+            except BaseException as error:
+                # E.g. exit() called by the task, the worker keeps serving
+                task.fail(error)
+            self._events.put(("ended", task))
+
+    def _start_polling(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_INTERVAL, self._poll)
+
+    def _poll(self):
+        if self._closed:
+            return
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(event, _Call):
+                try:
+                    event.result = event.function(*event.args, **event.kwargs)
+                except Exception as error:
+                    event.error = error
+                event.done.set()
+            elif event[0] == "started":
+                # A short task may have ended already, its end is notified next
+                if event[1].state == RUNNING:
+                    self._notify(event[1])
+            else:
+                self._finished(event[1])
+        if not self._active:
+            self._polling = False
+            return
+        self.root.after(POLL_INTERVAL, self._poll)
+
+    def _finished(self, task):
+        del self._active[task.name]
+        self._notify(task)
+        if task.state == FAILED:
+            # Reported like an exception in a Tk callback
+            self.root.report_callback_exception(
+                type(task.error), task.error, task._traceback
+            )
+
+    def _notify(self, task):
+        if self.on_status is None:
+            return
+        try:
+            self.on_status(task)
+        except Exception:
+            self.root.report_callback_exception(*sys.exc_info())
+
+
+def install_messagebox(messagebox, runner):
+    """
+    Route the dialogs of the tkinter messagebox module through a runner, so background
+    tasks can show them.
+
+    Args:
+        messagebox (module): The tkinter.messagebox module.
+        runner (TaskRunner): The runner of the tasks.
+    """
+    for name in MESSAGEBOX_FUNCTIONS:
+        function = getattr(messagebox, name)
+        if getattr(function, "task_runner", None) is not None:
+            continue
+
+        def dialog(*args, _function=function, **kwargs):
+            return runner.call_in_ui(_function, *args, **kwargs)
+
+        dialog.task_runner = runner
+        setattr(messagebox, name, dialog)
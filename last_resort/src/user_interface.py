@@ -1,14 +1,25 @@
 import os
-import re
-import tkinter as tk
-from tkinter import messagebox
 
 import config_parser
 import utils
 import file_operations
 import argument_parser
+import lazy_import
+import session_tape
+import task_runner
+
+tk = lazy_import.module("tkinter")
+messagebox = lazy_import.module("tkinter.messagebox")
 
 buttons_row = 10
+# Group of the tasks writing the final folder and the archives, one runs at a time
+FINAL_FOLDER_TASKS = "final_folder"
+# Runs the actions of the main window in the background, see run_task
+tasks = None
+# Buttons of the background tasks by task name, with the group of the task
+task_buttons = {}
+# Text of the task status line of the expanded view
+task_status = None
 global chl_vars
 we_done = False
 global checklist_items
@@ -27,7 +38,73 @@ def init_main_window(root):
     root.title(f"{title} - {version}")
     root.eval("tk::PlaceWindow . center")
     root.geometry(window_size)
-    root.protocol("WM_DELETE_WINDOW", lambda: close_app(root))
+    root.protocol(
+        "WM_DELETE_WINDOW", session_tape.action("close", lambda: close_app(root))
+    )
+    utils.install_error_hooks(root)
+    global tasks
+    tasks = task_runner.TaskRunner(root, on_status=show_task_status)
+    task_runner.install_messagebox(messagebox, tasks)
+
+
+def run_task(name, label, function, *args, group=None):
+    """
+    Run an action of the main window in the background, keeping the window responsive.
+
+    A recorded or replayed session runs the actions one after the other instead, so
+    their interactions are on the tape in order.
+
+    Args:
+        name (str): Identifies the task.
+        label (str): The name of the task shown to the user.
+        function (callable): The action, called with the remaining arguments.
+        group (str, optional): Tasks of the same group do not run at the same time.
+            Defaults to the name.
+
+    Returns:
+        bool: False if the task or a task of its group is still running.
+    """
+    wait = session_tape.recording() or session_tape.replaying()
+    if tasks.submit(name, label, function, *args, group=group, wait=wait):
+        return True
+    busy = tasks.running(name, group or name)
+    utils.printer(
+        message=f"{label} not started, {busy.label} is still running.",
+        log_type=utils.Type.WARNING,
+    )
+    return False
+
+
+def show_task_status(task):
+    """
+    Show the state of a background task in the main window.
+
+    The buttons of the tasks that cannot start are disabled, the status line lists the
+    state of every task started so far.
+
+    Args:
+        task (task_runner.Task): The task whose state changed.
+    """
+    if task.state == task_runner.RUNNING:
+        utils.debug(message=f"Task started: {task.label}", log=True)
+    elif task.state in (task_runner.DONE, task_runner.FAILED):
+        utils.debug(
+            message=f"Task {task.state}: {task.label} in {task.elapsed:.1f} s", log=True
+        )
+    for name, (button, group) in task_buttons.items():
+        busy = tasks.running(name, group) is not None
+        button.config(state=tk.DISABLED if busy else tk.NORMAL)
+    if task_status is None:
+        return
+    lines = []
+    for each in tasks.tasks.values():
+        if each.state == task_runner.DONE:
+            lines.append(f"{each.label}: done in {each.elapsed:.1f} s")
+        elif each.state == task_runner.FAILED:
+            lines.append(f"{each.label}: failed after {each.elapsed:.1f} s")
+        else:
+            lines.append(f"{each.label}: {each.state}..")
+    task_status.set("\n".join(lines))
 
 
 def confirm_button_action(root):
@@ -42,6 +119,15 @@ def confirm_button_action(root):
     """
 
     utils.kill_processes()
+    # The ticked items are part of a recorded session
+    session_tape.interaction(
+        "checklist",
+        None,
+        lambda: [variable.get() for variable in chl_vars],
+        replay=lambda states: [
+            variable.set(state) for variable, state in zip(chl_vars, states)
+        ],
+    )
     file_operations.save_checklist_to_pdf()
     utils.gather_intel(root)
 
@@ -69,7 +155,9 @@ def load_checklist(root, selected_po):
     def on_save():
         confirm_button_action(root)
 
-    save_button = tk.Button(frame, text="Save", command=on_save)
+    save_button = tk.Button(
+        frame, text="Save", command=session_tape.action("save", on_save)
+    )
     save_button.grid(row=buttons_row - 1, column=1, padx=20, pady=10)
 
 
@@ -88,6 +176,7 @@ def resize_based_on_input_length(root, options):
     root.geometry(f"{width}x200")
 
 
+@session_tape.recorded("prompt_selection", key_argument="title")
 def prompt_selection(root, options, title, is_file_list=None, is_folder_list=None):
     """
     Prompt the user to select an option from a list.
@@ -127,8 +216,7 @@ def prompt_selection(root, options, title, is_file_list=None, is_folder_list=Non
     var = tk.StringVar(selection_window)
 
     # Retrieve the pattern from config_parser
-    pattern = config_parser.get("final_mask_pattern")  # anonymized
-    regex = re.compile(pattern)
+    regex = config_parser.config().final_mask_pattern  # anonymized
 
     # Check each option to see if it contains the pattern
     default_option = display_options[0]
@@ -155,14 +243,30 @@ def close_app(root):
     """
     Close the application and perform cleanup actions.
 
+    Closing the editors and converting the run report into a locked PDF is left to a
+    detached worker process, so the application exits immediately.
+
     Args:
         root (tk.Tk): The root window of the Tkinter application.
     """
     global we_done
+    running = [task.label for task in tasks.active()] if tasks is not None else []
+    if running and not messagebox.askyesno(
+        "Tasks running",
+        f"{', '.join(running)} did not finish yet. Close anyway?\n"
+        "Archives that are not complete are discarded.",
+    ):
+        return
+    if tasks is not None:
+        tasks.close()
     root.destroy()
+    utils.debug(message="Handing run report finalisation to a worker.", log=True)
+    utils.print_span_summary()
+    file_operations.record_event("run_end", phase="shutdown", reason="closed")
+    # Messages are not written to the run report after we_done is set
+    file_operations.flush_history()
     we_done = True
-    utils.kill_processes()
-    file_operations.lock_run_report(pdf_mode=True)
+    utils.finalize_in_background()
     exit(0)
 
 
@@ -170,6 +274,9 @@ def expanded_view(root):
     """
     Reveal additional buttons in the main window. To allow manual operations.
 
+    The actions run in the background, see run_task. Below the buttons, a status line
+    shows the state of the tasks.
+
     Args:
         root (tk.Tk): The root window of the Tkinter application.
     """
@@ -194,26 +301,56 @@ def expanded_view(root):
         )
         messagebox.showinfo("Variables", formatted_dirs_log)
 
+    def task_button(name, text, function, group=None):
+        # The action runs in the background, its button is disabled meanwhile
+        button = tk.Button(
+            button_frame,
+            text=text,
+            command=session_tape.action(
+                name, lambda: run_task(name, text, function, group=group)
+            ),
+        )
+        task_buttons[name] = (button, group or name)
+        return button
+
     # Create a frame to hold the checklist and buttons
     button_frame = tk.Frame(root)
     button_frame.pack(padx=20, pady=20)
-    email_button = tk.Button(button_frame, text="Send Email", command=on_send_email)
-    simulation_button = tk.Button(
-        button_frame, text="Simulate secret", command=utils.simulate_secret
+    email_button = task_button(
+        "send_email", "Send Email", on_send_email, group=FINAL_FOLDER_TASKS
     )
-    trans_button = tk.Button(
-        button_frame, text="Run secret", command=on_run_secret
+    simulation_button = task_button(
+        "simulate_secret",
+        "Simulate secret",
+        utils.simulate_secret,
+        group=FINAL_FOLDER_TASKS,
     )
-    tar_button = tk.Button(
-        button_frame, text="Force tar file operation", command=utils.tar_file
+    trans_button = task_button("run_secret", "Run secret", on_run_secret)
+    tar_button = task_button(
+        "tar", "Force tar file operation", utils.tar_file, group=FINAL_FOLDER_TASKS
     )
-    generate_folder_button = tk.Button(
-        button_frame,
-        text="Generate final folder",
-        command=utils.generate_final_mask_folder,
+    delta_tar_button = task_button(
+        "delta_tar",
+        "Delta tar (changed files)",
+        lambda: utils.tar_file(delta=True),
+        group=FINAL_FOLDER_TASKS,
+    )
+    source_tar_button = task_button(
+        "source_tar",
+        "Final folder + tar in one pass",
+        lambda: utils.tar_file(from_source=True, materialize=True),
+        group=FINAL_FOLDER_TASKS,
+    )
+    generate_folder_button = task_button(
+        "generate_final_folder",
+        "Generate final folder",
+        utils.generate_final_mask_folder,
+        group=FINAL_FOLDER_TASKS,
     )
     print_vars_button = tk.Button(
-        button_frame, text="Print folder structure", command=on_print_vars
+        button_frame,
+        text="Print folder structure",
+        command=session_tape.action("print_folder_structure", on_print_vars),
     )
     email_button.grid(row=buttons_row, column=0, padx=10, pady=10)
     simulation_button.grid(row=buttons_row, column=1, padx=10, pady=10)
@@ -221,14 +358,27 @@ def expanded_view(root):
     tar_button.grid(row=buttons_row + 1, column=1, padx=10, pady=10)
     generate_folder_button.grid(row=buttons_row + 1, column=0, padx=10, pady=10)
     print_vars_button.grid(row=buttons_row + 1, column=2, padx=10, pady=10)
-    root.geometry("580x480")
+    delta_tar_button.grid(row=buttons_row + 2, column=1, padx=10, pady=10)
+    source_tar_button.grid(row=buttons_row + 2, column=0, padx=10, pady=10)
+    global task_status
+    task_status = tk.StringVar(root)
+    tk.Label(root, textvariable=task_status, justify="left").pack(padx=20, pady=5)
+    # Tasks started before the view was shown, e.g. by gather_intel
+    for task in tasks.active():
+        show_task_status(task)
+    root.geometry("580x600")
 
 
 def show_config_popup(root):
     def on_confirm():
         # Update the configuration with the values from the input fields
-        for key, entry in entries.items():
-            config_parser.full_configuration[key] = entry.get()
+        try:
+            config_parser.override(
+                {key: entry.get() for key, entry in entries.items()}
+            )
+        except ValueError as e:
+            messagebox.showerror("Invalid configuration", str(e))
+            return
         config_window.destroy()
 
     config_window = tk.Toplevel(root)
@@ -1,3 +1,5 @@
+import hashlib
+import io
 import os
 import pwd
 import shutil
@@ -6,18 +8,26 @@ import sys
 import tarfile
 import tempfile
 import time
-from _tkinter import TclError
-
-import psutil
+import traceback
 
 from enum import Enum
-from tkinter import messagebox
 
 import file_operations
 import config_parser
 import argument_parser
+import flight_recorder
+import lazy_import
+import shared_modules  # Puts log_core on the import path
+import log_core
+import presenter_client
+import report_finalizer
+import session_tape
+import spans
 import user_interface
 
+messagebox = lazy_import.module("tkinter.messagebox")
+tkinter = lazy_import.module("tkinter")
+
 global secret_process
 
 # List to keep track of editor processes
@@ -68,42 +78,20 @@ def printer(message, log_type=None):
     printer, custom_tab, Type
 
     Args:
-        message (str): The message to print.
+        message (str or tuple): The message, or a format string and its arguments.
         log_type (Type, optional): The type of log message (INFO, WARNING, or None). Defaults to PRINTER.
 
+    Errors also write the recent messages of the flight recorder into the run report.
+
     Returns:
         None
     """
-    arguments = argument_parser.get()
-
     # Determine the print tag based on the log type
-    if log_type == Type.INFO:
-        print_tag = "INFO"
-    elif log_type == Type.WARNING:
-        print_tag = "WARNING"
-    elif log_type == Type.ERROR:
-        print_tag = "ERROR"
-    elif log_type == Type.QUESTION:
-        print_tag = "QUESTION"
-    else:
-        print_tag = "PRINTER"
-    # Get the terminal width
-    terminal_width = shutil.get_terminal_size().columns
-
-    # Calculate the padding needed to align the end tag
-    padding_length = (
-        terminal_width - len(print_tag) * 2 - len(message) - len(custom_tab()) * 2
-    )
-    padding = " " * max(padding_length, 0)
-
-    # Format the message
-    formatted_message = (
-        f"{print_tag}{custom_tab()}{message}{padding}{custom_tab()}{print_tag}"
-    )
-    if arguments.silent:
-        return
-    else:
-        print(formatted_message)
+    print_tag = log_type.name if isinstance(log_type, Type) else "PRINTER"
+    flight_recorder.record(print_tag, message)
+    log_core.emit(log_core.PRINT, print_tag, message, fit=False)
+    if log_type is Type.ERROR:
+        file_operations.dump_flight_recorder(reason=log_core.render(message))
 
 
 def format_line(text, fill_symbol=None, edge_symbol=None):
@@ -208,36 +196,16 @@ def verbose(message):
     verbose or debug mode is active. It also writes the message to the history log.
 
     Args:
-        message (str): The verbose message to print.
+        message (str or tuple): The verbose message, or a format string and its arguments.
 
     Returns:
         None
     """
-    arguments = argument_parser.get()
-    if arguments.silent:
+    flight_recorder.record("VERBOSE", message)
+    if log_core.is_silent():
         return
-    if arguments.verbose or arguments.debug:
-        # Custom verbose tag
-        verbose_tag = "VERBOSE"
-
-        # Get the terminal width
-        terminal_width = shutil.get_terminal_size().columns
-
-        # Calculate the padding needed to align the end tag
-        padding_length = (
-            terminal_width - len(verbose_tag) * 2 - len(message) - len(custom_tab()) * 2
-        )
-        padding = " " * max(padding_length, 0)
-
-        # Format the message
-        formatted_message = (
-            f"{verbose_tag}{custom_tab()}{message}{padding}{custom_tab()}{verbose_tag}"
-        )
-        if len(formatted_message) > terminal_width:
-            print(f"{verbose_tag}{custom_tab()}{message}")
-        else:
-            print(formatted_message)
-
+    message = log_core.render(message)
+    log_core.emit(log_core.VERBOSE, "VERBOSE", message)
     file_operations.write_history(message)
 
 
@@ -247,39 +215,21 @@ def debug(message, log=None):
 
     This function formats and prints a debug message with a custom tag if debug mode is active.
     It also writes the message to the history log if a log argument is provided.
+    Messages that are neither printed nor logged are only kept in the flight recorder,
+    without being formatted.
 
     Args:
-        message (str): The debug message to print.
+        message (str or tuple): The debug message, or a format string and its arguments.
         log (log, optional): An optional log to write the message to.
 
     Returns:
         None
     """
-    arguments = argument_parser.get()
-    if arguments.silent:
+    flight_recorder.record("DEBUG", message)
+    if not (log or log_core.is_enabled(log_core.DEBUG)) or log_core.is_silent():
         return
-    if arguments.debug:
-        # Custom verbose tag
-        debug_tag = "DEBUG"
-
-        # Get the terminal width
-        terminal_width = shutil.get_terminal_size().columns
-
-        # Calculate the padding needed to align the end tag
-        padding_length = (
-            terminal_width - len(debug_tag) * 2 - len(message) - len(custom_tab()) * 2
-        )
-        padding = " " * max(padding_length, 0)
-
-        # Format the message
-        formatted_message = (
-            f"{debug_tag}{custom_tab()}{message}{padding}{custom_tab()}{debug_tag}"
-        )
-        if len(formatted_message) > terminal_width:
-            print(f"{debug_tag}{custom_tab()}{message}")
-        else:
-            print(formatted_message)
-
+    message = log_core.render(message)
+    log_core.emit(log_core.DEBUG, "DEBUG", message)
     if log:
         file_operations.write_history(message)
 
@@ -298,14 +248,23 @@ def open_for_preview(file_to_open, screen_position="left"):
     Returns:
         None
     """
-    editor = config_parser.get("editor_of_choice")
+    editor = config_parser.config().editor_of_choice
+    if session_tape.replaying():
+        debug(message=f"Not opening {file_to_open} in a replayed session.")
+        return
     debug(message=f"Opening {file_to_open} using {editor}")
     if editor == "built_in":
+        try:
+            # Shown by the preview server, which the first preview starts
+            presenter_client.open_file(file_to_open, screen_position)
+            return
+        except (OSError, ValueError) as e:
+            debug(message=f"Preview server unavailable, starting a presenter: {e}")
         lr_app_path = os.path.dirname(os.path.abspath(sys.argv[0]))
         file_presenter = os.path.join(lr_app_path, "file_presenter.py")
         try:
             process = subprocess.Popen([file_presenter, file_to_open, screen_position])
-        except TclError as e:
+        except tkinter.TclError as e:
             debug(
                 message=f"File Presenter shut down unexpectedly. Error: {e}", log=True
             )
@@ -332,8 +291,20 @@ def kill_processes():
         OSError: If no process with the name of the configured editor is found.
         Exception: For any other errors that occur while attempting to kill the processes.
     """
+    if session_tape.replaying():
+        # No editors were opened, the editors of the user must stay open
+        file_operations.cleanup_swp_files()
+        return
     try:
-        editor = config_parser.get("editor_of_choice")
+        editor = config_parser.config().editor_of_choice
+        if editor == "built_in" and not presenter_client.close_all():
+            debug(message="Failed to close the previews of the preview server.")
+        if editor == "built_in" and not editor_processes:
+            # All previews were shown by the preview server
+            file_operations.cleanup_swp_files()
+            return
+        import psutil
+
         for process in psutil.process_iter():
             if process.name() == editor or process.pid in editor_processes:
                 debug(message=f"Killing process {str(process)}")
@@ -350,6 +321,96 @@ def kill_processes():
         )
 
 
+def finalize_in_background():
+    """
+    Hand the closing of editors and the run report conversion to a detached worker.
+
+    See report_finalizer. If the worker cannot be started, the cleanup is done here.
+
+    Returns:
+        None
+    """
+    report_file = getattr(file_operations, "run_report_file", None)
+    if not report_file:
+        kill_processes()
+        return
+    if session_tape.replaying():
+        # The snapshot holding the report is removed at exit, a worker would find nothing
+        kill_processes()
+        file_operations.lock_run_report(pdf_mode=False)
+        return
+    editor = config_parser.config().editor_of_choice
+    if editor == "built_in":
+        # The server outlives the session, only its windows are hidden
+        presenter_client.close_all()
+    try:
+        report_finalizer.spawn(
+            report_file,
+            editor=None if editor == "built_in" else editor,
+            pids=editor_processes,
+            swp_dir=getattr(file_operations, "final_mask_dir", None),
+        )
+    except OSError as e:
+        debug(message=f"Failed to start the report finaliser: {e}")
+        kill_processes()
+        file_operations.lock_run_report(pdf_mode=True)
+
+
+def install_error_hooks(root):
+    """
+    Write the flight recorder and the traceback into the run report on unhandled exceptions.
+
+    Covers exceptions leaving the application and exceptions raised in Tkinter callbacks,
+    which Tkinter only prints. The default handlers still run afterwards.
+
+    Args:
+        root (tk.Tk): The root window of the Tkinter application.
+
+    Returns:
+        None
+    """
+    previous_excepthook = sys.excepthook
+    previous_callback_handler = root.report_callback_exception
+
+    def dump(exc_type, exc_value, exc_traceback):
+        try:
+            file_operations.dump_flight_recorder(
+                reason=f"{exc_type.__name__}: {exc_value}",
+                details=traceback.format_exception(exc_type, exc_value, exc_traceback),
+            )
+        except Exception:
+            # The original exception matters more than the report
+            pass
+
+    def excepthook(exc_type, exc_value, exc_traceback):
+        dump(exc_type, exc_value, exc_traceback)
+        previous_excepthook(exc_type, exc_value, exc_traceback)
+
+    def report_callback_exception(exc_type, exc_value, exc_traceback):
+        dump(exc_type, exc_value, exc_traceback)
+        previous_callback_handler(exc_type, exc_value, exc_traceback)
+
+    sys.excepthook = excepthook
+    root.report_callback_exception = report_callback_exception
+
+
+def print_span_summary():
+    """
+    Print the time spent in each phase of the run as a table.
+
+    The table is printed in verbose mode and written into the run report.
+
+    Returns:
+        None
+    """
+    lines = spans.format_summary()
+    if not lines:
+        return
+    verbose(message="Time spent per phase:")
+    for line in lines:
+        verbose(message=line)
+
+
 def get_full_name():
     """
     Retrieve the full name of the current user.
@@ -418,7 +479,7 @@ def last_resort():
 
     # Run the daps_po2pdf in the final_mask_folder
     debug(message="Running daps_po2pdf in" + str(final_mask_folder), log=True)
-    subprocess.run(["daps_po2pdf", po_files[0]], cwd=final_mask_folder)
+    run_po2pdf(po_files[0], final_mask_folder)
     debug(message="daps_po2pdf command executed", log=True)
 
     # Find the .pdf file in the final_mask_folder
@@ -455,6 +516,82 @@ def last_resort():
     debug(message="Simulation function completed")
 
 
+def _replay_po2pdf(result):
+    # Recreate the files daps_po2pdf created, with their recorded sizes
+    for path, size in result["created"]:
+        with open(path, "wb") as file:
+            file.truncate(size)
+
+
+@session_tape.recorded("daps_po2pdf", key_argument="po_file", replay=_replay_po2pdf)
+def run_po2pdf(po_file, folder):
+    """
+    Run daps_po2pdf on a .po file.
+
+    Args:
+        po_file (str): The name of the .po file.
+        folder (str): The folder containing the .po file, where the .pdf is created.
+
+    Returns:
+        dict: The return code and the created files as [path, size] pairs.
+    """
+    before = set(os.listdir(folder))
+    with spans.Span("daps_po2pdf"):
+        completed = subprocess.run(["daps_po2pdf", po_file], cwd=folder)
+    created = [
+        [os.path.join(folder, name), os.path.getsize(os.path.join(folder, name))]
+        for name in sorted(set(os.listdir(folder)) - before)
+    ]
+    return {"returncode": completed.returncode, "created": created}
+
+
+@session_tape.recorded("email_script")
+def run_email_script(email_command, cwd, output_file, user_input_expedite):
+    """
+    Run the email script and return its output.
+
+    Args:
+        email_command (str): The shell command running the script, redirecting its
+            output into the output file.
+        cwd (str): The directory to run the script in.
+        output_file (str): The file the output is redirected to.
+        user_input_expedite (str): The answer to the expedite question of the script.
+
+    Returns:
+        str: The output of the script.
+
+    Raises:
+        OSError: If the output file cannot be read.
+    """
+    # Run the command and simulate user input
+    email_process = subprocess.Popen(
+        args=email_command,
+        cwd=cwd,
+        shell=True,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+    # Send the input to the email script
+    stdout, stderr = email_process.communicate(input=user_input_expedite)
+
+    # Wait for 5 seconds to ensure the email script has time to complete
+    printer(
+        message="Waiting for 3 seconds to let the email run.", log_type=Type.WARNING
+    )
+    time.sleep(3)
+
+    # Ensure the file is created before reading
+    if not os.path.exists(output_file):
+        debug(message=f"Temporary output file {output_file} does not exist.")
+
+    with open(output_file, "r") as file:
+        return file.read()
+
+
+@spans.timed()
 def send_email(root, user_input_expedite=None):
     """
     Initiate the email sending process using a specified script.
@@ -493,37 +630,18 @@ def send_email(root, user_input_expedite=None):
         )
         user_input_expedite = "y\n" if expedite_mode else "n\n"
 
-    # Run the command and simulate user input
-    email_process = subprocess.Popen(
-        args=email_command,
-        cwd=file_operations.final_mask_dir,
-        shell=True,
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        universal_newlines=True,
-    )
-
-    # Send the input to the email script
-    stdout, stderr = email_process.communicate(input=user_input_expedite)
-
-    # Wait for 5 seconds to ensure the email script has time to complete
-    printer(
-        message="Waiting for 3 seconds to let the email run.", log_type=Type.WARNING
-    )
-    time.sleep(3)
-
-    # Ensure the file is created before reading
-    if not os.path.exists(tmp_output_file):
-        debug(message=f"Temporary output file {tmp_output_file} does not exist.")
-
-    # Read the output file
+    # Run the script and read its output
     try:
-        with open(tmp_output_file, "r") as file:
-            output = file.read()
-            debug(message="The email script output: " + str(output), log=True)
+        output = run_email_script(
+            email_command,
+            file_operations.final_mask_dir,
+            tmp_output_file,
+            user_input_expedite,
+        )
+        debug(message="The email script output: " + str(output), log=True)
         # Check for the specific error message in the output
         if "*.tar.gz file does not exist" in output:
+            record_email_failure("no_archive")
             # Add debug message before showing the prompt
             debug(message="Prompting user to create tar file.")
             if messagebox.askyesno(
@@ -539,6 +657,7 @@ def send_email(root, user_input_expedite=None):
             'selection = int(input("Select which file to use (enter the number): ")) - 1'
             in output
         ):
+            record_email_failure("multiple_archives")
             printer(
                 message="There is more than one archive in the target directory,"
                 " make sure there is only one archive and try again.",
@@ -554,15 +673,25 @@ def send_email(root, user_input_expedite=None):
                 send_email(root=root, user_input_expedite=user_input_expedite)
 
         elif "Email send successfully to" in output:
+            file_operations.record_event(
+                "email_sent",
+                phase="email",
+                paths=[file_operations.final_mask_dir],
+                expedite=user_input_expedite == "y\n",
+            )
+            # The next delta archive is computed against what the vendor received
+            file_operations.promote_pending_manifests(file_operations.final_mask_dir)
             messagebox.showinfo("Success", "Email sent successfully!")
             printer(message="Email sent successfully!", log_type=Type.INFO)
         else:
+            record_email_failure("unexpected_output")
             printer(message="Something unexpected happened.", log_type=Type.INFO)
             if messagebox.askyesno(
                 "Email script failed!", "Would you like to try to send the email again?"
             ):
                 send_email(root=root, user_input_expedite=user_input_expedite)
     except ValueError:
+        record_email_failure("no_archive")
         printer(
             message="Email script failed to find target archive.", log_type=Type.ERROR
         )
@@ -577,6 +706,22 @@ def send_email(root, user_input_expedite=None):
         debug(message=f"Error deleting output file: {e}")
 
 
+def record_email_failure(reason):
+    """
+    Record a failed attempt to send the email in the event stream and the metrics.
+
+    Args:
+        reason (str): Why the email was not sent, e.g. 'no_archive'.
+    """
+    file_operations.record_event(
+        "email_failed",
+        phase="email",
+        paths=[file_operations.final_mask_dir],
+        reason=reason,
+    )
+
+
+@spans.timed()
 def run_secret():
     """
     Execute the secret command and manage its output.
@@ -593,14 +738,21 @@ def run_secret():
         verbose(message="Final mask directory is /secret")
         final_folder = os.path.join(file_operations.dataprep_dir + "/secret")
 
-    secret_process = subprocess.Popen(
-        ["secret"],
-        cwd=final_folder,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
+    if session_tape.replaying():
+        # The tool is not run again, the session continues as if it was started
+        secret_process = session_tape.ReplayedProcess(["secret"])
+    else:
+        secret_process = subprocess.Popen(
+            ["secret"],
+            cwd=final_folder,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
 
     debug(message="Running secret in " + str(final_folder), log=True)
+    file_operations.record_event(
+        "secret_started", phase="secret", paths=[final_folder], pid=secret_process.pid
+    )
     printer(message="Please copy this path to the FTP Directory:", log_type=Type.INFO)
 
     print(f"\n--> {custom_tab(1.5)} {final_folder} {custom_tab(1.5)} <--\n")
@@ -655,11 +807,13 @@ def simulate_secret():
                 "Final mask folder missing",
                 "Would you like to create final mask folder?",
             ):
-                file_operations.final_mask_dir = generate_final_mask_folder()
+                # Archive straight from the source and create the final folder in the same pass
+                tar_file(from_source=True, materialize=True)
                 debug(
                     f"New final mask directory set to {file_operations.final_mask_dir}"
                 )
-            tar_file()
+            else:
+                tar_file()
             last_resort()
         messagebox.showinfo("Done.", "Simulation completed.")
         printer(message="secret simulation completed.", log_type=Type.INFO)
@@ -701,14 +855,172 @@ def generate_final_mask_folder():
         debug(f"An unexpected error occurred: {e}")
 
 
-def tar_file():
+class HashingReader:
+    """
+    File wrapper computing the SHA-256 checksum of everything read through it.
+
+    Used to checksum files while they are being written into an archive, so the
+    manifest does not need a second pass over the data. If a mirror file is given,
+    every chunk read is also written into it, which copies the file in the same pass.
+    """
+
+    def __init__(self, file, mirror=None):
+        self.file = file
+        self.mirror = mirror
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.sha256.update(data)
+        if self.mirror is not None:
+            self.mirror.write(data)
+        return data
+
+
+# Suffix of an archive while it is written, see write_archive
+PART_SUFFIX = ".part"
+
+
+class HashingWriter:
+    """
+    File wrapper computing the SHA-256 checksum of everything written through it.
+
+    Used to checksum an archive while it is being written, so it is not read back from
+    the file server afterwards.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.name = file.name
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+
+def write_archive(
+    tar_path,
+    source_dir,
+    excluded_suffix,
+    selected=None,
+    extra_members=None,
+    copy_to=None,
+):
+    """
+    Write a tar.gz archive of a directory, return the manifest and the archive checksum.
+
+    The member names are relative to the source directory, so archiving the 'secret'
+    source folder produces the same archive as archiving a copy of it. When copy_to is
+    given, the source tree is materialised there in the same read pass, including the
+    files left out of the archive.
+
+    The archive is written to <tar_path>.part and renamed when complete, so an archive
+    interrupted e.g. by closing the application never appears under its name, where the
+    email script would pick it up. Files ending with .part are never archived.
+
+    Args:
+        tar_path (str): The path of the archive to create.
+        source_dir (str): The directory to archive. Member names are relative to it.
+        excluded_suffix (str): Files ending with this suffix are not archived.
+        selected (iterable, optional): Member names to archive. Defaults to None (all files).
+        extra_members (dict, optional): Additional member names mapped to their content in bytes.
+        copy_to (str, optional): Directory to copy the source tree into while archiving. Defaults to None.
+
+    Returns:
+        tuple: The manifest of the archived files (see file_operations.build_manifest)
+            and the SHA-256 checksum of the archive.
+    """
+    manifest = {}
+    selected = set(selected) if selected is not None else None
+    part_path = tar_path + PART_SUFFIX
+    try:
+        with open(part_path, "wb") as output:
+            # The checksum of the archive is computed as it is written
+            archive = HashingWriter(output)
+            with tarfile.open(tar_path, "w:gz", fileobj=archive) as tar:
+                for root, dirs, files in os.walk(source_dir):
+                    copy_root = None
+                    if copy_to:
+                        relative_root = os.path.relpath(root, source_dir)
+                        copy_root = os.path.join(copy_to, relative_root)
+                        os.makedirs(copy_root, exist_ok=True)
+                    for file in files:
+                        file_path = os.path.join(root, file)
+                        copy_path = os.path.join(copy_root, file) if copy_root else None
+                        arcname = os.path.relpath(file_path, source_dir)
+                        if file_path.endswith(PART_SUFFIX):
+                            # An archive being written, maybe this one
+                            continue
+                        archived = not file_path.endswith(excluded_suffix) and (
+                            selected is None or arcname in selected
+                        )
+                        if not archived:
+                            if copy_path:
+                                shutil.copy2(
+                                    file_path, copy_path, follow_symlinks=False
+                                )
+                            continue
+                        tarinfo = tar.gettarinfo(file_path, arcname=arcname)
+                        if not tarinfo.isreg():
+                            tar.addfile(tarinfo)
+                            if copy_path:
+                                shutil.copy2(
+                                    file_path, copy_path, follow_symlinks=False
+                                )
+                            continue
+                        with open(file_path, "rb") as file_object:
+                            if copy_path:
+                                with open(copy_path, "wb") as mirror:
+                                    reader = HashingReader(file_object, mirror)
+                                    tar.addfile(tarinfo, reader)
+                                shutil.copystat(file_path, copy_path)
+                            else:
+                                reader = HashingReader(file_object)
+                                tar.addfile(tarinfo, reader)
+                        manifest[arcname] = {
+                            "size": tarinfo.size,
+                            "sha256": reader.sha256.hexdigest(),
+                        }
+                for arcname, content in (extra_members or {}).items():
+                    tarinfo = tarfile.TarInfo(arcname)
+                    tarinfo.size = len(content)
+                    tarinfo.mtime = int(time.time())
+                    tar.addfile(tarinfo, io.BytesIO(content))
+        os.replace(part_path, tar_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+    return manifest, archive.sha256.hexdigest()
+
+
+@spans.timed()
+def tar_file(delta=False, from_source=False, materialize=False):
     """
     Create a tar archive of the final mask directory.
 
     This function constructs the path for the tar archive and creates a tar.gz file
     containing all files in the final mask directory, excluding any existing tar.gz files.
+    The manifest of the vendor archive is stored in the run archive, it counts as shipped
+    once send_email sent the archive. In delta mode the vendor archive only holds the files
+    added or changed since the previous shipment of the same archive, plus a
+    DELETED_FILES.txt list of the removed ones.
+    With from_source the archives are written straight from the 'secret' folder in dataprep,
+    without copying it into a final folder first. The vendor archive is placed in the final
+    folder, never in the source folder. If materialize is set as well, the final folder is
+    created from the data read for the review archive, saving a full copy pass.
+    If the review archive fails, no vendor archive is created.
     It displays a success message upon completion or an error message if the process fails.
 
+    Args:
+        delta (bool, optional): Ship only the difference to the previous shipment. Defaults to False.
+        from_source (bool, optional): Archive the 'secret' source folder directly. Defaults to False.
+        materialize (bool, optional): Create the final folder while archiving from source. Defaults to False.
+
     Raises:
         Exception: If there is an error creating the tar file or running the tar command.
     """
@@ -719,6 +1031,28 @@ def tar_file():
         dataprep_dir = file_operations.dataprep_dir
         if str(final_mask_dir).endswith("/secret"):
             final_mask_dir = os.path.join(file_operations.dataprep_dir + "/secret")
+        source_dir = final_mask_dir
+        materialize_dir = None
+        if from_source:
+            source_dir = os.path.join(dataprep_dir, "secret")
+            if materialize:
+                materialize_dir = os.path.join(
+                    dataprep_dir, file_operations.generate_final_folder_name()
+                )
+                final_mask_dir = materialize_dir
+            elif os.path.abspath(final_mask_dir) == os.path.abspath(source_dir):
+                # The vendor archive would be written into the tree it archives
+                messagebox.showerror(
+                    "Error",
+                    "There is no final folder to place the vendor archive in.",
+                )
+                printer(
+                    message="ERROR: Archiving from source needs a final folder "
+                    "distinct from the source folder.",
+                    log_type=Type.ERROR,
+                )
+                return
+            debug(message=f"Archiving straight from source {source_dir}", log=True)
         # RENAME TO 0maskname_pattern_revision.tar.gz
         text_maskname = os.path.basename(file_operations.mask_name_dir)
         text_pattern = os.path.basename(file_operations.revision_dir)[:3]
@@ -730,17 +1064,39 @@ def tar_file():
         tar_path_vendor = os.path.join(final_mask_dir, proper_tar_name)
         debug(message="Review tar path constructed: " + tar_path_review, log=True)
         debug(message="Vendor tar path constructed: " + tar_path_vendor, log=True)
+
+        previous_manifest = None
+        if delta:
+            previous_manifest = file_operations.load_previous_manifest(proper_tar_name)
+            if previous_manifest is None:
+                messagebox.showinfo(
+                    "No previous shipment",
+                    "No manifest of a previous shipment was found, creating full archives.",
+                )
+                printer(
+                    message="No previous shipment manifest, falling back to full archive.",
+                    log_type=Type.WARNING,
+                )
+
         try:
-            with tarfile.open(tar_path_review, "w:gz") as tar:
-                for root, dirs, files in os.walk(final_mask_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        if not file_path.endswith(".tgz"):
-                            tar.add(
-                                file_path,
-                                arcname=os.path.relpath(file_path, final_mask_dir),
-                            )
+            start = time.monotonic()
+            review_manifest, review_sha256 = write_archive(
+                tar_path_review,
+                source_dir,
+                excluded_suffix=".tgz",
+                copy_to=materialize_dir,
+            )
+            record_archive_event(
+                tar_path_review,
+                review_manifest,
+                review_sha256,
+                time.monotonic() - start,
+                source_dir,
+            )
             verbose(message=f"Created tar archive: {tar_path_review}")
+            if materialize_dir:
+                file_operations.final_mask_dir = materialize_dir
+                verbose(message=f"Materialised final folder: {materialize_dir}")
             messagebox.showinfo(
                 "Compression successful",
                 f"Tar file created successfully at {os.path.abspath(tar_path_review)}",
@@ -751,16 +1107,62 @@ def tar_file():
                 message="ERROR: Failed to create tar file: " + str(e),
                 log_type=Type.ERROR,
             )
+            # No vendor archive without the review archive it is checked against
+            return
         try:
-            with tarfile.open(tar_path_vendor, "w:gz") as tar:
-                for root, dirs, files in os.walk(final_mask_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        if not file_path.endswith(".tar.gz"):
-                            tar.add(
-                                file_path,
-                                arcname=os.path.relpath(file_path, final_mask_dir),
-                            )
+            start = time.monotonic()
+            if previous_manifest is not None:
+                # The review archive just hashed the same tree, only with another exclusion
+                manifest = {
+                    name: entry
+                    for name, entry in review_manifest.items()
+                    if not name.endswith(".tar.gz")
+                }
+                changed, deleted = file_operations.diff_manifests(
+                    previous_manifest, manifest
+                )
+                verbose(
+                    message=f"Delta against previous shipment: "
+                    f"{len(changed)} added or changed, {len(deleted)} deleted"
+                )
+                # Only one archive may be present for the email script, drop the stale full one
+                if os.path.exists(tar_path_vendor):
+                    os.remove(tar_path_vendor)
+                    debug(message=f"Removed full vendor archive {tar_path_vendor}", log=True)
+                tar_path_vendor = tar_path_vendor.replace(".tar.gz", "_DELTA.tar.gz")
+                deletion_list = "".join(f"{name}\n" for name in deleted)
+                shipped, vendor_sha256 = write_archive(
+                    tar_path_vendor,
+                    source_dir,
+                    excluded_suffix=".tar.gz",
+                    selected=changed,
+                    extra_members={"DELETED_FILES.txt": deletion_list.encode("utf-8")},
+                )
+            else:
+                stale_delta = tar_path_vendor.replace(".tar.gz", "_DELTA.tar.gz")
+                if os.path.exists(stale_delta):
+                    os.remove(stale_delta)
+                    debug(message=f"Removed delta vendor archive {stale_delta}", log=True)
+                manifest, vendor_sha256 = write_archive(
+                    tar_path_vendor, source_dir, excluded_suffix=".tar.gz"
+                )
+                shipped = manifest
+            record_archive_event(
+                tar_path_vendor,
+                shipped,
+                vendor_sha256,
+                time.monotonic() - start,
+                source_dir,
+                delta=previous_manifest is not None,
+            )
+            # Recorded as shipped once the email script sent the archive
+            file_operations.save_pending_manifest(
+                proper_tar_name,
+                manifest,
+                tar_path_vendor,
+                vendor_sha256,
+                delta=previous_manifest is not None,
+            )
             verbose(message=f"Created tar archive: {tar_path_vendor}")
             messagebox.showinfo(
                 "Compression successful",
@@ -780,6 +1182,31 @@ def tar_file():
         )
 
 
+def record_archive_event(tar_path, manifest, sha256, duration, source_dir, delta=False):
+    """
+    Record the creation of an archive in the event stream of the run.
+
+    Args:
+        tar_path (str): The path of the created archive.
+        manifest (dict): The manifest of the archived files.
+        sha256 (str): The SHA-256 checksum of the archive, see write_archive.
+        duration (float): The time it took to write the archive, in seconds.
+        source_dir (str): The archived directory.
+        delta (bool, optional): Whether the archive is a delta archive. Defaults to False.
+    """
+    file_operations.record_event(
+        "archive_created",
+        phase="archive",
+        paths=[tar_path, source_dir],
+        duration=duration,
+        files=len(manifest),
+        bytes=sum(entry["size"] for entry in manifest.values()),
+        archive_bytes=os.path.getsize(tar_path),
+        sha256=sha256,
+        delta=delta,
+    )
+
+
 def gather_intel(root):
     """
     Collect information and prompt the user for necessary actions.
@@ -801,7 +1228,7 @@ def gather_intel(root):
     if not secret_ran:
         if messagebox.askyesno("secret", "Would you like to run secret now?"):
             debug(message="secret launch requested by the user.", log=True)
-            run_secret()
+            user_interface.run_task("run_secret", "Run secret", run_secret)
         else:
             debug(message="secret initial run declined by the user", log=True)
 
@@ -809,7 +1236,13 @@ def gather_intel(root):
         # ask to send email
         if messagebox.askyesno("Email?", "Would you like to send the email?"):
             debug(message="Email requested by the user.", log=True)
-            send_email(root)
+            user_interface.run_task(
+                "send_email",
+                "Send Email",
+                send_email,
+                root,
+                group=user_interface.FINAL_FOLDER_TASKS,
+            )
         else:
             debug(message="Email declined by the user.", log=True)
 
@@ -903,6 +1336,9 @@ def print_help():
         -i, --info             Show this help message and exit.
         -c, --config [PATH]    Path to provide a custom configuration file.
         -dc, --define_config   Open a window to define a new temporary configuration for this session.
+        -p, --profile          Profile the run, the results are saved into the run archive.
+        -rec, --record         Record the session into a tape in the run archive.
+        -rep, --replay [TAPE]  Replay a recorded session in a snapshot of its folder tree.
 
 
     Description:
@@ -946,6 +1382,15 @@ def print_help():
         Open a window to define a new temporary configuration for this session:
             $ python last_resort.py --define_config
 
+        Profile the run with cProfile and tracemalloc:
+            $ python last_resort.py --profile
+
+        Record the session into a tape:
+            $ python last_resort.py --record
+
+        Replay a recorded session without user interaction:
+            $ python last_resort.py --replay /path/to/session.tape.jsonl
+
 
     For more information or if you encounter any issues, please contact Zdenek Lach.
     """
@@ -960,6 +1405,9 @@ def print_help():
         -i, --info             Show this help message and exit.
         -c, --config [PATH]    Path to provide a custom configuration file.
         -dc, --define_config   Open a window to define a new temporary configuration for this session.
+        -p, --profile          Profile the run, the results are saved into the run archive.
+        -rec, --record         Record the session into a tape in the run archive.
+        -rep, --replay [TAPE]  Replay a recorded session in a snapshot of its folder tree.
 
     Description:
         The Last Resort application allows RDP engineers to perform a final check before sending data to the vendor,
@@ -999,6 +1447,15 @@ def print_help():
         Open a window to define a new temporary configuration for this session:
             $ python last_resort.py --define_config
 
+        Profile the run with cProfile and tracemalloc:
+            $ python last_resort.py --profile
+
+        Record the session into a tape:
+            $ python last_resort.py --record
+
+        Replay a recorded session without user interaction:
+            $ python last_resort.py --replay /path/to/session.tape.jsonl
+
     For more information or if you encounter any issues, please contact Zdenek Lach.
     """
     print(help_message)
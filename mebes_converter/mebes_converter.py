@@ -4,6 +4,29 @@ import os
 import sys
 import subprocess
 import shutil
+import time
+
+# metrics is shared with the other tools, it is kept in zee_utils
+ZEE_UTILS_DIR = os.environ.get("ZEE_UTILS_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "zee_utils"
+)
+sys.path.append(ZEE_UTILS_DIR)
+import metrics
+
+# Used for the metrics textfile if METRICS_TEXTFILE_DIR is not set
+METRICS_DIR = os.path.join(os.path.expanduser("~"), ".zee_metrics")
+
+
+def count_conversion(outcome):
+    """
+    Count a conversion attempt in the metrics.
+
+    Args:
+        outcome (str): 'converted', or why the conversion did not happen.
+    """
+    metrics.counter(
+        "mebes_converter_conversions_total", "Conversion attempts by outcome."
+    ).inc(outcome=outcome)
 
 
 def set_default_envs():
@@ -120,9 +143,13 @@ def check_files():
 
     if count == 0:
         print("\nError: No mebes files to convert.")
+        count_conversion("no_files")
         sys.exit(1)
     else:
         print(f"\nFound {count} files for conversion.")
+        metrics.gauge(
+            "mebes_converter_files", "Number of files found by the last conversion."
+        ).set(count)
 
 
 # Function to run a command and handle the output
@@ -179,6 +206,7 @@ def conversion():
     then converts .cflt files to the new MEBES3 format. It also handles moving old
     mebes1 files to an original_files directory.
     """
+    start = time.perf_counter()
     try:
         # Convert all .?? files to .cflt
         print("Running readfile command...")
@@ -208,7 +236,12 @@ def conversion():
                 print(f"Moved {file} to /original_files")
     except Exception as e:
         print(f"An error occurred during conversion: {e}")
+        count_conversion("failed")
         sys.exit(1)
+    metrics.histogram(
+        "mebes_converter_duration_seconds", "Duration of the conversions."
+    ).observe(time.perf_counter() - start)
+    count_conversion("converted")
 
 
 def get_release_verison():
@@ -278,6 +311,9 @@ def main():
     This function checks the command-line arguments and either displays the help message,
     runs the conversion process, or shows the main menu.
     """
+    metrics.counter(
+        "mebes_converter_launches_total", "Launches of the converter by site and host."
+    ).inc(site=os.getenv("RDPSITE", "unknown"), host=os.uname().nodename)
     if len(sys.argv) == 1:
         interactive_menu()
     elif sys.argv[1] == "-help":
@@ -289,4 +325,5 @@ def main():
 
 
 if __name__ == "__main__":
+    metrics.write_at_exit(metrics.textfile_path("mebes_converter", METRICS_DIR))
     main()
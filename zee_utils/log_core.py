@@ -0,0 +1,177 @@
+"""
+Level-filtered console output shared by printer, verbose and debug.
+
+The output level is resolved once from the command-line arguments and every call checks
+it before doing any work, so discarded messages cost a single comparison. Messages may
+be given as a tuple of a str.format() string and its arguments, which is only formatted
+when the message is printed or written somewhere:
+
+    utils.debug(("Found file: {} with extension: {}", file, extension))
+
+The terminal width is read once and refreshed when the terminal is resized (SIGWINCH),
+instead of being queried for every message.
+
+This module is shared by zee_utils and Last Resort, which puts zee_utils on its import
+path (see last_resort/src/shared_modules.py), so both format their output the same way.
+"""
+import shutil
+import signal
+import threading
+
+DEBUG = 10
+VERBOSE = 20
+PRINT = 30
+SILENT = 100
+
+TAB = 8 * " "
+
+# Lowest level that is printed, resolved from the arguments on first use
+_threshold = None
+# Cached terminal width, refreshed on SIGWINCH
+_terminal_width = None
+
+
+def threshold():
+    """
+    Return the lowest level that is printed, reading the arguments on the first call.
+
+    Returns:
+        int: DEBUG, VERBOSE, PRINT or SILENT.
+    """
+    global _threshold
+    if _threshold is None:
+        import argument_parser
+
+        arguments = argument_parser.get()
+        if arguments.silent:
+            _threshold = SILENT
+        elif arguments.debug:
+            _threshold = DEBUG
+        elif arguments.verbose:
+            _threshold = VERBOSE
+        else:
+            _threshold = PRINT
+    return _threshold
+
+
+def set_threshold(level):
+    """
+    Override the level resolved from the arguments.
+
+    Args:
+        level (int): DEBUG, VERBOSE, PRINT or SILENT.
+    """
+    global _threshold
+    _threshold = level
+
+
+def is_enabled(level):
+    """
+    Check whether messages of a level are printed.
+
+    Args:
+        level (int): DEBUG, VERBOSE or PRINT.
+
+    Returns:
+        bool: True if the messages are printed.
+    """
+    return level >= (_threshold if _threshold is not None else threshold())
+
+
+def is_silent():
+    """
+    Check whether silent mode is enabled.
+
+    Returns:
+        bool: True in silent mode.
+    """
+    return threshold() == SILENT
+
+
+def render(message):
+    """
+    Turn a message into its text, formatting it if it is a tuple.
+
+    Args:
+        message (str or tuple): The message, or a format string and its arguments.
+
+    Returns:
+        str: The text of the message.
+    """
+    if isinstance(message, tuple):
+        return message[0].format(*message[1:])
+    return str(message)
+
+
+def _refresh_terminal_width(signal_number=None, frame=None):
+    global _terminal_width
+    _terminal_width = shutil.get_terminal_size().columns
+
+
+def terminal_width():
+    """
+    Return the cached width of the terminal in columns.
+
+    Returns:
+        int: The terminal width.
+    """
+    if _terminal_width is None:
+        _refresh_terminal_width()
+        _install_resize_handler()
+    return _terminal_width
+
+
+def _install_resize_handler():
+    if not hasattr(signal, "SIGWINCH"):
+        return
+    if threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGWINCH)
+
+    def handler(signal_number, frame):
+        _refresh_terminal_width()
+        if callable(previous):
+            previous(signal_number, frame)
+
+    signal.signal(signal.SIGWINCH, handler)
+
+
+def format_tagged(tag, text, fit=True):
+    """
+    Format a message between its tags, the end tag aligned to the terminal width.
+
+    Args:
+        tag (str): The tag, e.g. 'DEBUG'.
+        text (str): The text of the message.
+        fit (bool, optional): Drop the end tag if the line does not fit the terminal.
+            Defaults to True.
+
+    Returns:
+        str: The formatted line.
+    """
+    width = terminal_width()
+    padding = " " * max(width - len(tag) * 2 - len(text) - len(TAB) * 2, 0)
+    line = f"{tag}{TAB}{text}{padding}{TAB}{tag}"
+    if fit and len(line) > width:
+        return f"{tag}{TAB}{text}"
+    return line
+
+
+def emit(level, tag, message, fit=True):
+    """
+    Print a message if its level is enabled.
+
+    Args:
+        level (int): DEBUG, VERBOSE or PRINT.
+        tag (str): The tag printed around the message.
+        message (str or tuple): The message, formatted only if it is printed.
+        fit (bool, optional): Drop the end tag if the line does not fit the terminal.
+            Defaults to True.
+
+    Returns:
+        bool: True if the message was printed.
+    """
+    if not is_enabled(level):
+        return False
+    print(format_tagged(tag, render(message), fit=fit))
+    return True
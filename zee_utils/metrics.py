@@ -0,0 +1,340 @@
+"""
+Local metrics in the Prometheus text format.
+
+Counters, gauges and histograms are collected in memory while a tool runs and written
+as a node-exporter textfile (<job>.prom) when it ends, so node-exporter's textfile
+collector, or anything reading the files directly, can feed dashboards without a live
+service:
+
+    launches = metrics.counter("last_resort_launches_total", "Launches of the app.")
+    launches.inc(site="xyz")
+    metrics.write_at_exit(metrics.textfile_path("last_resort", default_dir))
+
+Every run merges its values into the existing file: counters and histograms are added
+to the totals of the previous runs, gauges replace the previous value of the same
+labels. The file is rewritten under a lock and renamed into place, so concurrent runs
+and the collector never see a partial file.
+
+The directory is taken from the METRICS_TEXTFILE_DIR environment variable, falling back
+to a directory chosen by the tool. This module is shared by zee_utils, Last Resort and
+mebes_converter, which put zee_utils on their import path. It has no dependencies
+outside the standard library.
+"""
+import atexit
+import fcntl
+import math
+import os
+import re
+import sys
+
+TEXTFILE_DIR_VARIABLE = "METRICS_TEXTFILE_DIR"
+TEXTFILE_SUFFIX = ".prom"
+
+# Seconds, from quick file operations to a long interactive session
+DEFAULT_BUCKETS = (0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+# Bytes, 1 MB to 64 GB
+SIZE_BUCKETS = tuple(4**power * 1024**2 for power in range(0, 9))
+
+_SAMPLE_LINE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})?\s+(\S+)")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Base of the metric types, holding the values of every label set.
+
+    Attributes:
+        name (str): The metric name.
+        help (str): The description written into the textfile.
+        kind (str): The Prometheus type, 'counter', 'gauge' or 'histogram'.
+        cumulative (bool): Whether the values are added to those of previous runs.
+    """
+
+    kind = "untyped"
+    cumulative = False
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+
+    def samples(self):
+        """
+        Return the samples of the metric.
+
+        Returns:
+            list: Tuples of sample name, formatted labels and value.
+        """
+        return [
+            (self.name, labels, value) for labels, value in sorted(self.values.items())
+        ]
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, e.g. the number of launches.
+    """
+
+    kind = "counter"
+    cumulative = True
+
+    def inc(self, amount=1, **labels):
+        """
+        Increase the counter.
+
+        Args:
+            amount (float, optional): The increment. Defaults to 1.
+            **labels: The labels of the value.
+        """
+        key = _format_labels(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that is set, e.g. the size of the last archive.
+    """
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        """
+        Set the gauge.
+
+        Args:
+            value (float): The value.
+            **labels: The labels of the value.
+        """
+        self.values[_format_labels(labels)] = value
+
+
+class Histogram(Metric):
+    """
+    A distribution of observed values in cumulative buckets, e.g. phase durations.
+
+    Attributes:
+        buckets (tuple): The upper bounds of the buckets, without +Inf.
+    """
+
+    kind = "histogram"
+    cumulative = True
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        """
+        Add an observation.
+
+        Args:
+            value (float): The observed value.
+            **labels: The labels of the observation.
+        """
+        key = tuple(sorted(labels.items()))
+        counts, total = self.values.get(key, ([0] * len(self.buckets), 0))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        self.values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        for key, (counts, total) in sorted(self.values.items()):
+            labels = dict(key)
+            for bound, count in zip(self.buckets, counts):
+                bucket_labels = _format_labels(dict(labels, le=_format_value(bound)))
+                samples.append((f"{self.name}_bucket", bucket_labels, count))
+            samples.append((f"{self.name}_sum", _format_labels(labels), total))
+            samples.append((f"{self.name}_count", _format_labels(labels), counts[-1]))
+        return samples
+
+
+class Registry:
+    """
+    The metrics of one tool, written together into one textfile.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _get(self, metric_class, name, help, **options):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = metric_class(name, help, **options)
+        elif not isinstance(metric, metric_class):
+            raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+        return metric
+
+    def counter(self, name, help):
+        """
+        Return the counter of a name, registering it on first use.
+
+        Args:
+            name (str): The metric name, ending with _total by convention.
+            help (str): The description of the metric.
+
+        Returns:
+            Counter: The counter.
+        """
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help):
+        """
+        Return the gauge of a name, registering it on first use.
+
+        Args:
+            name (str): The metric name.
+            help (str): The description of the metric.
+
+        Returns:
+            Gauge: The gauge.
+        """
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        """
+        Return the histogram of a name, registering it on first use.
+
+        Args:
+            name (str): The metric name, ending with the unit by convention.
+            help (str): The description of the metric.
+            buckets (tuple, optional): The upper bounds of the buckets. Defaults to
+                DEFAULT_BUCKETS.
+
+        Returns:
+            Histogram: The histogram.
+        """
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def write_textfile(self, path):
+        """
+        Merge the metrics into a textfile, see the module description.
+
+        Args:
+            path (str): The path of the .prom file.
+
+        Raises:
+            OSError: If the file cannot be written.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path + ".lock", "w") as lock:
+            fcntl.lockf(lock, fcntl.LOCK_EX)
+            families = read_textfile(path)
+            for metric in self.metrics.values():
+                _, _, previous = families.get(metric.name, (None, None, {}))
+                merged = dict(previous)
+                for sample_name, labels, value in metric.samples():
+                    key = (sample_name, labels)
+                    if metric.cumulative:
+                        value += previous.get(key, 0)
+                    merged[key] = value
+                families[metric.name] = (metric.help, metric.kind, merged)
+
+            partial_path = f"{path}.{os.getpid()}.tmp"
+            with open(partial_path, "w") as file:
+                for name, (help, kind, samples) in sorted(families.items()):
+                    file.write(f"# HELP {name} {help}\n")
+                    file.write(f"# TYPE {name} {kind}\n")
+                    for (sample_name, labels), value in samples.items():
+                        file.write(f"{sample_name}{labels} {_format_value(value)}\n")
+            os.chmod(partial_path, 0o664)
+            os.replace(partial_path, path)
+
+
+def read_textfile(path):
+    """
+    Read a textfile written by write_textfile().
+
+    Args:
+        path (str): The path of the .prom file.
+
+    Returns:
+        dict: Metric names mapped to their help, type and samples, the samples a dict of
+            (sample name, formatted labels) to value. Empty if the file does not exist.
+    """
+    families = {}
+    helps = {}
+    kinds = {}
+    name = None
+    try:
+        file = open(path)
+    except FileNotFoundError:
+        return families
+    with file:
+        for line in file:
+            if line.startswith("# HELP "):
+                name, _, helps[name] = line[7:].rstrip("\n").partition(" ")
+            elif line.startswith("# TYPE "):
+                name, _, kinds[name] = line[7:].rstrip("\n").partition(" ")
+                families[name] = (helps.get(name, ""), kinds[name], {})
+            elif name is not None and name in families:
+                match = _SAMPLE_LINE.match(line)
+                if match:
+                    sample_name, labels, value = match.groups()
+                    families[name][2][(sample_name, labels or "")] = float(value)
+    return families
+
+
+def textfile_path(job, default_dir):
+    """
+    Return the path of the textfile of a tool.
+
+    Args:
+        job (str): The name of the tool, used as the file name.
+        default_dir (str): The directory used if METRICS_TEXTFILE_DIR is not set.
+
+    Returns:
+        str: The path of the .prom file.
+    """
+    directory = os.environ.get(TEXTFILE_DIR_VARIABLE) or default_dir
+    return os.path.join(directory, job + TEXTFILE_SUFFIX)
+
+
+def write_at_exit(path, on_error=None):
+    """
+    Write the metrics of the default registry into a textfile when the process exits.
+
+    Metrics must never break the tool, errors are only reported.
+
+    Args:
+        path (str): The path of the .prom file.
+        on_error (callable, optional): Called with the error if the file cannot be
+            written. Defaults to printing a warning.
+    """
+
+    def write():
+        try:
+            registry.write_textfile(path)
+        except (OSError, ValueError) as error:
+            if on_error is not None:
+                on_error(error)
+            else:
+                print(f"WARNING     Cannot write metrics to {path}: {error}", file=sys.stderr)
+
+    atexit.register(write)
+
+
+# The registry of this process
+registry = Registry()
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
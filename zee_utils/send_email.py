@@ -7,7 +7,9 @@ import shutil
 import subprocess
 import smtplib
 import sys
+import time
 
+import metrics
 import po_parser
 import file_op_z
 import utilz
@@ -17,6 +19,23 @@ from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
 
 
+# Used for the metrics textfile if METRICS_TEXTFILE_DIR is not set
+METRICS_DIR = os.path.join(os.path.expanduser("~"), ".zee_metrics")
+
+
+def count_email(outcome, fab=None):
+    """
+    Count an attempt to send the email in the metrics.
+
+    Args:
+        outcome (str): 'sent', or why the email was not sent, e.g. 'no_po_file'.
+        fab (str, optional): The fab the order is for. Defaults to unknown.
+    """
+    metrics.counter(
+        "send_email_emails_total", "Attempts to send the vendor email by outcome."
+    ).inc(outcome=outcome, fab=fab or "unknown")
+
+
 class Person:
     def __init__(self, first_name, last_name, phone, email):
         self.first_name = first_name
@@ -662,8 +681,20 @@ def send_email(body, stepper, po_pdf_full_path, fab, user_details, po_info):
         )
         msg.attach(attachment)
     # comment following 2 lines for testing
-    with smtplib.SMTP("localhost") as smtp:
-        smtp.send_message(msg)
+    start = time.perf_counter()
+    try:
+        with smtplib.SMTP("localhost") as smtp:
+            smtp.send_message(msg)
+    except (OSError, smtplib.SMTPException):
+        count_email("smtp_error", fab)
+        raise
+    metrics.histogram(
+        "send_email_smtp_duration_seconds", "Time to hand the email to the SMTP server."
+    ).observe(time.perf_counter() - start)
+    metrics.gauge(
+        "send_email_attachment_bytes", "Size of the last attached PO PDF."
+    ).set(os.path.getsize(po_pdf_full_path))
+    count_email("sent", fab)
     utilz.printer(
         message=f"Email sent successfully to {user_details.get('email')}",
         log_type=utilz.Type.INFO,
@@ -678,6 +709,9 @@ def main():
     user details, parsing purchase order (PO) files, determining shipping address,
     and sending an email with the prepared body and attachments.
     """
+    metrics.counter(
+        "send_email_launches_total", "Launches of send_email by site and host."
+    ).inc(site=os.getenv("RDPSITE", "unknown"), host=os.uname().nodename)
     # Get user info
     user_details = get_full_user_details("secret")  #anonymized
     # Find .po files
@@ -686,6 +720,7 @@ def main():
         utilz.printer(
             message=f"There must be exactly one *.po file.", log_type=utilz.Type.ERROR
         )
+        count_email("no_po_file")
         exit()
 
     po_file = po_files[0]
@@ -777,6 +812,7 @@ def main():
                     message=f"Expected exactly one .pdf file, found {len(pdf_files)}",
                     log_type=utilz.Type.ERROR,
                 )
+                count_email("no_po_pdf")
                 exit("Something went wrong when creating the PDF from PO document.")
 
             utilz.printer(
@@ -879,6 +915,7 @@ def main():
 
 
 if __name__ == "__main__":
+    metrics.write_at_exit(metrics.textfile_path("send_email", METRICS_DIR))
     try:
         main()
     except KeyboardInterrupt:
@@ -886,3 +923,4 @@ if __name__ == "__main__":
         utilz.printer(
             message="Application forcefully terminated!", log_type=utilz.Type.ERROR
         )
+        count_email("interrupted")
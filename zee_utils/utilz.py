@@ -1,10 +1,9 @@
 import os
 import re
-import shutil
 import tarfile
 from enum import Enum
-import argument_parser
 import file_op_z
+import log_core
 
 
 class Type(Enum):
@@ -53,44 +52,15 @@ def printer(message, log_type=None):
     printer, custom_tab, Type
 
     Args:
-        message (str): The message to print.
+        message (str or tuple): The message, or a format string and its arguments.
         log_type (Type, optional): The type of log message (INFO, WARNING, or None). Defaults to PRINTER.
 
     Returns:
         None
     """
-    arguments = argument_parser.get()
-
     # Determine the print tag based on the log type
-    if log_type == Type.INFO:
-        print_tag = "INFO"
-    elif log_type == Type.WARNING:
-        print_tag = "WARNING"
-    elif log_type == Type.ERROR:
-        print_tag = "ERROR"
-    elif log_type == Type.QUESTION:
-        print_tag = "QUESTION"
-    elif log_type == Type.OPTION:
-        print_tag = "OPTION"
-    else:
-        print_tag = "PRINTER"
-    # Get the terminal width
-    terminal_width = shutil.get_terminal_size().columns
-
-    # Calculate the padding needed to align the end tag
-    padding_length = (
-        terminal_width - len(print_tag) * 2 - len(message) - len(custom_tab()) * 2
-    )
-    padding = " " * max(padding_length, 0)
-
-    # Format the message
-    formatted_message = (
-        f"{print_tag}{custom_tab()}{message}{padding}{custom_tab()}{print_tag}"
-    )
-    if arguments.silent:
-        return
-    else:
-        print(formatted_message)
+    print_tag = log_type.name if isinstance(log_type, Type) else "PRINTER"
+    log_core.emit(log_core.PRINT, print_tag, message, fit=False)
 
 
 def format_line(text, fill_symbol=None, edge_symbol=None, title=None):
@@ -156,35 +126,12 @@ def verbose(message):
     verbose or debug mode is active.
 
     Args:
-        message (str): The verbose message to print.
+        message (str or tuple): The verbose message, or a format string and its arguments.
 
     Returns:
         None
     """
-    arguments = argument_parser.get()
-    if arguments.silent:
-        return
-    if arguments.verbose or arguments.debug:
-        # Custom verbose tag
-        verbose_tag = "VERBOSE"
-
-        # Get the terminal width
-        terminal_width = shutil.get_terminal_size().columns
-
-        # Calculate the padding needed to align the end tag
-        padding_length = (
-            terminal_width - len(verbose_tag) * 2 - len(message) - len(custom_tab()) * 2
-        )
-        padding = " " * max(padding_length, 0)
-
-        # Format the message
-        formatted_message = (
-            f"{verbose_tag}{custom_tab()}{message}{padding}{custom_tab()}{verbose_tag}"
-        )
-        if len(formatted_message) > terminal_width:
-            print(f"{verbose_tag}{custom_tab()}{message}")
-        else:
-            print(formatted_message)
+    log_core.emit(log_core.VERBOSE, "VERBOSE", message)
 
 
 def debug(message):
@@ -195,35 +142,12 @@ def debug(message):
     It also writes the message to the history log if a log argument is provided.
 
     Args:
-        message (str): The debug message to print.
+        message (str or tuple): The debug message, or a format string and its arguments.
 
     Returns:
         None
     """
-    arguments = argument_parser.get()
-    if arguments.silent:
-        return
-    if arguments.debug:
-        # Custom verbose tag
-        debug_tag = "DEBUG"
-
-        # Get the terminal width
-        terminal_width = shutil.get_terminal_size().columns
-
-        # Calculate the padding needed to align the end tag
-        padding_length = (
-            terminal_width - len(debug_tag) * 2 - len(message) - len(custom_tab()) * 2
-        )
-        padding = " " * max(padding_length, 0)
-
-        # Format the message
-        formatted_message = (
-            f"{debug_tag}{custom_tab()}{message}{padding}{custom_tab()}{debug_tag}"
-        )
-        if len(formatted_message) > terminal_width:
-            print(f"{debug_tag}{custom_tab()}{message}")
-        else:
-            print(formatted_message)
+    log_core.emit(log_core.DEBUG, "DEBUG", message)
 
 
 def get_release_version():